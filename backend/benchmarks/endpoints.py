@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks dos caminhos quentes da API, rodando os handlers no processo.
+
+Os handlers (get_posts, get_conversations, get_messages, get_helpers_nearby,
+pdf_processor.search...) são chamados diretamente, sem HTTP, contra um banco
+populado por generate_data.Generator em tamanhos fixos. Por padrão o banco é
+o mongomock em memória (mongomock-motor, em requirements-dev.txt); com --mongo-url usa um
+Mongo local, no banco descartável bench_endpoints.
+
+Para cada caso são medidos:
+  - tempo por chamada (mediana e p95, em ms)
+  - pico de memória alocada na chamada (tracemalloc, em KB)
+  - idas ao banco por chamada (operações do driver; os getMore de cursores
+    grandes não entram na conta)
+
+Os números são comparados com o baseline salvo (benchmarks/baseline.json, por
+backend e tamanho de dataset): tempo ou memória acima do limite, ou qualquer
+ida ao banco a mais, contam como regressão e o script sai com código 1.
+
+Tempos só são comparáveis na mesma máquina: o baseline não é versionado, cada
+um grava o seu antes de mudar o código. Um baseline gravado em outra máquina
+ou outra versão do Python é ignorado, com um aviso.
+
+Uso:
+    python benchmarks/endpoints.py --save-baseline      # primeiro passo, antes da mudança
+    python benchmarks/endpoints.py                      # compara com o baseline
+    python benchmarks/endpoints.py --dataset medium --only conversations
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from argparse import Namespace
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# O client do server.py não é usado aqui (connect=False), mas exige a variável
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+# Um único banco, sem réplicas: todas as leituras vão para o proxy que conta as idas
+os.environ.setdefault('MONGO_SECONDARY_READS', '0')
+
+import server  # noqa: E402
+from generate_data import Generator  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+DATASETS = {
+    'small': {'users': 500, 'posts': 2_000, 'messages': 10_000},
+    'medium': {'users': 5_000, 'posts': 20_000, 'messages': 100_000}
+}
+# Diferenças de tempo abaixo disso são ruído de medição
+TIME_FLOOR_MS = 0.05
+
+# Operações que são uma ida ao banco cada; find/aggregate contam ao ler o cursor
+COUNTED_METHODS = {
+    'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'count_documents', 'estimated_document_count', 'distinct',
+    'bulk_write', 'find_one_and_update', 'command'
+}
+CURSOR_METHODS = {'find', 'aggregate'}
+CURSOR_CHAIN = {'sort', 'skip', 'limit', 'batch_size', 'hint', 'max_time_ms'}
+
+
+class RoundTrips:
+    def __init__(self):
+        self.count = 0
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter: RoundTrips):
+        self._cursor = cursor
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in CURSOR_CHAIN:
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        if name == 'to_list':
+            async def to_list(*args, **kwargs):
+                self._counter.count += 1
+                return await attr(*args, **kwargs)
+            return to_list
+        return attr
+
+    def __aiter__(self):
+        self._counter.count += 1
+        return self._cursor.__aiter__()
+
+
+class CountingCollection:
+    def __init__(self, collection, counter: RoundTrips):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in CURSOR_METHODS:
+            return lambda *args, **kwargs: CountingCursor(attr(*args, **kwargs), self._counter)
+        if name in COUNTED_METHODS:
+            async def counted(*args, **kwargs):
+                self._counter.count += 1
+                return await attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingDatabase:
+    """Proxy do banco usado pelos handlers que conta as idas ao banco"""
+
+    def __init__(self, database, counter: RoundTrips):
+        self._database = database
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self._counter)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in COUNTED_METHODS:
+            return CountingCollection(self._database, self._counter).__getattr__(name)
+        return self[name]
+
+
+class Case(NamedTuple):
+    name: str
+    call: Callable[[], Awaitable]
+
+
+def open_database(mongo_url: str):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(mongo_url)['bench_endpoints'], 'mongo'
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit('mongomock-motor não está instalado: pip install mongomock-motor, ou use --mongo-url')
+    return AsyncMongoMockClient()['bench_endpoints'], 'in-memory'
+
+
+async def populate(database, sizes: dict) -> Generator:
+    generator = Generator(Namespace(
+        comments_per_post=1.5, conversation_median=10, days=365, seed=7, **sizes
+    ))
+    await database.users.insert_many(list(generator.users_docs()))
+    comments = []
+    await database.posts.insert_many(list(generator.posts_docs(comments)))
+    if comments:
+        await database.comments.insert_many(comments)
+    await database.messages.insert_many(list(generator.messages_docs()))
+    return generator
+
+
+async def build_cases(database) -> List[Case]:
+    # Usuário com mais mensagens: pior caso de /conversations
+    top = await database.messages.aggregate([
+        {'$group': {'_id': '$from_user_id', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 1}
+    ]).to_list(1)
+    heavy = await database.users.find_one({'id': top[0]['_id']}, {'_id': 0, 'password': 0})
+    partner = await database.messages.find_one({'from_user_id': heavy['id']}, {'_id': 0, 'to_user_id': 1})
+    migrant = await database.users.find_one({'role': 'migrant'}, {'_id': 0, 'password': 0})
+    user = server.User(**heavy)
+    viewer = server.User(**migrant)
+
+    async def pdf_search():
+        return server.pdf_processor.search('preciso de abrigo e comida', k=3)
+
+    return [
+        Case('get_posts', lambda: server.get_posts(type=None, category=None, current_user=viewer)),
+        Case('get_posts_category', lambda: server.get_posts(type='need', category='housing', current_user=viewer)),
+        Case('get_conversations', lambda: server.get_conversations(current_user=user)),
+        Case('get_messages', lambda: server.get_messages(partner['to_user_id'], current_user=user)),
+        Case('get_helpers_nearby', lambda: server.get_helpers_nearby(
+            lat=48.8842, lng=2.36, category=None, radius=10.0, current_user=viewer)),
+        Case('get_helpers_nearby_category', lambda: server.get_helpers_nearby(
+            lat=48.8842, lng=2.36, category='legal', radius=5.0, current_user=viewer)),
+        Case('pdf_search', pdf_search)
+    ]
+
+
+async def measure(case: Case, counter: RoundTrips, iterations: int) -> dict:
+    for _ in range(2):
+        await case.call()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await case.call()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # tracemalloc deixa as chamadas mais lentas: memória e idas ao banco à parte
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(3):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            counter.count = 0
+            await case.call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'alloc_kb': round(min(peaks) / 1024, 1),
+        'round_trips': counter.count
+    }
+
+
+def regressions(name: str, current: dict, baseline: dict, threshold: float) -> List[str]:
+    found = []
+    if current['median_ms'] > baseline['median_ms'] * (1 + threshold) + TIME_FLOOR_MS:
+        found.append(f"{name}: mediana {baseline['median_ms']} -> {current['median_ms']} ms")
+    if current['alloc_kb'] > baseline['alloc_kb'] * (1 + threshold) + 1:
+        found.append(f"{name}: memória {baseline['alloc_kb']} -> {current['alloc_kb']} KB")
+    if current['round_trips'] > baseline['round_trips']:
+        found.append(f"{name}: idas ao banco {baseline['round_trips']} -> {current['round_trips']}")
+    return found
+
+
+def print_table(results: Dict[str, dict], baseline: Dict[str, dict]):
+    print(f"{'caso':<30}{'mediana':>10}{'p95':>10}{'KB':>10}{'idas':>6}{'vs baseline':>14}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = f"{result['median_ms'] / base['median_ms']:.2f}x" if base and base['median_ms'] else '-'
+        print(f"{name:<30}{result['median_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+              f"{result['alloc_kb']:>10.1f}{result['round_trips']:>6}{ratio:>14}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', choices=DATASETS, default='small')
+    parser.add_argument('--mongo-url', help='Mongo local; sem isso usa o mongomock em memória')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', help='roda só os casos cujo nome contém este texto')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25, help='aumento tolerado de tempo/memória (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    database, backend = open_database(args.mongo_url)
+    if backend == 'mongo':
+        await database.client.drop_database('bench_endpoints')
+    print(f"Populando {backend}/{args.dataset}: {DATASETS[args.dataset]}")
+    await populate(database, DATASETS[args.dataset])
+
+    counter = RoundTrips()
+    server.db = CountingDatabase(database, counter)
+    cases = [case for case in await build_cases(database) if not args.only or args.only in case.name]
+
+    results = {}
+    for case in cases:
+        results[case.name] = await measure(case, counter, args.iterations)
+
+    key = f'{backend}/{args.dataset}'
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    environment = {'host': platform.node(), 'machine': platform.machine(), 'python': platform.python_version()}
+    entry = stored.get(key, {})
+    recorded = {field: entry.get(field) for field in environment}
+    baseline = entry.get('cases', {})
+    if baseline and recorded != environment:
+        print(f'Aviso: baseline {key} gravado em {recorded}, não nesta máquina ({environment}); '
+              'comparação ignorada. Grave um com --save-baseline.')
+        baseline = {}
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        stored[key] = {**environment, 'cases': merged}
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + '\n')
+        print(f'\nBaseline {key} salvo em {args.baseline}')
+        return
+
+    found = [item for name, result in results.items() if name in baseline
+             for item in regressions(name, result, baseline[name], args.threshold)]
+    if found:
+        print('\nRegressões em relação ao baseline:')
+        for item in found:
+            print(f'  - {item}')
+        sys.exit(1)
+    if baseline:
+        print('\nSem regressões em relação ao baseline')
+    else:
+        print(f'\nSem baseline {key} para esta máquina: rode com --save-baseline antes de mudar o código')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Gerador de dados sintéticos para testes de carga.
+
+Cria em lote (insert_many não ordenado, vários lotes em paralelo) usuários,
+posts, comentários e mensagens no mesmo formato gravado pela API (snapshot do
+autor, geo, comment_count, language, created_at em ISO/UTC), com distribuições
+parecidas com as de produção:
+  - papéis: maioria de migrantes, voluntários e helpers em menor número
+  - categorias com pesos (alimentação e moradia dominam)
+  - usuários e posts distribuídos entre as cidades atendidas (maioria em
+    Paris), com localizações agrupadas em bairros
+  - atividade de cauda longa: poucos usuários escrevem a maior parte dos posts
+  - conversas migrante <-> voluntário/helper com tamanho log-normal
+
+Todos os usuários gerados têm e-mail loadtest-<n>@example.com e a senha
+SYNTHETIC_PASSWORD, usados por load_test.py para autenticar.
+
+Uso (contra um Mongo local; MONGO_URL/DB_NAME vêm do backend/.env):
+    python benchmarks/generate_data.py --users 100000 --posts 1000000 --messages 10000000
+    python benchmarks/generate_data.py --reset   # apaga antes os dados sintéticos
+
+Os índices são criados por migrate.py (ou no startup do servidor em
+desenvolvimento); para volumes grandes é mais rápido gerar os dados antes de
+rodar as migrações pela primeira vez.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+import bcrypt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from categories import category_mask, user_masks  # noqa: E402
+from server import author_snapshot, db, geo_point  # noqa: E402
+
+SYNTHETIC_PASSWORD = 'loadtest-password'
+SYNTHETIC_EMAIL = 'loadtest-{}@example.com'
+SYNTHETIC_EMAIL_REGEX = r'^loadtest-\d+@example\.com$'
+
+ROLE_WEIGHTS = {'migrant': 0.72, 'volunteer': 0.18, 'helper': 0.0995, 'admin': 0.0005}
+CATEGORY_WEIGHTS = {
+    'food': 22, 'housing': 18, 'legal': 15, 'health': 12, 'work': 10,
+    'education': 7, 'social': 6, 'clothes': 5, 'transport': 3, 'furniture': 2
+}
+LANGUAGE_WEIGHTS = {'fr': 0.45, 'pt': 0.2, 'en': 0.15, 'ar': 0.12, 'es': 0.08}
+PROFESSIONAL_AREAS = ['legal', 'health', 'education', 'social', 'psychology', 'translation', 'other']
+
+# (bairro, cidade, lat, lng, desvio em graus, peso)
+CITY_CLUSTERS = [
+    ('Paris 10e/18e/19e', 'paris', 48.8842, 2.3600, 0.012, 30),
+    ('Paris 11e/20e', 'paris', 48.8620, 2.3850, 0.012, 18),
+    ('Paris centre', 'paris', 48.8566, 2.3522, 0.015, 12),
+    ('Saint-Denis', 'paris', 48.9362, 2.3574, 0.015, 10),
+    ('Lyon', 'lyon', 45.7640, 4.8357, 0.02, 10),
+    ('Marseille', 'marseille', 43.2965, 5.3698, 0.025, 10),
+    ('Bruxelles', 'brussels', 50.8503, 4.3517, 0.02, 10)
+]
+# Fração dos usuários/posts com localização
+USER_LOCATION_RATE = 0.6
+POST_LOCATION_RATE = 0.5
+
+TITLES = {
+    'need': ['Preciso de ajuda com {}', 'Procuro orientação sobre {}', 'Alguém pode ajudar com {}?'],
+    'offer': ['Ofereço ajuda com {}', 'Posso ajudar com {}', 'Disponível para {}']
+}
+DESCRIPTION = 'Cheguei há pouco tempo e estou procurando informações. '
+MESSAGE_TEXTS = [
+    'Olá, tudo bem?', 'Bonjour, je peux vous aider ?', 'Obrigado pela resposta!',
+    'Qual o endereço?', 'Amanhã às 10h está bom?', 'Preciso levar algum documento?',
+    'Je suis disponible mercredi.', 'Thank you so much!', 'Pode me mandar a localização?'
+]
+COMMENT_TEXTS = ['Também preciso disso', 'Posso ajudar, te mandei mensagem', 'Veja o local na página de mapa', 'Merci !']
+
+
+class Weighted:
+    """Escolha ponderada O(log n) sobre pesos fixos"""
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def pick(self, rng: random.Random):
+        return self.items[bisect.bisect_right(self.cumulative, rng.random() * self.total)]
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.now(timezone.utc)
+        self.start = self.now - timedelta(days=args.days)
+        self.roles = Weighted(ROLE_WEIGHTS, ROLE_WEIGHTS.values())
+        self.categories = Weighted(CATEGORY_WEIGHTS, CATEGORY_WEIGHTS.values())
+        self.languages = Weighted(LANGUAGE_WEIGHTS, LANGUAGE_WEIGHTS.values())
+        self.clusters = Weighted(CITY_CLUSTERS, [cluster[5] for cluster in CITY_CLUSTERS])
+        self.city_clusters = {}
+        for cluster in CITY_CLUSTERS:
+            self.city_clusters.setdefault(cluster[1], []).append(cluster)
+        # Uma senha só para todos: bcrypt por usuário tornaria a geração lenta demais
+        self.password = bcrypt.hashpw(SYNTHETIC_PASSWORD.encode(), bcrypt.gensalt()).decode()
+        # Resumo dos usuários gerados, usado para posts e conversas
+        self.users = []
+        self.migrants = []
+        self.helpers = []
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self, after: datetime) -> datetime:
+        """Instante entre `after` e agora, mais provável perto de agora (base em crescimento)"""
+        span = (self.now - after).total_seconds()
+        return after + timedelta(seconds=span * math.sqrt(self.rng.random()))
+
+    def location(self, cluster: tuple) -> dict:
+        name, _, lat, lng, spread, _ = cluster
+        return {
+            'lat': round(self.rng.gauss(lat, spread), 6),
+            'lng': round(self.rng.gauss(lng, spread * 1.5), 6),
+            'address': name
+        }
+
+    def pick_distinct(self, weighted: Weighted, count: int) -> list:
+        """Até `count` itens distintos, respeitando os pesos"""
+        chosen = []
+        for _ in range(count * 4):
+            if len(chosen) == count:
+                break
+            item = weighted.pick(self.rng)
+            if item not in chosen:
+                chosen.append(item)
+        return chosen
+
+    # ----- documentos -----
+
+    def users_docs(self):
+        rng = self.rng
+        for n in range(self.args.users):
+            role = self.roles.pick(rng)
+            cluster = self.clusters.pick(rng)
+            created_at = self.timestamp(self.start)
+            languages = self.pick_distinct(self.languages, rng.choice((1, 1, 2, 3)))
+            display_name = f'U{n}' if rng.random() < 0.15 else None
+            doc = {
+                'id': self.new_id(),
+                'email': SYNTHETIC_EMAIL.format(n),
+                'name': f'Usuário {n}',
+                'display_name': display_name,
+                'use_display_name': display_name is not None,
+                'role': role,
+                'location': None,
+                'bio': None,
+                'languages': languages,
+                'categories': [],
+                'city': cluster[1],
+                'created_at': created_at.isoformat(),
+                'password': self.password
+            }
+            if role in ('migrant', 'volunteer', 'helper'):
+                has_location = rng.random() < USER_LOCATION_RATE
+                doc['location'] = self.location(cluster) if has_location else None
+                doc['show_location'] = has_location and rng.random() < 0.7
+            if role == 'migrant':
+                doc['need_categories'] = self.pick_distinct(self.categories, rng.choice((0, 1, 1, 2, 3)))
+            elif role in ('volunteer', 'helper'):
+                doc['help_categories'] = self.pick_distinct(self.categories, rng.choice((0, 1, 2, 2, 3)))
+            if role == 'volunteer':
+                doc['professional_area'] = rng.choice(PROFESSIONAL_AREAS)
+                doc['professional_specialties'] = []
+                doc['certifications'] = []
+                doc['help_types'] = []
+            doc.update(user_masks(doc))
+
+            summary = {
+                'id': doc['id'], 'role': role, 'created_at': created_at, 'city': cluster[1],
+                'languages': languages, 'author': author_snapshot(doc),
+                # Atividade de cauda longa (Pareto): define quantos posts e conversas o usuário tem
+                'activity': rng.paretovariate(1.2)
+            }
+            self.users.append(summary)
+            if role == 'migrant':
+                self.migrants.append(summary)
+            elif role in ('volunteer', 'helper'):
+                self.helpers.append(summary)
+            yield doc
+
+    def posts_docs(self, comments: list):
+        """Gera os posts; os comentários de cada post vão para a lista `comments`"""
+        rng = self.rng
+        authors = Weighted(self.users, [user['activity'] for user in self.users])
+        for _ in range(self.args.posts):
+            author = authors.pick(rng)
+            post_type = 'need' if author['role'] == 'migrant' else ('offer' if rng.random() < 0.8 else 'need')
+            categories = self.pick_distinct(self.categories, rng.choice((1, 1, 1, 2, 3)))
+            created_at = self.timestamp(author['created_at'])
+            # Posts ficam na cidade do autor
+            cluster = rng.choice(self.city_clusters[author['city']])
+            location = self.location(cluster) if rng.random() < POST_LOCATION_RATE else None
+            comment_count = min(int(rng.expovariate(1 / self.args.comments_per_post)), 200) if self.args.comments_per_post else 0
+            post = {
+                'id': self.new_id(),
+                'user_id': author['id'],
+                'type': post_type,
+                'category': categories[0],
+                'categories': categories,
+                'category_mask': category_mask(categories),
+                'title': rng.choice(TITLES[post_type]).format(categories[0]),
+                'description': DESCRIPTION * rng.randint(1, 4),
+                'location': location,
+                'city': author['city'],
+                'comment_count': comment_count,
+                'created_at': created_at.isoformat(),
+                'images': [],
+                'author': author['author'],
+                'language': author['languages'][0] if author['languages'] else 'fr'
+            }
+            point = geo_point(location)
+            if point:
+                post['geo'] = point
+            for _ in range(comment_count):
+                commenter = authors.pick(rng)
+                comments.append({
+                    'id': self.new_id(),
+                    'post_id': post['id'],
+                    'user_id': commenter['id'],
+                    'comment': rng.choice(COMMENT_TEXTS),
+                    'created_at': self.timestamp(created_at).isoformat(),
+                    'author': commenter['author']
+                })
+            yield post
+
+    def messages_docs(self):
+        """Conversas migrante <-> voluntário/helper da mesma cidade até atingir o total pedido"""
+        rng = self.rng
+        if not self.migrants or not self.helpers:
+            return
+        migrants = Weighted(self.migrants, [user['activity'] for user in self.migrants])
+        by_city = {}
+        for user in self.helpers:
+            by_city.setdefault(user['city'], []).append(user)
+        all_helpers = Weighted(self.helpers, [user['activity'] for user in self.helpers])
+        city_helpers = {city: Weighted(users, [user['activity'] for user in users]) for city, users in by_city.items()}
+        # Mediana ~e^2.3 = 10 mensagens por conversa, com cauda longa
+        mu, sigma = math.log(self.args.conversation_median), 1.0
+        remaining = self.args.messages
+        while remaining > 0:
+            migrant = migrants.pick(rng)
+            helper = city_helpers.get(migrant['city'], all_helpers).pick(rng)
+            size = min(remaining, max(1, int(rng.lognormvariate(mu, sigma))), 5000)
+            remaining -= size
+            at = self.timestamp(max(migrant['created_at'], helper['created_at']))
+            sender, receiver = migrant['id'], helper['id']
+            for _ in range(size):
+                yield {
+                    'id': self.new_id(),
+                    'from_user_id': sender,
+                    'to_user_id': receiver,
+                    'message': rng.choice(MESSAGE_TEXTS),
+                    'created_at': at.isoformat(),
+                    'location': None,
+                    'media': [],
+                    'media_type': None
+                }
+                # Respostas vêm em rajadas: troca de remetente em ~60% das mensagens
+                if rng.random() < 0.6:
+                    sender, receiver = receiver, sender
+                at += timedelta(seconds=rng.expovariate(1 / 600))
+                if at > self.now:
+                    at = self.now
+
+
+async def insert_all(collection, docs, batch_size: int, parallel: int, label: str, extra=None) -> int:
+    """
+    Insere os documentos em lotes não ordenados, com até `parallel` lotes em
+    andamento: a geração do próximo lote roda enquanto o Motor grava os anteriores.
+    `extra` (lista) recebe documentos de outra coleção gerados junto e é
+    esvaziada a cada lote pelo chamador.
+    """
+    pending = set()
+    total = 0
+    started = time.perf_counter()
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) < batch_size:
+            continue
+        if len(pending) >= parallel:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        pending.add(asyncio.ensure_future(collection.insert_many(batch, ordered=False)))
+        total += len(batch)
+        batch = []
+        if extra is not None:
+            await extra()
+        rate = total / (time.perf_counter() - started)
+        print(f'\r{label}: {total:,} ({rate:,.0f}/s)', end='', flush=True)
+    if batch:
+        pending.add(asyncio.ensure_future(collection.insert_many(batch, ordered=False)))
+        total += len(batch)
+    if extra is not None:
+        await extra()
+    if pending:
+        await asyncio.gather(*pending)
+    print(f'\r{label}: {total:,} em {time.perf_counter() - started:.1f}s')
+    return total
+
+
+async def reset_synthetic():
+    """Apaga os usuários sintéticos e tudo o que eles criaram"""
+    user_ids = [user['id'] async for user in db.users.find(
+        {'email': {'$regex': SYNTHETIC_EMAIL_REGEX}}, {'_id': 0, 'id': 1}
+    )]
+    for start in range(0, len(user_ids), 10000):
+        chunk = user_ids[start:start + 10000]
+        await db.comments.delete_many({'user_id': {'$in': chunk}})
+        await db.posts.delete_many({'user_id': {'$in': chunk}})
+        await db.messages.delete_many({'from_user_id': {'$in': chunk}})
+        await db.messages.delete_many({'to_user_id': {'$in': chunk}})
+        await db.users.delete_many({'id': {'$in': chunk}})
+    print(f'Removidos {len(user_ids):,} usuários sintéticos e seus dados')
+
+
+def check_local(allow_remote: bool):
+    host = urlparse(os.environ.get('MONGO_URL', '')).hostname or ''
+    if host not in ('localhost', '127.0.0.1', 'mongo', 'mongodb') and not allow_remote:
+        sys.exit(f'MONGO_URL aponta para {host!r}; use --allow-remote para gerar dados fora do Mongo local')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--comments-per-post', type=float, default=1.5, help='média de comentários por post (0 desliga)')
+    parser.add_argument('--conversation-median', type=float, default=10, help='mediana de mensagens por conversa')
+    parser.add_argument('--days', type=int, default=365, help='período coberto pelos created_at')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--parallel', type=int, default=4, help='lotes gravando ao mesmo tempo')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='apaga os dados sintéticos existentes antes de gerar')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    check_local(args.allow_remote)
+    if args.reset:
+        await reset_synthetic()
+    elif await db.users.find_one({'email': SYNTHETIC_EMAIL.format(0)}, {'_id': 1}):
+        sys.exit('Já existem dados sintéticos neste banco; rode com --reset para gerar de novo')
+
+    generator = Generator(args)
+    await insert_all(db.users, generator.users_docs(), args.batch_size, args.parallel, 'users')
+
+    comments = []
+    comment_tasks = []
+    comment_total = 0
+
+    async def flush_comments():
+        nonlocal comment_total
+        if comments:
+            comment_total += len(comments)
+            comment_tasks.append(asyncio.ensure_future(db.comments.insert_many(list(comments), ordered=False)))
+            comments.clear()
+        # Mantém no máximo alguns lotes de comentários em andamento
+        while len([task for task in comment_tasks if not task.done()]) > args.parallel:
+            await asyncio.sleep(0.01)
+
+    await insert_all(db.posts, generator.posts_docs(comments), args.batch_size, args.parallel, 'posts',
+                     extra=flush_comments)
+    if comment_tasks:
+        await asyncio.gather(*comment_tasks)
+        print(f'comments: {comment_total:,}')
+
+    await insert_all(db.messages, generator.messages_docs(), args.batch_size, args.parallel, 'messages')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
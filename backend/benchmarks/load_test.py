@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Teste de carga que reproduz o tráfego do frontend contra um servidor local.
+
+Cada usuário virtual autentica com uma conta gerada por generate_data.py e
+repete sessões sorteadas pelo mix de tráfego:
+  - chat: GET /conversations, abre uma conversa (/users/{id}, /can-chat/{id},
+    /posts) e consulta /messages/{id} a cada 3 s como o DirectChatPage,
+    enviando uma mensagem de vez em quando
+  - feed: /posts e /sidebar-content como o HomePage, abre os comentários de
+    alguns posts e às vezes comenta
+  - map: /help-locations/categories, /help-locations, /help-locations/nearest
+    (MapPage) e /helpers-nearby (NearbyHelpersPage)
+Entre as ações há tempos de leitura com distribuição exponencial.
+
+As contas são sorteadas direto no Mongo a partir das mensagens existentes, de
+forma que usuários com mais conversas aparecem mais (como em produção).
+
+No fim imprime, por endpoint (template da rota): requisições, erros, req/s e
+latências p50/p95/p99/máx.
+
+Uso:
+    python benchmarks/load_test.py --base-url http://localhost:8001 --users 200 --duration 300
+    python benchmarks/load_test.py --mix chat=0.6,feed=0.3,map=0.1 --json resultado.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generate_data import CITY_CLUSTERS, SYNTHETIC_EMAIL_REGEX, SYNTHETIC_PASSWORD  # noqa: E402
+from server import db  # noqa: E402
+
+CHAT_POLL_INTERVAL = 3.0  # DirectChatPage: setInterval(fetchMessages, 3000)
+DEFAULT_MIX = {'chat': 0.45, 'feed': 0.35, 'map': 0.2}
+CATEGORIES = ['food', 'legal', 'health', 'housing', 'work', 'education', 'social', 'clothes', 'furniture', 'transport']
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentil pelo método nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        self.latencies[endpoint].append(elapsed)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summary(self) -> List[dict]:
+        duration = (self.finished or time.perf_counter()) - self.started
+        rows = []
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(values),
+                'errors': self.errors.get(endpoint, 0),
+                'rps': round(len(values) / duration, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1)
+            })
+        return rows
+
+    def print_report(self):
+        rows = self.summary()
+        header = f"{'endpoint':<44}{'req':>8}{'err':>6}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}"
+        print(header)
+        print('-' * len(header))
+        for row in rows:
+            print(f"{row['endpoint']:<44}{row['requests']:>8}{row['errors']:>6}{row['rps']:>8.1f}"
+                  f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+        total = sum(row['requests'] for row in rows)
+        errors = sum(row['errors'] for row in rows)
+        print(f'\nTotal: {total} requisições, {errors} erros (latências em ms)')
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, account: dict, mix: Dict[str, float],
+                 rng: random.Random, think_time: float):
+        self.client = client
+        self.stats = stats
+        self.account = account
+        self.mix = mix
+        self.rng = rng
+        self.think_time = think_time
+        self.headers = {}
+
+    async def call(self, method: str, path: str, endpoint: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(f'{method} {endpoint}', time.perf_counter() - start, False)
+            return None
+        self.stats.record(f'{method} {endpoint}', time.perf_counter() - start, response.status_code < 400)
+        return response
+
+    async def think(self, scale: float = 1.0):
+        await asyncio.sleep(self.rng.expovariate(1 / (self.think_time * scale)))
+
+    def position(self) -> dict:
+        location = self.account.get('location')
+        if location and location.get('lat') is not None:
+            return {'lat': location['lat'], 'lng': location['lng']}
+        _, _, lat, lng, spread, _ = self.rng.choice(CITY_CLUSTERS)
+        return {'lat': round(self.rng.gauss(lat, spread), 6), 'lng': round(self.rng.gauss(lng, spread), 6)}
+
+    async def login(self) -> bool:
+        response = await self.call('POST', '/api/auth/login', '/api/auth/login',
+                                   json={'email': self.account['email'], 'password': SYNTHETIC_PASSWORD})
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {'Authorization': f"Bearer {response.json()['token']}"}
+        return True
+
+    async def run(self, deadline: float):
+        if not await self.login():
+            return
+        scenarios = list(self.mix)
+        weights = [self.mix[name] for name in scenarios]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            await getattr(self, f'session_{scenario}')(deadline)
+            await self.think()
+
+    async def session_chat(self, deadline: float):
+        response = await self.call('GET', '/api/conversations', '/api/conversations')
+        conversations = response.json() if response is not None and response.status_code == 200 else []
+        if not conversations:
+            return
+        other_id = self.rng.choice(conversations)['user']['id']
+        await asyncio.gather(
+            self.call('GET', f'/api/users/{other_id}', '/api/users/{user_id}'),
+            self.call('GET', f'/api/can-chat/{other_id}', '/api/can-chat/{other_user_id}'),
+            self.call('GET', '/api/posts', '/api/posts')
+        )
+        # Tempo com a conversa aberta: exponencial, média de 1 minuto
+        open_until = min(deadline, time.perf_counter() + self.rng.expovariate(1 / 60))
+        while True:
+            await self.call('GET', f'/api/messages/{other_id}', '/api/messages/{other_user_id}')
+            if self.rng.random() < 0.05:
+                await self.call('POST', '/api/messages', '/api/messages',
+                                json={'to_user_id': other_id, 'message': 'Mensagem do teste de carga'})
+            if time.perf_counter() + CHAT_POLL_INTERVAL > open_until:
+                break
+            await asyncio.sleep(CHAT_POLL_INTERVAL)
+
+    async def session_feed(self, deadline: float):
+        _, response = await asyncio.gather(
+            self.call('GET', '/api/sidebar-content', '/api/sidebar-content'),
+            self.call('GET', '/api/posts', '/api/posts')
+        )
+        posts = response.json() if response is not None and response.status_code == 200 else []
+        for _ in range(self.rng.randint(0, 3)):
+            if not posts or time.perf_counter() > deadline:
+                break
+            await self.think(0.5)
+            post = self.rng.choice(posts)
+            await self.call('GET', f"/api/posts/{post['id']}/comments", '/api/posts/{post_id}/comments')
+            if self.rng.random() < 0.03:
+                await self.call('POST', f"/api/posts/{post['id']}/comments", '/api/posts/{post_id}/comments',
+                                json={'comment': 'Comentário do teste de carga'})
+        if self.rng.random() < 0.2:
+            category = self.rng.choice(CATEGORIES)
+            await self.call('GET', '/api/posts', '/api/posts?category', params={'category': category})
+
+    async def session_map(self, deadline: float):
+        position = self.position()
+        await asyncio.gather(
+            self.call('GET', '/api/help-locations/categories', '/api/help-locations/categories'),
+            self.call('GET', '/api/help-locations', '/api/help-locations')
+        )
+        await self.think(0.5)
+        await self.call('GET', '/api/help-locations/nearest', '/api/help-locations/nearest', params=position)
+        if self.rng.random() < 0.5:
+            params = {**position, 'radius': self.rng.choice((5, 10, 20))}
+            if self.rng.random() < 0.5:
+                params['category'] = self.rng.choice(CATEGORIES)
+            await asyncio.gather(
+                self.call('GET', '/api/helpers-nearby', '/api/helpers-nearby', params=params),
+                self.call('GET', '/api/help-locations', '/api/help-locations?lat&lng', params=position)
+            )
+
+
+async def sample_accounts(count: int) -> List[dict]:
+    """Contas sintéticas sorteadas com peso pela quantidade de mensagens enviadas"""
+    pipeline = [
+        {'$sample': {'size': count * 3}},
+        {'$group': {'_id': '$from_user_id'}},
+        {'$limit': count}
+    ]
+    user_ids = [row['_id'] async for row in db.messages.aggregate(pipeline)]
+    query = {'id': {'$in': user_ids}, 'email': {'$regex': SYNTHETIC_EMAIL_REGEX}}
+    accounts = await db.users.find(query, {'_id': 0, 'email': 1, 'location': 1}).to_list(count)
+    if len(accounts) < count:
+        # Completa com contas quaisquer (base sem mensagens ou poucas conversas)
+        more = await db.users.aggregate([
+            {'$match': {'email': {'$regex': SYNTHETIC_EMAIL_REGEX}}},
+            {'$sample': {'size': count - len(accounts)}},
+            {'$project': {'_id': 0, 'email': 1, 'location': 1}}
+        ]).to_list(None)
+        accounts.extend(more)
+    return accounts
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'cenário desconhecido: {name}')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8001')
+    parser.add_argument('--users', type=int, default=100, help='usuários virtuais simultâneos')
+    parser.add_argument('--duration', type=float, default=120, help='duração em segundos (sem contar a rampa)')
+    parser.add_argument('--ramp', type=float, default=30, help='segundos para iniciar todos os usuários')
+    parser.add_argument('--think-time', type=float, default=5, help='tempo médio entre ações (s)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='pesos dos cenários, ex.: chat=0.5,feed=0.3,map=0.2')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='grava o relatório em JSON neste arquivo')
+    args = parser.parse_args()
+
+    accounts = await sample_accounts(args.users)
+    if not accounts:
+        sys.exit('Nenhuma conta sintética encontrada; rode antes benchmarks/generate_data.py')
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + args.ramp + args.duration
+        tasks = []
+        for index, account in enumerate(accounts):
+            user = VirtualUser(client, stats, account, args.mix, random.Random(rng.random()), args.think_time)
+            tasks.append(asyncio.create_task(user.run(deadline)))
+            await asyncio.sleep(args.ramp / len(accounts))
+        print(f'{len(tasks)} usuários virtuais em execução contra {args.base_url}...')
+        await asyncio.gather(*tasks)
+    stats.finished = time.perf_counter()
+
+    stats.print_report()
+    if args.json:
+        report = {'users': len(accounts), 'duration': args.duration, 'mix': args.mix, 'endpoints': stats.summary()}
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
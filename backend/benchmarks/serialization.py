@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização das listagens (sem rede e sem banco).
+
+Compara, para listas de 100 e 1000 posts no formato em que saem do Mongo:
+  - antes: loop de fromisoformat + jsonable_encoder + JSONResponse (caminho
+    padrão do FastAPI para handlers que retornam dicts)
+  - response_model: validação por List[Post] + dump (handlers com response_model)
+  - depois: ORJSONResponse direto do documento (fast_json)
+
+Uso: python benchmarks/serialization.py [--repeat 20]
+"""
+import argparse
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server import Post  # noqa: E402
+
+SIZES = (100, 1000)
+CATEGORIES = ['food', 'legal', 'health', 'housing', 'work', 'education', 'social', 'clothes', 'furniture', 'transport']
+
+
+def sample_posts(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    posts = []
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        posts.append({
+            'id': str(uuid.uuid4()),
+            'user_id': str(uuid.uuid4()),
+            'type': 'need' if i % 3 else 'offer',
+            'category': category,
+            'categories': [category, CATEGORIES[(i + 1) % len(CATEGORIES)]],
+            'title': f'Preciso de ajuda com {category} #{i}',
+            'description': 'Olá, cheguei em Paris há pouco tempo e preciso de orientação. ' * 3,
+            'location': {'lat': 48.85 + i * 1e-4, 'lng': 2.35 - i * 1e-4, 'address': 'Paris'},
+            'images': [f'/api/media/{uuid.uuid4().hex * 2}'],
+            'comment_count': i % 7,
+            'language': 'fr',
+            'author': {'name': f'Usuário {i}', 'display_name': None, 'use_display_name': False, 'role': 'migrant'},
+            'created_at': (now - timedelta(minutes=i)).isoformat(),
+            'can_help': True
+        })
+    return posts
+
+
+def before(posts: List[dict]) -> bytes:
+    for post in posts:
+        if isinstance(post['created_at'], str):
+            post['created_at'] = datetime.fromisoformat(post['created_at'])
+    return JSONResponse(jsonable_encoder(posts)).body
+
+
+def with_response_model(posts: List[dict], adapter=TypeAdapter(List[Post])) -> bytes:
+    validated = adapter.validate_python(posts)
+    return JSONResponse(jsonable_encoder(adapter.dump_python(validated))).body
+
+
+def after(posts: List[dict]) -> bytes:
+    return ORJSONResponse(posts).body
+
+
+def measure(func, size: int, repeat: int) -> float:
+    """Menor tempo médio (ms) por chamada; cada chamada recebe documentos novos"""
+    best = float('inf')
+    for _ in range(repeat):
+        posts = sample_posts(size)
+        best = min(best, timeit.timeit(lambda: func(posts), number=1))
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [('antes (jsonable_encoder)', before), ('response_model=List[Post]', with_response_model),
+             ('depois (orjson)', after)]
+    print(f"{'caminho':<28}" + ''.join(f"{f'{size} itens':>21}" for size in SIZES))
+    baseline = {}
+    for name, func in cases:
+        row = f'{name:<28}'
+        for size in SIZES:
+            ms = measure(func, size, args.repeat)
+            baseline.setdefault(size, ms)
+            row += f'{ms:>9.2f} ms ({baseline[size] / ms:5.1f}x)'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
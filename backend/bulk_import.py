@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Importação em lote e idempotente de documentos no MongoDB.
+
+Os documentos são lidos em streaming (JSON, NDJSON ou CSV) e gravados em
+blocos com bulk_write não ordenado de UpdateOne(upsert=True), usando uma chave
+natural (id, email...) para casar com o que já existe. Cada documento guarda
+um content_hash do seu conteúdo: numa nova execução, os documentos cujo hash
+não mudou são pulados sem escrita. Campos passados em `on_insert` (id gerado,
+created_at, senha...) só são gravados na inserção e ficam fora do hash.
+Depois de gravar, o comando roda os backfills do server.py da coleção (city,
+máscaras, contadores), que os endpoints preenchem na escrita.
+
+Usado pelos endpoints de seed do server.py e como comando:
+
+    python bulk_import.py help_locations locais.ndjson --key id
+    python bulk_import.py users backup_users.csv --key email --numeric location.lat,location.lng
+    python bulk_import.py advertisements anuncios.json --key title --dry-run
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import orjson
+from pymongo import UpdateOne
+
+from reference_data import REFERENCE_COLLECTIONS, bump_version
+
+CHUNK_SIZE = 1000
+# Campos de controle que não fazem parte do conteúdo
+HASH_EXCLUDED = {'_id', 'content_hash'}
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), 'seconds': round(self.seconds, 3), 'per_second': round(self.per_second, 1)}
+
+
+def content_hash(doc: dict) -> str:
+    """Hash estável do documento (chaves ordenadas), ignorando campos de controle"""
+    payload = orjson.dumps(
+        {key: value for key, value in doc.items() if key not in HASH_EXCLUDED},
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str
+    )
+    return hashlib.sha1(payload).hexdigest()
+
+
+def chunked(docs: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_documents(
+    collection,
+    docs: Iterable[dict],
+    key: str,
+    chunk_size: int = CHUNK_SIZE,
+    on_insert: Optional[Callable[[dict], dict]] = None,
+    dry_run: bool = False,
+    progress: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """
+    Faz upsert de `docs` na coleção pela chave natural `key`, em blocos.
+    Por bloco: uma leitura dos hashes existentes e um bulk_write com os
+    documentos novos ou alterados.
+    """
+    stats = ImportStats()
+    start = time.perf_counter()
+    for chunk in chunked(docs, chunk_size):
+        stats.read += len(chunk)
+        # Último documento vence quando a mesma chave aparece mais de uma vez no bloco
+        by_key: Dict[object, dict] = {}
+        for doc in chunk:
+            if doc.get(key) is None:
+                stats.invalid += 1
+                continue
+            doc.pop('_id', None)
+            doc['content_hash'] = content_hash(doc)
+            by_key[doc[key]] = doc
+
+        existing = {
+            row[key]: row.get('content_hash')
+            async for row in collection.find({key: {'$in': list(by_key)}}, {'_id': 0, key: 1, 'content_hash': 1})
+        }
+        operations = []
+        inserts = 0
+        for value, doc in by_key.items():
+            if value not in existing:
+                inserts += 1
+            elif existing[value] == doc['content_hash']:
+                stats.unchanged += 1
+                continue
+            update = {'$set': doc}
+            if on_insert is not None:
+                extra = {field: item for field, item in on_insert(doc).items() if field not in doc}
+                if extra:
+                    update['$setOnInsert'] = extra
+            operations.append(UpdateOne({key: value}, update, upsert=True))
+
+        if operations and not dry_run:
+            result = await collection.bulk_write(operations, ordered=False)
+            stats.inserted += result.upserted_count
+            stats.updated += result.modified_count
+        elif operations:
+            stats.inserted += inserts
+            stats.updated += len(operations) - inserts
+        stats.seconds = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+# ==================== LEITORES ====================
+
+def read_ndjson(stream: io.TextIOBase) -> Iterator[dict]:
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield orjson.loads(line)
+
+
+def read_json(stream: io.TextIOBase) -> Iterator[dict]:
+    """Array JSON (carregado de uma vez) ou {'<coleção>': [...]}; para arquivos grandes use NDJSON"""
+    data = json.load(stream)
+    if isinstance(data, dict):
+        data = next((value for value in data.values() if isinstance(value, list)), [data])
+    yield from data
+
+
+def csv_value(raw: str, numeric: bool):
+    if raw == '':
+        return None
+    if numeric:
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if raw in ('true', 'True'):
+        return True
+    if raw in ('false', 'False'):
+        return False
+    if raw[0] in '{[':
+        try:
+            return json.loads(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def read_csv(stream: io.TextIOBase, numeric: Sequence[str] = (), lists: Sequence[str] = ()) -> Iterator[dict]:
+    """
+    CSV com cabeçalho. Colunas com ponto viram objetos (location.lat ->
+    {'location': {'lat': ...}}), células JSON ({...}/[...]) e booleanos são
+    convertidos; números só nas colunas de `numeric` (telefones e CEPs ficam
+    texto) e listas separadas por ';' nas colunas de `lists` (formato do export).
+    """
+    for row in csv.DictReader(stream):
+        doc: dict = {}
+        for column, raw in row.items():
+            if column is None:
+                continue
+            if column in lists:
+                value = [item for item in raw.split(';') if item] if raw else []
+            else:
+                value = csv_value(raw, column in numeric)
+            target = doc
+            *parents, leaf = column.split('.')
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+        yield doc
+
+
+READERS = {'json': read_json, 'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def detect_format(path: Path) -> str:
+    suffix = path.suffix.lower().lstrip('.')
+    if suffix == 'jsonl':
+        return 'ndjson'
+    if suffix not in READERS:
+        raise ValueError(f'Formato não reconhecido para {path.name}; use --format')
+    return suffix
+
+
+async def run_server_backfills(collection: str):
+    """
+    Completa os documentos importados com os campos que a API grava na escrita
+    (city, máscaras de categorias, comment_count...) pelos backfills do server.py
+    """
+    import server
+    try:
+        await server.run_backfills([collection])
+    finally:
+        server.client.close()
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('collection')
+    parser.add_argument('file', type=Path, help="arquivo de entrada ('-' para stdin)")
+    parser.add_argument('--format', choices=READERS, help='padrão: pela extensão do arquivo')
+    parser.add_argument('--key', default='id', help='chave natural usada no upsert (padrão: id)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--numeric', default='', help='colunas CSV numéricas, separadas por vírgula')
+    parser.add_argument('--lists', default='', help="colunas CSV com listas separadas por ';'")
+    parser.add_argument('--dry-run', action='store_true', help='só compara, sem gravar')
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'watizat_db')]
+
+    file_format = args.format or ('ndjson' if str(args.file) == '-' else detect_format(args.file))
+    stream = sys.stdin if str(args.file) == '-' else open(args.file, encoding='utf-8', newline='')
+    reader_kwargs = {}
+    if file_format == 'csv':
+        reader_kwargs = {
+            'numeric': [column for column in args.numeric.split(',') if column],
+            'lists': [column for column in args.lists.split(',') if column]
+        }
+
+    def progress(stats: ImportStats):
+        print(f'\r{stats.read:,} lidos, {stats.inserted:,} novos, {stats.updated:,} alterados, '
+              f'{stats.unchanged:,} iguais ({stats.per_second:,.0f} docs/s)', end='', flush=True)
+
+    try:
+        stats = await import_documents(
+            db[args.collection], READERS[file_format](stream, **reader_kwargs), args.key,
+            chunk_size=args.chunk_size, dry_run=args.dry_run, progress=progress
+        )
+        print()
+        if not args.dry_run and (stats.inserted or stats.updated):
+            # Workers recarregam as coleções em cache na próxima conferência do carimbo
+            if args.collection in REFERENCE_COLLECTIONS:
+                await bump_version(db, args.collection)
+            await run_server_backfills(args.collection)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        client.close()
+    print(json.dumps(stats.as_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Registro canônico das categorias de ajuda.
+
+Cada categoria tem um bit fixo. Ao lado dos arrays (help_categories e
+need_categories nos usuários, categories nos posts) é gravada a máscara
+inteira correspondente (help_mask, need_mask, category_mask), indexada: a
+compatibilidade entre um voluntário e um pedido vira um único AND bit a bit em
+Python e `$bitsAnySet` nas consultas ao Mongo.
+
+A ordem de CATEGORIES define os bits e só pode crescer no fim: reordenar ou
+remover uma categoria muda o significado das máscaras já gravadas.
+Categorias fora do registro não têm bit e são ignoradas nas máscaras.
+"""
+from typing import Dict, Iterable, List, Optional
+
+CATEGORIES = (
+    'food', 'legal', 'health', 'housing', 'work',
+    'education', 'social', 'clothes', 'furniture', 'transport'
+)
+CATEGORY_BITS: Dict[str, int] = {name: 1 << position for position, name in enumerate(CATEGORIES)}
+
+# Campo de array -> campo da máscara no documento do usuário
+USER_MASK_FIELDS = {'help_categories': 'help_mask', 'need_categories': 'need_mask'}
+
+
+def category_mask(categories: Optional[Iterable[str]]) -> int:
+    mask = 0
+    for category in categories or ():
+        mask |= CATEGORY_BITS.get(category, 0)
+    return mask
+
+
+def mask_categories(mask: int) -> List[str]:
+    """Categorias com o bit ligado, na ordem do registro"""
+    return [name for name, bit in CATEGORY_BITS.items() if mask & bit]
+
+
+def post_categories(post: dict) -> List[str]:
+    return post.get('categories') or ([post['category']] if post.get('category') else [])
+
+
+def post_category_mask(post: dict) -> int:
+    """Máscara gravada no post; posts ainda sem o campo são calculados na hora"""
+    mask = post.get('category_mask')
+    return category_mask(post_categories(post)) if mask is None else mask
+
+
+def user_masks(user: dict) -> dict:
+    """help_mask/need_mask dos arrays de categorias presentes no documento"""
+    return {mask_field: category_mask(user[field]) for field, mask_field in USER_MASK_FIELDS.items() if field in user}
+
+
+def first_match(categories: Iterable[str], mask: int) -> Optional[str]:
+    """Primeira categoria da lista cujo bit está em `mask`"""
+    return next((category for category in categories if CATEGORY_BITS.get(category, 0) & mask), None)
@@ -0,0 +1,99 @@
+"""
+Cidades atendidas pela plataforma.
+
+Posts, usuários, locais de ajuda e a base de conhecimento do assistente levam
+um campo `city` (slug de CITIES). As consultas quentes filtram por ele e os
+índices começam por city, o que deixa cada cidade pagando só pelos próprios
+dados e prepara as coleções para um shard key {city: 1, id: 1}.
+
+CityCache guarda em memória, por cidade, dados carregados sob demanda (só as
+cidades que recebem tráfego no processo ocupam memória).
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CITIES = {
+    'paris': {'name': 'Paris', 'country': 'FR', 'lat': 48.8566, 'lng': 2.3522, 'radius_km': 40},
+    'lyon': {'name': 'Lyon', 'country': 'FR', 'lat': 45.7640, 'lng': 4.8357, 'radius_km': 30},
+    'marseille': {'name': 'Marseille', 'country': 'FR', 'lat': 43.2965, 'lng': 5.3698, 'radius_km': 30},
+    'brussels': {'name': 'Bruxelles', 'country': 'BE', 'lat': 50.8503, 'lng': 4.3517, 'radius_km': 30}
+}
+CITY_ALIASES = {'bruxelles': 'brussels', 'brussel': 'brussels', 'bruxelas': 'brussels', 'marselha': 'marseille', 'lião': 'lyon'}
+DEFAULT_CITY = os.environ.get('DEFAULT_CITY', 'paris')
+
+
+def normalize_city(value: Optional[str]) -> Optional[str]:
+    """Slug da cidade a partir do slug, nome ou apelido; None se não for atendida"""
+    if not value:
+        return None
+    key = value.strip().lower()
+    key = CITY_ALIASES.get(key, key)
+    return key if key in CITIES else None
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def city_for_location(location: Optional[dict]) -> Optional[str]:
+    """Cidade mais próxima cujo raio contém o ponto {lat, lng}"""
+    if not location:
+        return None
+    try:
+        lat, lng = float(location.get('lat')), float(location.get('lng'))
+    except (TypeError, ValueError):
+        return None
+    best, best_distance = None, float('inf')
+    for slug, city in CITIES.items():
+        distance = distance_km(lat, lng, city['lat'], city['lng'])
+        if distance <= city['radius_km'] and distance < best_distance:
+            best, best_distance = slug, distance
+    return best
+
+
+def resolve_city(explicit: Optional[str] = None, location: Optional[dict] = None,
+                 fallback: Optional[str] = None) -> str:
+    """Cidade informada, senão a da localização, senão `fallback` ou a padrão"""
+    return normalize_city(explicit) or city_for_location(location) or fallback or DEFAULT_CITY
+
+
+def city_bbox(city: str) -> Tuple[float, float, float, float]:
+    """Retângulo (min_lat, max_lat, min_lng, max_lng) que contém o raio da cidade"""
+    info = CITIES[city]
+    dlat = info['radius_km'] / 111.0
+    dlng = info['radius_km'] / (111.0 * math.cos(math.radians(info['lat'])))
+    return info['lat'] - dlat, info['lat'] + dlat, info['lng'] - dlng, info['lng'] + dlng
+
+
+class CityCache:
+    """Cache por cidade com validade; cada cidade é carregada uma vez mesmo com requisições simultâneas"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[object, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, city: str, load: Callable[[str], Awaitable[object]]):
+        entry = self._entries.get(city)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        lock = self._locks.setdefault(city, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(city)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            value = await load(city)
+            self._entries[city] = (value, time.monotonic() + self.ttl)
+            return value
+
+    def invalidate(self, city: Optional[str] = None):
+        if city is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(city, None)
@@ -0,0 +1,258 @@
+"""
+Compressão das respostas HTTP.
+
+CompressionMiddleware comprime com brotli ou gzip (negociado pelo
+Accept-Encoding) as respostas de texto/JSON acima de MINIMUM_SIZE, inclusive
+as em streaming. Os níveis são baixos de propósito: nas respostas dinâmicas a
+maior parte do ganho vem nos primeiros níveis e o custo de CPU cresce rápido
+depois deles.
+
+Respostas estáticas ou cacheáveis usam PrecompressedPayload: o corpo é
+comprimido uma única vez no nível máximo e servido como está; o middleware
+não recomprime respostas que já têm Content-Encoding.
+"""
+import asyncio
+import gzip
+import hashlib
+import inspect
+import time
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só gzip é oferecido
+    brotli = None
+
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Payloads pré-comprimidos são comprimidos uma vez só: vale o nível máximo
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml'
+)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Escolhe 'br' ou 'gzip' conforme o Accept-Encoding (respeitando q=0)"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    if brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.flush
+            self._finish = self._compressor.finish
+        else:
+            # wbits 16+ gera o cabeçalho gzip
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def chunk(self, data: bytes) -> bytes:
+        # Flush a cada bloco para que o streaming continue chegando aos poucos
+        return self._compress(data) + self._flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compress(data) + self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get('accept-encoding'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                passthrough = (
+                    'content-encoding' in headers
+                    or message['status'] in (204, 206, 304)
+                    or not is_compressible(headers.get('content-type', ''))
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    # Segura o início até saber o tamanho do primeiro bloco
+                    start_message = message
+                return
+
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message['headers'])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    headers.add_vary_header('Accept-Encoding')
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding)
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                if 'content-length' in headers:
+                    del headers['content-length']
+                if not more_body:
+                    body = compressor.finish(body)
+                    headers['Content-Length'] = str(len(body))
+                else:
+                    body = compressor.chunk(body)
+                await send(start_message)
+                start_message = None
+                await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+                return
+
+            body = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedPayload:
+    """
+    Corpo JSON serializado e comprimido uma única vez, servido com ETag.
+    Payloads de vida curta (páginas de listagem) podem usar os níveis dinâmicos.
+    """
+
+    def __init__(self, content, media_type: str = 'application/json', max_age: int = 0,
+                 headers: Optional[Dict[str, str]] = None, gzip_level: int = STATIC_GZIP_LEVEL,
+                 brotli_quality: int = STATIC_BROTLI_QUALITY):
+        self.body = orjson.dumps(content)
+        self.media_type = media_type
+        self.max_age = max_age
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.encoded: Dict[str, bytes] = {'gzip': gzip.compress(self.body, compresslevel=gzip_level, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body, quality=brotli_quality)
+
+    def response(self, request) -> Response:
+        headers = {
+            **self.headers,
+            'ETag': self.etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': f'public, max-age={self.max_age}' if self.max_age else 'no-cache'
+        }
+        if request.headers.get('if-none-match') == self.etag:
+            return Response(status_code=304, headers=headers)
+
+        encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+        if encoding in self.encoded and len(self.body) >= MINIMUM_SIZE:
+            headers['Content-Encoding'] = encoding
+            return Response(self.encoded[encoding], media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+class PayloadCache:
+    """
+    Cache em memória de PrecompressedPayload por chave, com validade opcional
+    (segundos). `build` pode ser uma função comum ou uma corrotina e devolve o
+    conteúdo ou um PrecompressedPayload pronto (com headers próprios).
+    Com `max_entries`, ao passar do limite saem as entradas vencidas e, se
+    ainda faltar espaço, as mais antigas.
+
+    Uma chave vencida é reconstruída uma vez só: as requisições que chegam
+    durante a construção esperam a mesma task em vez de montar e comprimir o
+    payload de novo.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[PrecompressedPayload, float]] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str, build: Callable[[], object], ttl: Optional[float] = None,
+                  max_age: int = 0) -> PrecompressedPayload:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._build(key, build, ttl, max_age))
+        # shield: quem desiste (cliente desconectou) não cancela a construção dos outros
+        return await asyncio.shield(task)
+
+    async def _build(self, key: str, build: Callable[[], object], ttl: Optional[float],
+                     max_age: int) -> PrecompressedPayload:
+        try:
+            content = build()
+            if inspect.isawaitable(content):
+                content = await content
+            payload = content if isinstance(content, PrecompressedPayload) else PrecompressedPayload(content, max_age=max_age)
+            # Um invalidate() durante a construção descarta o resultado (pode já estar velho)
+            if self._pending.get(key) is asyncio.current_task():
+                now = time.monotonic()
+                self._entries.pop(key, None)
+                self._entries[key] = (payload, now + ttl if ttl is not None else float('inf'))
+                if self.max_entries is not None and len(self._entries) > self.max_entries:
+                    self._evict(now)
+            return payload
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+
+    def _evict(self, now: float):
+        for key in [key for key, (_, expires) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        # Dicionário em ordem de inserção: as primeiras são as mais antigas
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, prefix: str = ''):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+        # Construções em andamento terminam para quem já espera, mas não ficam no cache
+        for key in [key for key in self._pending if key.startswith(prefix)]:
+            del self._pending[key]
@@ -0,0 +1,63 @@
+"""
+Configuração do gunicorn para produção:
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+Cada worker é um processo uvicorn (asyncio) com seu próprio pool do Mongo.
+Com preload_app o server.py é importado uma vez no master e os workers herdam
+por fork os dados somente leitura (HELP_LOCATIONS, base de conhecimento do
+assistente, respostas automáticas); as conexões e tarefas de cada worker são
+abertas no lifespan, depois do fork.
+
+Índices e backfills não rodam nos workers: o master roda migrate.py uma vez,
+num processo separado, antes de criar os workers (on_starting). Os jobs
+periódicos ficam em todos os workers, mas cada rodada só executa no dono do
+lease em job_leases.
+
+Variáveis de ambiente:
+    PORT             porta (padrão 8001)
+    WEB_CONCURRENCY  número de workers (padrão: um por core)
+    GRACEFUL_TIMEOUT segundos para um worker terminar as requisições ao parar
+    MIGRATE_ON_START 0 para não rodar migrate.py no master (quando ele já roda
+                     como comando de release)
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Lido pelo server.py no import (o preload acontece depois deste arquivo): os
+# workers não disparam as migrações no startup
+os.environ['MIGRATIONS_ON_STARTUP'] = '0'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+# Workers async não ficam bloqueados esperando o banco: um por core basta
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+preload_app = True
+
+# Ao receber SIGTERM o worker para de aceitar conexões, termina as requisições
+# em andamento e roda o shutdown do lifespan; passado o prazo, é encerrado
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = 60
+keepalive = 5
+
+# Recicla os workers de tempos em tempos para conter crescimento de memória
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Roda as migrações antes dos workers; uma falha é registrada e o servidor sobe mesmo assim"""
+    if os.environ.get('MIGRATE_ON_START', '1') != '1':
+        return
+    # Processo separado: o cliente do Mongo não é aberto no master antes do fork
+    result = subprocess.run([sys.executable, 'migrate.py'], cwd=BACKEND_DIR)
+    if result.returncode != 0:
+        server.log.error(f"migrate.py exited with status {result.returncode}")
@@ -567,12 +567,19 @@ HELP_LOCATIONS = [
     },
 ]
 
-def get_all_help_locations():
-    """Retorna todos os locais de ajuda"""
-    return HELP_LOCATIONS
+# Locais embutidos por cidade. Outras cidades entram pelo seed/importação na
+# coleção help_locations (com o campo city), sem precisar de deploy.
+HELP_LOCATIONS_BY_CITY = {
+    'paris': HELP_LOCATIONS
+}
 
-def get_help_locations_by_category(category: str):
+def get_all_help_locations(city: str = 'paris'):
+    """Retorna todos os locais de ajuda embutidos de uma cidade"""
+    return HELP_LOCATIONS_BY_CITY.get(city, [])
+
+def get_help_locations_by_category(category: str, city: str = 'paris'):
     """Retorna locais de ajuda por categoria"""
+    locations = get_all_help_locations(city)
     if category == 'all':
-        return HELP_LOCATIONS
-    return [loc for loc in HELP_LOCATIONS if loc['category'] == category]
+        return locations
+    return [loc for loc in locations if loc['category'] == category]
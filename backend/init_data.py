@@ -3,6 +3,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from reference_data import bump_version
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -110,6 +111,8 @@ async def init_services():
     await db.services.delete_many({})
     
     await db.services.insert_many(services)
+    # Workers do backend recarregam os serviços na próxima conferência do carimbo
+    await bump_version(db, 'services')
     
     print(f"✅ {len(services)} serviços inseridos com sucesso!")
 
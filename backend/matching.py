@@ -0,0 +1,204 @@
+"""
+Ranking de helpers/voluntários sugeridos para um migrante.
+
+A fonte é a coleção match_candidates (um documento por helper ativo e cidade,
+mantido pelo server.py quando o perfil muda e pelo job de responsividade).
+Cada worker guarda em memória um CityCandidates por cidade e o atualiza de
+forma incremental: só os documentos com updated_at depois do watermark são
+relidos.
+
+Pontuação (pesos em MATCH_WEIGHTS, somam 1):
+  - category: fração das necessidades do migrante que o helper cobre
+  - language: 1 se há um idioma em comum
+  - distance: 1 no mesmo ponto, 0 a partir de MATCH_MAX_DISTANCE_KM
+  - availability / responsiveness: parte fixa do candidato (static)
+
+Os candidatos ficam em grupos com as mesmas categorias e idiomas, ordenados
+pela parte fixa. O top-k percorre os grupos do maior limite superior para o
+menor e para assim que nem a melhor distância possível alcança o k-ésimo
+colocado, sem pontuar a maior parte dos candidatos.
+"""
+import asyncio
+import heapq
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+MATCH_WEIGHTS = {'category': 0.35, 'language': 0.2, 'distance': 0.2, 'availability': 0.1, 'responsiveness': 0.15}
+MATCH_MAX_DISTANCE_KM = 25.0
+# Sem histórico de conversas o helper fica no meio da escala
+DEFAULT_RESPONSIVENESS = 0.5
+# Releitura dos documentos alterados pouco antes do watermark (escritas que
+# terminaram fora de ordem); aplicar o mesmo documento duas vezes não muda nada
+INDEX_OVERLAP = timedelta(seconds=30)
+EARTH_RADIUS_KM = 6371.0
+
+# Idiomas ganham bits na ordem em que aparecem (só dentro do processo)
+LANGUAGE_BITS: Dict[str, int] = {}
+
+
+def language_mask(languages: Optional[Iterable[str]]) -> int:
+    mask = 0
+    for language in languages or ():
+        bit = LANGUAGE_BITS.get(language)
+        if bit is None:
+            bit = LANGUAGE_BITS[language] = 1 << len(LANGUAGE_BITS)
+        mask |= bit
+    return mask
+
+
+class Candidate:
+    """Candidato pronto para pontuar; igualdade por identidade (remoção rápida das listas)"""
+    __slots__ = ('id', 'help_mask', 'language_mask', 'lat', 'lng', 'cos_lat',
+                 'availability', 'responsiveness', 'static', 'updated_at')
+
+    def __init__(self, doc: dict):
+        self.id = doc['id']
+        self.help_mask = doc.get('help_mask') or 0
+        self.language_mask = language_mask(doc.get('languages'))
+        location = doc.get('location') or {}
+        if location.get('lat') is not None and location.get('lng') is not None:
+            self.lat, self.lng = math.radians(location['lat']), math.radians(location['lng'])
+            self.cos_lat = math.cos(self.lat)
+        else:
+            self.lat = self.lng = self.cos_lat = None
+        self.availability = 1.0 if doc.get('available') else 0.5
+        self.responsiveness = doc.get('responsiveness', DEFAULT_RESPONSIVENESS)
+        self.static = (MATCH_WEIGHTS['availability'] * self.availability
+                       + MATCH_WEIGHTS['responsiveness'] * self.responsiveness)
+        self.updated_at = doc.get('updated_at')
+
+
+def static_key(candidate: Candidate) -> float:
+    return -candidate.static
+
+
+class CityCandidates:
+    """
+    Candidatos de uma cidade agrupados por (help_mask, language_mask), cada
+    grupo em ordem de static decrescente. Dentro de um grupo categoria e idioma
+    pontuam igual, então o limite superior do grupo só depende da distância.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, Candidate] = {}
+        self.groups: Dict[Tuple[int, int], List[Candidate]] = {}
+        self.watermark: Optional[str] = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def apply(self, docs: List[dict]):
+        """Aplica documentos de match_candidates (removed=True tira o candidato)"""
+        touched = set()
+        for doc in docs:
+            updated_at = doc.get('updated_at')
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+            current = self.by_id.get(doc['id'])
+            if current is not None and current.updated_at == updated_at:
+                continue
+            if current is not None:
+                group_key = (current.help_mask, current.language_mask)
+                self.groups[group_key].remove(current)
+                if not self.groups[group_key]:
+                    del self.groups[group_key]
+                del self.by_id[current.id]
+            if not doc.get('removed'):
+                candidate = Candidate(doc)
+                group_key = (candidate.help_mask, candidate.language_mask)
+                self.by_id[candidate.id] = candidate
+                self.groups.setdefault(group_key, []).append(candidate)
+                touched.add(group_key)
+        # Grupos já ordenados com alguns itens no fim: o sort é quase linear
+        for group_key in touched:
+            if group_key in self.groups:
+                self.groups[group_key].sort(key=static_key)
+
+    def top(self, need_mask: int, languages_mask: int, location: Optional[dict], k: int,
+            exclude: Iterable[str] = ()) -> List[tuple]:
+        """Os k melhores como (score, candidato, partes), do maior para o menor"""
+        lat = lng = cos_lat = None
+        if location and location.get('lat') is not None and location.get('lng') is not None:
+            lat, lng = math.radians(location['lat']), math.radians(location['lng'])
+            cos_lat = math.cos(lat)
+        need_count = bin(need_mask).count('1')
+        w_distance = MATCH_WEIGHTS['distance'] if lat is not None else 0.0
+
+        # Grupos com alguma categoria em comum (todos se o migrante não tem
+        # necessidades), do maior limite superior para o menor
+        plan = []
+        for (help_mask, group_languages), members in self.groups.items():
+            if need_mask and not help_mask & need_mask:
+                continue
+            category = bin(need_mask & help_mask).count('1') / need_count if need_mask else 0.0
+            language = 1.0 if languages_mask & group_languages else 0.0
+            fixed = MATCH_WEIGHTS['category'] * category + MATCH_WEIGHTS['language'] * language
+            plan.append((members[0].static + fixed + w_distance, fixed, category, language, members))
+        plan.sort(key=lambda item: item[0], reverse=True)
+
+        excluded = set(exclude)
+        best: List[tuple] = []
+        counter = 0
+        for bound, fixed, category, language, members in plan:
+            if len(best) >= k and bound <= best[0][0]:
+                break
+            for candidate in members:
+                if len(best) >= k and candidate.static + fixed + w_distance <= best[0][0]:
+                    break
+                if candidate.id in excluded:
+                    continue
+                distance_km = None
+                distance = 0.0
+                if lat is not None and candidate.lat is not None:
+                    x = (candidate.lng - lng) * (cos_lat + candidate.cos_lat) / 2
+                    distance_km = EARTH_RADIUS_KM * math.hypot(x, candidate.lat - lat)
+                    distance = max(0.0, 1 - distance_km / MATCH_MAX_DISTANCE_KM)
+                score = candidate.static + fixed + w_distance * distance
+
+                counter += 1
+                entry = (score, -counter, candidate, distance_km, category, language)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, entry)
+
+        return [
+            (score, candidate, {
+                'category': round(category, 3),
+                'language': language,
+                'distance_km': round(distance_km, 2) if distance_km is not None else None,
+                'availability': candidate.availability,
+                'responsiveness': round(candidate.responsiveness, 3)
+            })
+            for score, _, candidate, distance_km, category, language in sorted(best, reverse=True)
+        ]
+
+
+class MatchIndex:
+    """CityCandidates por cidade, atualizados a cada `refresh_seconds` com `load_changes(city, since)`"""
+
+    def __init__(self, load_changes: Callable[[str, Optional[str]], Awaitable[List[dict]]], refresh_seconds: float):
+        self.load_changes = load_changes
+        self.refresh_seconds = refresh_seconds
+        self._cities: Dict[str, CityCandidates] = {}
+
+    async def city(self, city: str) -> CityCandidates:
+        state = self._cities.setdefault(city, CityCandidates())
+        if state.checked_at + self.refresh_seconds > time.monotonic():
+            return state
+        async with state.lock:
+            if state.checked_at + self.refresh_seconds > time.monotonic():
+                return state
+            since = None
+            if state.watermark:
+                since = (datetime.fromisoformat(state.watermark) - INDEX_OVERLAP).astimezone(timezone.utc).isoformat()
+            state.apply(await self.load_changes(city, since))
+            state.checked_at = time.monotonic()
+        return state
+
+    def invalidate(self, city: Optional[str] = None):
+        """Força a próxima consulta a buscar alterações (não descarta o que já está carregado)"""
+        for slug, state in self._cities.items():
+            if city is None or slug == city:
+                state.checked_at = 0.0
@@ -0,0 +1,612 @@
+"""
+Armazenamento de mídia (fotos e vídeos) endereçado por conteúdo.
+
+Os arquivos ficam no GridFS (bucket 'media') usando o SHA-256 do conteúdo como
+nome, então o mesmo arquivo enviado várias vezes é guardado uma única vez. Quem
+grava é quem cria o documento do hash em media.objects (_id único): um upload
+simultâneo do mesmo arquivo recebe DuplicateKeyError e vira deduplicado.
+Posts e mensagens guardam apenas a referência /api/media/<sha256>.
+
+Antes de guardar, as imagens perdem os metadados (EXIF com GPS, câmera e datas,
+XMP, IPTC, comentários) sem recodificar: o original servido nunca carrega a
+localização de quem enviou. Só a orientação do EXIF é mantida, num EXIF mínimo.
+
+Fotos passam por um pipeline assíncrono em um pool de processos que corrige a
+orientação, recodifica em WebP e gera as variantes de tamanho
+(IMAGE_VARIANTS), guardadas ao lado do original como <sha256>.<variante>.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele as variantes caem no original
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_URL_PREFIX = '/api/media/'
+MAX_MEDIA_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE_BYTES = 255 * 1024
+
+# Variantes geradas para cada foto: nome -> maior lado em pixels.
+# 'display' é a versão normalizada servida quando nenhuma variante é pedida.
+IMAGE_VARIANTS = {'display': 2048, 'medium': 1280, 'small': 640, 'thumb': 320}
+VARIANT_CONTENT_TYPE = 'image/webp'
+VARIANT_QUALITY = 80
+# GIFs ficam de fora para não perder a animação
+PROCESSABLE_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', min(2, os.cpu_count() or 1)))
+# Um upload que reservou o hash e não gravou nesse prazo (processo morreu) perde a reserva
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Imagens cujos metadados são removidos no upload (vídeos são guardados como vieram)
+STRIPPED_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
+
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+    'video/mp4', 'video/webm', 'video/quicktime'
+}
+
+MEDIA_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+DATA_URL_PATTERN = re.compile(r'^data:([\w.+-]+/[\w.+-]+)?(;[\w=-]+)*;base64,', re.IGNORECASE)
+
+
+class MediaError(ValueError):
+    """Arquivo de mídia inválido (tipo não suportado, muito grande, mal formado)"""
+
+
+def media_url(media_id: str, variant: Optional[str] = None) -> str:
+    url = f"{MEDIA_URL_PREFIX}{media_id}"
+    return f"{url}?variant={variant}" if variant else url
+
+
+def media_id_from_url(value: str) -> Optional[str]:
+    """Extrai o SHA-256 de uma referência /api/media/<sha256>[?variant=...]"""
+    if not value.startswith(MEDIA_URL_PREFIX):
+        return None
+    media_id = value[len(MEDIA_URL_PREFIX):].split('?', 1)[0]
+    return media_id if MEDIA_ID_PATTERN.match(media_id) else None
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    """Detecta o tipo real do arquivo pelos bytes iniciais"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:8] == b'ftyp':
+        return 'video/quicktime' if data[8:12] == b'qt  ' else 'video/mp4'
+    if data.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm'
+    return None
+
+
+def parse_data_url(value: str) -> Tuple[bytes, Optional[str]]:
+    """Decodifica uma data URL base64 (formato enviado pelo FileReader do frontend)"""
+    match = DATA_URL_PATTERN.match(value)
+    if not match:
+        raise MediaError("Invalid data URL")
+    # Estimativa do tamanho antes de decodificar para não alocar arquivos enormes
+    if (len(value) - match.end()) * 3 // 4 > MAX_MEDIA_BYTES:
+        raise MediaError("File too large")
+    try:
+        data = base64.b64decode(value[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        raise MediaError("Invalid base64 payload")
+    return data, match.group(1)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um header Range de intervalo único (bytes=inicio-fim).
+    Retorna (inicio, fim) inclusivo, None se o header deve ser ignorado,
+    ou levanta MediaError se o intervalo não é satisfazível.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_str, _, end_str = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_str == '':
+            # Sufixo: últimos N bytes
+            length = int(end_str)
+            if length <= 0:
+                raise MediaError("Unsatisfiable range")
+            return max(size - length, 0), size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise MediaError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+async def iter_grid_out(grid_out, length: int, chunk_size: int = CHUNK_SIZE_BYTES):
+    """Lê `length` bytes a partir da posição atual do arquivo, em blocos"""
+    remaining = length
+    while remaining > 0:
+        chunk = await grid_out.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+# ==================== REMOÇÃO DE METADADOS ====================
+# Trabalha nos segmentos/chunks de cada formato, sem decodificar a imagem:
+# sem perda de qualidade e sem depender do Pillow.
+
+EXIF_ORIENTATION_TAG = 0x0112
+JPEG_SOS, JPEG_EOI, JPEG_COM = 0xDA, 0xD9, 0xFE
+# APPn mantidos além do APP0 (JFIF): perfil de cor ICC e o marcador Adobe (cores CMYK)
+JPEG_KEPT_APP_SEGMENTS = {0xE2: b'ICC_PROFILE', 0xEE: b'Adobe'}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+WEBP_EXIF_FLAG, WEBP_XMP_FLAG = 0x08, 0x04
+GIF_LOOP_EXTENSIONS = (b'NETSCAPE2.0', b'ANIMEXTS1.0')
+
+
+def exif_orientation(tiff: bytes) -> Optional[int]:
+    """Orientação (1-8) do IFD0 de um bloco TIFF/EXIF, se houver"""
+    order = {b'II': 'little', b'MM': 'big'}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return None
+    offset = int.from_bytes(tiff[4:8], order)
+    if offset + 2 > len(tiff):
+        return None
+    for index in range(int.from_bytes(tiff[offset:offset + 2], order)):
+        entry = offset + 2 + 12 * index
+        if entry + 12 > len(tiff):
+            return None
+        if int.from_bytes(tiff[entry:entry + 2], order) == EXIF_ORIENTATION_TAG:
+            value = int.from_bytes(tiff[entry + 8:entry + 10], order)
+            return value if 1 <= value <= 8 else None
+    return None
+
+
+def minimal_exif(orientation: int) -> bytes:
+    """Bloco TIFF só com a orientação (big-endian, um IFD de uma entrada)"""
+    return (b'MM\x00\x2a' + (8).to_bytes(4, 'big') + (1).to_bytes(2, 'big')
+            + EXIF_ORIENTATION_TAG.to_bytes(2, 'big') + (3).to_bytes(2, 'big') + (1).to_bytes(4, 'big')
+            + orientation.to_bytes(2, 'big') + b'\x00\x00' + (0).to_bytes(4, 'big'))
+
+
+def keep_jpeg_segment(marker: int, payload: bytes) -> bool:
+    if marker == JPEG_COM:
+        return False
+    if 0xE1 <= marker <= 0xEF:
+        prefix = JPEG_KEPT_APP_SEGMENTS.get(marker)
+        return prefix is not None and payload.startswith(prefix)
+    return True
+
+
+def strip_jpeg(data: bytes) -> bytes:
+    """
+    Mantém JFIF (APP0), perfil ICC (APP2) e Adobe (APP14); descarta os demais
+    APPn e comentários, e tudo depois do EOI (imagens extras do MPF, lixo)
+    """
+    segments = []
+    orientation = None
+    pos = 2
+    while True:
+        if pos + 2 > len(data) or data[pos] != 0xFF:
+            raise MediaError("Invalid image")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == JPEG_EOI:
+            segments.append(data[pos:pos + 2])
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            segments.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if end > len(data) or end < pos + 4:
+            raise MediaError("Invalid image")
+        payload = data[pos + 4:end]
+        if marker == 0xE1 and payload.startswith(b'Exif\x00\x00'):
+            orientation = exif_orientation(payload[6:])
+        elif keep_jpeg_segment(marker, payload):
+            segments.append(data[pos:end])
+        pos = end
+        if marker == JPEG_SOS:
+            # Dados entrópicos até o próximo marcador (0xFF00 e RSTn fazem parte deles)
+            scan_end = pos
+            while True:
+                scan_end = data.find(b'\xff', scan_end)
+                if scan_end < 0 or scan_end + 1 >= len(data):
+                    raise MediaError("Invalid image")
+                if data[scan_end + 1] == 0x00 or 0xD0 <= data[scan_end + 1] <= 0xD7:
+                    scan_end += 2
+                    continue
+                break
+            segments.append(data[pos:scan_end])
+            pos = scan_end
+
+    if orientation and orientation != 1:
+        tiff = minimal_exif(orientation)
+        app1 = b'\xff\xe1' + (8 + len(tiff)).to_bytes(2, 'big') + b'Exif\x00\x00' + tiff
+        # Depois do APP0 (JFIF), que deve ser o primeiro segmento
+        segments.insert(1 if segments and segments[0][1] == 0xE0 else 0, app1)
+    return b'\xff\xd8' + b''.join(segments)
+
+
+def strip_png(data: bytes) -> bytes:
+    chunks = [PNG_SIGNATURE]
+    pos = len(PNG_SIGNATURE)
+    while True:
+        if pos + 12 > len(data):
+            raise MediaError("Invalid image")
+        chunk_type = data[pos + 4:pos + 8]
+        end = pos + 12 + int.from_bytes(data[pos:pos + 4], 'big')
+        if end > len(data):
+            raise MediaError("Invalid image")
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            chunks.append(data[pos:end])
+        pos = end
+        if chunk_type == b'IEND':
+            return b''.join(chunks)
+
+
+def strip_webp(data: bytes) -> bytes:
+    """Tira os chunks EXIF e XMP do formato estendido (VP8X); a orientação vira um EXIF mínimo"""
+    if data[:4] != b'RIFF' or data[8:12] != b'WEBP':
+        raise MediaError("Invalid image")
+    chunks = []
+    orientation = None
+    pos = 12
+    while pos < len(data):
+        if pos + 8 > len(data):
+            raise MediaError("Invalid image")
+        fourcc = data[pos:pos + 4]
+        size = int.from_bytes(data[pos + 4:pos + 8], 'little')
+        end = pos + 8 + size + (size & 1)
+        if end > len(data) + (size & 1):
+            raise MediaError("Invalid image")
+        if fourcc == b'EXIF':
+            payload = data[pos + 8:pos + 8 + size]
+            orientation = exif_orientation(payload[6:] if payload.startswith(b'Exif\x00\x00') else payload)
+        elif fourcc != b'XMP ':
+            chunks.append(bytearray(data[pos:end]))
+        pos = end
+
+    if chunks and chunks[0][:4] == b'VP8X':
+        flags = chunks[0][8] & ~(WEBP_EXIF_FLAG | WEBP_XMP_FLAG)
+        if orientation and orientation != 1:
+            tiff = minimal_exif(orientation)
+            chunks.append(bytearray(b'EXIF' + len(tiff).to_bytes(4, 'little') + tiff + b'\x00' * (len(tiff) & 1)))
+            flags |= WEBP_EXIF_FLAG
+        chunks[0][8] = flags
+    body = b'WEBP' + b''.join(chunks)
+    return b'RIFF' + len(body).to_bytes(4, 'little') + body
+
+
+def skip_gif_sub_blocks(data: bytes, pos: int) -> int:
+    while True:
+        if pos >= len(data):
+            raise MediaError("Invalid image")
+        size = data[pos]
+        pos += 1 + size
+        if size == 0:
+            return pos
+
+
+def strip_gif(data: bytes) -> bytes:
+    """Descarta comentários e extensões de aplicação (XMP), menos a de repetição da animação"""
+    pos = 13
+    if len(data) < pos:
+        raise MediaError("Invalid image")
+    if data[10] & 0x80:
+        pos += 3 * 2 ** ((data[10] & 0x07) + 1)
+    blocks = [data[:pos]]
+    while True:
+        if pos >= len(data):
+            raise MediaError("Invalid image")
+        introducer = data[pos]
+        if introducer == 0x3B:
+            blocks.append(b';')
+            return b''.join(blocks)
+        if introducer == 0x21:
+            label = data[pos + 1] if pos + 1 < len(data) else None
+            end = skip_gif_sub_blocks(data, pos + 2)
+            if label in (0xF9, 0x01) or (label == 0xFF and data[pos + 3:pos + 14] in GIF_LOOP_EXTENSIONS):
+                blocks.append(data[pos:end])
+        elif introducer == 0x2C:
+            if pos + 10 > len(data):
+                raise MediaError("Invalid image")
+            end = pos + 10
+            if data[pos + 9] & 0x80:
+                end += 3 * 2 ** ((data[pos + 9] & 0x07) + 1)
+            end = skip_gif_sub_blocks(data, end + 1)
+            blocks.append(data[pos:end])
+        else:
+            raise MediaError("Invalid image")
+        pos = end
+
+
+STRIPPERS = {'image/jpeg': strip_jpeg, 'image/png': strip_png, 'image/webp': strip_webp, 'image/gif': strip_gif}
+
+
+def strip_metadata(data: bytes, content_type: Optional[str]) -> bytes:
+    """Imagem sem metadados; outros tipos voltam como estão. Arquivo mal formado levanta MediaError"""
+    strip = STRIPPERS.get(content_type)
+    if strip is None:
+        return data
+    try:
+        return strip(data)
+    except IndexError:
+        raise MediaError("Invalid image")
+
+
+def variant_name(media_id: str, variant: str) -> str:
+    return f"{media_id}.{variant}"
+
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Executado no pool de processos: aplica a orientação do EXIF, descarta os
+    metadados e gera cada variante a partir da anterior (da maior para a menor).
+    """
+    variants = {}
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            # Paleta/cinza com transparência (PNG, GIF) continua com alfa no WebP
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        for name, size in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+            image.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            # Sem o parâmetro exif o WebP sai sem metadados (GPS, câmera, etc.)
+            image.save(output, format='WEBP', quality=VARIANT_QUALITY, method=4)
+            variants[name] = output.getvalue()
+    return variants
+
+
+class MediaStore:
+    def __init__(self, db, bucket_name: str = 'media', workers: int = MEDIA_WORKERS):
+        self.db = db
+        self.bucket_name = bucket_name
+        self._bucket = None
+        self.files = db[f'{bucket_name}.files']
+        self.objects = db[f'{bucket_name}.objects']
+        self.workers = max(1, workers)
+        self._pool = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._processing: Dict[str, asyncio.Task] = {}
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # Criado no primeiro uso: o bucket se prende ao event loop corrente, que
+        # ainda não existe quando o módulo é importado (ex.: preload do gunicorn)
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(
+                self.db, bucket_name=self.bucket_name, chunk_size_bytes=CHUNK_SIZE_BYTES
+            )
+        return self._bucket
+
+    async def ensure_indexes(self):
+        await self.files.create_index('filename')
+
+    async def exists(self, name: str) -> bool:
+        return await self.files.find_one({'filename': name}, {'_id': 1}) is not None
+
+    async def put(self, data: bytes, content_type: Optional[str] = None, owner_id: Optional[str] = None) -> dict:
+        """Guarda o arquivo (se ainda não existir) e retorna a referência"""
+        if not data:
+            raise MediaError("Empty file")
+        if len(data) > MAX_MEDIA_BYTES:
+            raise MediaError("File too large")
+
+        content_type = sniff_content_type(data) or content_type
+        if content_type not in ALLOWED_CONTENT_TYPES:
+            raise MediaError("Unsupported media type")
+
+        # O hash é do arquivo já limpo: é ele que fica guardado e é servido
+        if content_type in STRIPPED_TYPES:
+            data = await asyncio.to_thread(strip_metadata, data, content_type)
+        media_id = hashlib.sha256(data).hexdigest()
+        deduplicated = not await self._claim(media_id)
+        if not deduplicated:
+            try:
+                await self.bucket.upload_from_stream(
+                    media_id, data,
+                    metadata={'content_type': content_type, 'variant': 'original', 'owner_id': owner_id,
+                              'sanitized': content_type in STRIPPED_TYPES}
+                )
+            except Exception:
+                await self.objects.delete_one({'_id': media_id, 'stored': False})
+                raise
+            await self.objects.update_one({'_id': media_id}, {'$set': {'stored': True}})
+
+        result = {
+            'id': media_id,
+            'url': media_url(media_id),
+            'content_type': content_type,
+            'size': len(data),
+            'deduplicated': deduplicated
+        }
+        if self.processable(content_type):
+            if not deduplicated:
+                self.schedule_variants(media_id)
+            result['variants'] = {name: media_url(media_id, name) for name in IMAGE_VARIANTS}
+        return result
+
+    async def _claim(self, media_id: str) -> bool:
+        """
+        Reserva o hash para gravar o arquivo. False quando ele já está guardado
+        ou outro upload está gravando agora (os dois devolvem a mesma referência)
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            await self.objects.insert_one({'_id': media_id, 'stored': False, 'claimed_at': now.isoformat()})
+        except DuplicateKeyError:
+            taken_over = await self.objects.find_one_and_update(
+                {'_id': media_id, 'stored': False, 'claimed_at': {'$lt': (now - CLAIM_TIMEOUT).isoformat()}},
+                {'$set': {'claimed_at': now.isoformat()}}
+            )
+            if taken_over is None:
+                return False
+        # Arquivos gravados antes de media.objects (ou cujo 'stored' não chegou a
+        # ser marcado) só existem no GridFS
+        if await self.exists(media_id):
+            await self.objects.update_one({'_id': media_id}, {'$set': {'stored': True}})
+            return False
+        return True
+
+    async def ingest(self, values: Optional[List[str]], owner_id: Optional[str] = None) -> List[str]:
+        """
+        Converte a lista recebida em referências: data URLs são guardadas no store,
+        referências /api/media e URLs http(s) externas são mantidas como estão.
+        """
+        refs = []
+        for value in values or []:
+            if not isinstance(value, str):
+                raise MediaError("Invalid media reference")
+            if value.startswith('data:'):
+                data, content_type = parse_data_url(value)
+                refs.append((await self.put(data, content_type, owner_id))['url'])
+            elif media_id_from_url(value) or value.startswith(('https://', 'http://')):
+                refs.append(value)
+            else:
+                raise MediaError("Invalid media reference")
+        return refs
+
+    async def owner_id(self, media_id: str) -> Optional[str]:
+        """Quem enviou o arquivo primeiro (os uploads repetidos são deduplicados)"""
+        original = await self.files.find_one(
+            {'filename': media_id, 'metadata.variant': 'original'}, {'_id': 0, 'metadata.owner_id': 1}
+        )
+        return ((original or {}).get('metadata') or {}).get('owner_id')
+
+    async def open(self, name: str):
+        """Abre o arquivo para leitura; retorna None se não existir"""
+        try:
+            return await self.bucket.open_download_stream_by_name(name)
+        except NoFile:
+            return None
+
+    async def read_all(self, name: str) -> Optional[bytes]:
+        grid_out = await self.open(name)
+        return await grid_out.read() if grid_out else None
+
+    @staticmethod
+    def processable(content_type: Optional[str]) -> bool:
+        return Image is not None and content_type in PROCESSABLE_TYPES
+
+    def schedule_variants(self, media_id: str) -> asyncio.Task:
+        """Agenda a geração das variantes (uma única vez por arquivo em andamento)"""
+        task = self._processing.get(media_id)
+        if task is None:
+            task = asyncio.create_task(self._generate_variants(media_id))
+            self._processing[media_id] = task
+            task.add_done_callback(lambda _: self._processing.pop(media_id, None))
+        return task
+
+    async def _generate_variants(self, media_id: str):
+        # O semáforo limita quantos originais ficam em memória esperando o pool
+        async with self._slots:
+            try:
+                data = await self.read_all(media_id)
+                if data is None:
+                    return
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                loop = asyncio.get_running_loop()
+                variants = await loop.run_in_executor(self._pool, render_variants, data)
+                for name, payload in variants.items():
+                    await self.bucket.upload_from_stream(
+                        variant_name(media_id, name), payload,
+                        metadata={'content_type': VARIANT_CONTENT_TYPE, 'variant': name, 'source': media_id}
+                    )
+                status = {'metadata.variants': sorted(variants)}
+            except Exception as e:
+                # Marca a falha para não reprocessar a cada requisição
+                logger.error(f"Image processing failed for {media_id}: {e}")
+                status = {'metadata.variants_error': str(e)[:200]}
+            await self.files.update_one({'filename': media_id, 'metadata.variant': 'original'}, {'$set': status})
+
+    async def resolve(self, media_id: str, variant: Optional[str] = None) -> Optional[Tuple[str, bool]]:
+        """
+        Decide qual arquivo servir para (media_id, variante).
+        Retorna (nome, definitivo) ou None se não há o que servir. Enquanto as
+        variantes não ficam prontas o original é servido com definitivo=False,
+        e o processamento é reagendado (ex.: após um restart no meio do pipeline).
+        Imagens guardadas antes da remoção de metadados (sem 'sanitized', até a
+        migração regravá-las) nunca são servidas no original, só nas variantes.
+        """
+        original = await self.files.find_one(
+            {'filename': media_id, 'metadata.variant': 'original'}, {'_id': 0, 'metadata': 1}
+        )
+        if original is None:
+            return None
+        metadata = original.get('metadata') or {}
+        content_type = metadata.get('content_type')
+        servable = content_type not in STRIPPED_TYPES or metadata.get('sanitized')
+        if not self.processable(content_type) or metadata.get('variants_error'):
+            return (media_id, True) if servable else None
+
+        target = variant or 'display'
+        if target in (metadata.get('variants') or []):
+            return variant_name(media_id, target), True
+
+        self.schedule_variants(media_id)
+        return (media_id, False) if servable else None
+
+    async def sanitize_stored_originals(self, batch_size: int = 50) -> int:
+        """
+        Migração: regrava sem metadados as imagens guardadas antes da remoção no
+        upload. O nome (hash do arquivo antigo) é mantido para não quebrar as
+        referências; o arquivo que não dá para limpar fica marcado e sem ser servido.
+        """
+        sanitized = 0
+        query = {
+            'metadata.variant': 'original',
+            'metadata.content_type': {'$in': sorted(STRIPPED_TYPES)},
+            'metadata.sanitized': {'$ne': True},
+            'metadata.sanitize_error': {'$exists': False}
+        }
+        while True:
+            docs = await self.files.find(query, {'_id': 1, 'filename': 1, 'metadata': 1}).to_list(batch_size)
+            if not docs:
+                return sanitized
+            for doc in docs:
+                metadata = doc.get('metadata') or {}
+                try:
+                    grid_out = await self.bucket.open_download_stream(doc['_id'])
+                    data = await asyncio.to_thread(strip_metadata, await grid_out.read(), metadata['content_type'])
+                except MediaError as e:
+                    await self.files.update_one({'_id': doc['_id']}, {'$set': {'metadata.sanitize_error': str(e)}})
+                    continue
+                await self.bucket.upload_from_stream(doc['filename'], data, metadata={**metadata, 'sanitized': True})
+                await self.bucket.delete(doc['_id'])
+                sanitized += 1
+
+    def pending(self) -> set:
+        """Tarefas de geração de variantes ainda em andamento"""
+        return set(self._processing.values())
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,205 @@
+"""
+Métricas no formato texto do Prometheus, sem dependências externas.
+
+- MetricsMiddleware (ASGI puro) conta requisições e mede a latência por rota,
+  usando o template da rota (/api/posts/{post_id}) para não explodir a
+  cardinalidade, e mantém o gauge de requisições em andamento.
+- MongoCommandMetrics é um CommandListener do PyMongo que mede a latência de
+  cada comando por coleção e operação, e conta os documentos retornados.
+
+Os valores ficam em memória no processo; render_metrics() gera o texto servido
+em /metrics.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Comandos de handshake/autenticação que não dizem nada sobre as queries
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions', 'buildInfo'}
+
+REGISTRY: List['Metric'] = []
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        # O listener do Mongo roda nas threads do Motor, em paralelo ao event loop
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        # Contagem por faixa (não cumulativa); a soma acumulada é feita só no render
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items())
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels(names, labels + (format_value(bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+HTTP_REQUESTS = Counter('http_requests_total', 'Requisições HTTP por rota e status', ('method', 'route', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Latência das requisições HTTP por rota', ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requisições HTTP em andamento')
+
+MONGO_COMMANDS = Counter('mongodb_commands_total', 'Comandos MongoDB por coleção, operação e resultado',
+                         ('collection', 'command', 'outcome'))
+MONGO_LATENCY = Histogram('mongodb_command_duration_seconds', 'Latência dos comandos MongoDB',
+                          ('collection', 'command'), buckets=MONGO_BUCKETS)
+MONGO_DOCUMENTS = Counter('mongodb_documents_returned_total', 'Documentos retornados por cursores MongoDB',
+                          ('collection', 'command'))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI; fica fora do BaseHTTPMiddleware para não atrasar respostas em streaming"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            # O roteador do FastAPI grava a rota encontrada no scope
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            HTTP_REQUESTS.inc(scope['method'], route, str(status_code))
+            HTTP_LATENCY.observe(elapsed, scope['method'], route)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._pending: Dict[Tuple[object, int], Tuple[str, str]] = {}
+
+    def started(self, event):
+        command = event.command_name
+        if command in IGNORED_COMMANDS:
+            return
+        target = event.command.get('collection' if command == 'getMore' else command)
+        collection = target if isinstance(target, str) else '-'
+        self._pending[(event.connection_id, event.request_id)] = (collection, command)
+
+    def succeeded(self, event):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is None:
+            return
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, *labels)
+        MONGO_COMMANDS.inc(*labels, 'ok')
+        cursor = event.reply.get('cursor') if isinstance(event.reply, dict) else None
+        if cursor:
+            batch = cursor.get('firstBatch', cursor.get('nextBatch')) or []
+            MONGO_DOCUMENTS.inc(*labels, amount=len(batch))
+
+    def failed(self, event):
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is None:
+            return
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, *labels)
+        MONGO_COMMANDS.inc(*labels, 'error')
@@ -0,0 +1,29 @@
+"""
+Migrações do banco: índices, backfills e mídia inline (server.run_migrations).
+
+    cd backend && python migrate.py
+
+Todos os passos são idempotentes. O gunicorn roda este script no master
+(hook on_starting do gunicorn.conf.py) antes de subir os workers, então em
+produção ele roda uma vez por deploy e não a cada worker reciclado. Para rodar
+como comando de release da plataforma, suba o gunicorn com MIGRATE_ON_START=0.
+"""
+import asyncio
+import logging
+
+import server
+
+logger = logging.getLogger('migrate')
+
+
+async def main():
+    logger.info("Running migrations")
+    try:
+        await server.run_migrations()
+    finally:
+        server.client.close()
+    logger.info("Migrations finished")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
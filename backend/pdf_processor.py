@@ -3,52 +3,92 @@ from pathlib import Path
 from typing import List
 import pickle
 
+from cities import CITIES, DEFAULT_CITY
+
+# Informações que valem para todo o país (direitos, números de emergência)
+NATIONAL_KNOWLEDGE = {
+    "FR": {
+        "juridico": [
+            "Para solicitar asilo, procure SPADA ou OFPRA. É importante ter documentos de identidade e provas de perseguição."
+        ],
+        "saude": [
+            "Para emergências médicas, ligue 15 (SAMU) ou vá ao hospital mais próximo.",
+            "AME (Aide Médicale d'État) oferece cobertura de saúde para pessoas sem documentos."
+        ],
+        "moradia": [
+            "Para emergência, ligue 115 (SAMU Social) para abrigo temporário.",
+            "CADA e HUDA são centros de acolhimento para solicitantes de asilo."
+        ],
+        "trabalho": [
+            "Após 6 meses de pedido de asilo, você pode solicitar autorização para trabalhar.",
+            "Procure ONGs como Singa ou Refugeers para workshops de emprego."
+        ],
+        "educacao": [
+            "Todas as crianças têm direito à educação na França, independente do status migratório.",
+            "Cursos de francês gratuitos estão disponíveis em diversas associações."
+        ]
+    }
+}
+
+# Endereços e serviços locais, por cidade
+CITY_KNOWLEDGE = {
+    "paris": {
+        "alimentacao": [
+            "Secours Catholique oferece distribuição de alimentos em 15 Rue de Maubeuge, 75009 Paris. Tel: 01 45 49 73 00. Horário: Seg-Sex 9h-17h.",
+            "Restaurants du Coeur oferece refeições gratuitas em 42 Rue Championnet, 75018 Paris. Tel: 01 53 32 23 23. Horário: Seg-Sex 11h30-13h30.",
+            "Croix-Rouge distribui alimentos e produtos básicos em diversos pontos de Paris."
+        ],
+        "juridico": [
+            "La Cimade oferece assistência jurídica gratuita em 176 Rue de Grenelle, 75007 Paris. Tel: 01 40 08 05 34. Horário: Ter-Qui 14h-18h.",
+            "GISTI fornece informações sobre direitos dos estrangeiros em 3 Villa Marcès, 75011 Paris. Tel: 01 43 14 84 84."
+        ],
+        "saude": [
+            "PASS oferece atendimento médico gratuito em Hôpital Saint-Louis, 1 Avenue Claude Vellefaux, 75010 Paris. Tel: 01 42 49 49 49."
+        ],
+        "moradia": [
+            "France Terre d'Asile oferece acolhimento em 24 Rue Marc Seguin, 75018 Paris. Tel: 01 53 04 39 99."
+        ],
+        "trabalho": [
+            "Pôle Emploi International ajuda na busca de emprego em 48 Boulevard de la Bastille, 75012 Paris. Tel: 39 49."
+        ],
+        "educacao": [
+            "CASNAV ajuda na escolarização de crianças migrantes em 12 Boulevard d'Indochine, 75019 Paris. Tel: 01 44 62 39 36."
+        ],
+        "geral": [
+            "O guia Watizat é atualizado mensalmente com informações para migrantes em Paris."
+        ]
+    }
+}
+
+GENERAL_KNOWLEDGE = [
+    "É importante sempre ter cópias de seus documentos importantes.",
+    "Procure sempre ajuda de associações especializadas para orientação personalizada."
+]
+
 class WatizatPDFProcessor:
     def __init__(self):
-        self.knowledge_base = self._load_knowledge_base()
-        
-    def _load_knowledge_base(self) -> dict:
-        """Carrega base de conhecimento do Watizat"""
-        return {
-            "alimentacao": [
-                "Secours Catholique oferece distribuição de alimentos em 15 Rue de Maubeuge, 75009 Paris. Tel: 01 45 49 73 00. Horário: Seg-Sex 9h-17h.",
-                "Restaurants du Coeur oferece refeições gratuitas em 42 Rue Championnet, 75018 Paris. Tel: 01 53 32 23 23. Horário: Seg-Sex 11h30-13h30.",
-                "Croix-Rouge distribui alimentos e produtos básicos em diversos pontos de Paris."
-            ],
-            "juridico": [
-                "La Cimade oferece assistência jurídica gratuita em 176 Rue de Grenelle, 75007 Paris. Tel: 01 40 08 05 34. Horário: Ter-Qui 14h-18h.",
-                "GISTI fornece informações sobre direitos dos estrangeiros em 3 Villa Marcès, 75011 Paris. Tel: 01 43 14 84 84.",
-                "Para solicitar asilo, procure SPADA ou OFPRA. É importante ter documentos de identidade e provas de perseguição."
-            ],
-            "saude": [
-                "PASS oferece atendimento médico gratuito em Hôpital Saint-Louis, 1 Avenue Claude Vellefaux, 75010 Paris. Tel: 01 42 49 49 49.",
-                "Para emergências médicas, ligue 15 (SAMU) ou vá ao hospital mais próximo.",
-                "AME (Aide Médicale d'État) oferece cobertura de saúde para pessoas sem documentos."
-            ],
-            "moradia": [
-                "France Terre d'Asile oferece acolhimento em 24 Rue Marc Seguin, 75018 Paris. Tel: 01 53 04 39 99.",
-                "Para emergência, ligue 115 (SAMU Social) para abrigo temporário.",
-                "CADA e HUDA são centros de acolhimento para solicitantes de asilo."
-            ],
-            "trabalho": [
-                "Pôle Emploi International ajuda na busca de emprego em 48 Boulevard de la Bastille, 75012 Paris. Tel: 39 49.",
-                "Após 6 meses de pedido de asilo, você pode solicitar autorização para trabalhar.",
-                "Procure ONGs como Singa ou Refugeers para workshops de emprego."
-            ],
-            "educacao": [
-                "CASNAV ajuda na escolarização de crianças migrantes em 12 Boulevard d'Indochine, 75019 Paris. Tel: 01 44 62 39 36.",
-                "Todas as crianças têm direito à educação na França, independente do status migratório.",
-                "Cursos de francês gratuitos estão disponíveis em diversas associações."
-            ],
-            "geral": [
-                "O guia Watizat é atualizado mensalmente com informações para migrantes em Paris.",
-                "É importante sempre ter cópias de seus documentos importantes.",
-                "Procure sempre ajuda de associações especializadas para orientação personalizada."
-            ]
-        }
+        # Base de cada cidade montada na primeira busca da cidade
+        self.knowledge_bases = {}
+    
+    def knowledge_base(self, city: str = DEFAULT_CITY) -> dict:
+        """Base de conhecimento da cidade: informações locais primeiro, depois as nacionais"""
+        base = self.knowledge_bases.get(city)
+        if base is None:
+            base = self._load_knowledge_base(city)
+            self.knowledge_bases[city] = base
+        return base
+    
+    def _load_knowledge_base(self, city: str) -> dict:
+        country = CITIES.get(city, {}).get('country')
+        base = {category: list(items) for category, items in CITY_KNOWLEDGE.get(city, {}).items()}
+        for category, items in NATIONAL_KNOWLEDGE.get(country, {}).items():
+            base.setdefault(category, []).extend(items)
+        base.setdefault('geral', []).extend(GENERAL_KNOWLEDGE)
+        return base
     
-    def search(self, query: str, k: int = 3) -> List[str]:
-        """Busca informações relevantes na base de conhecimento"""
+    def search(self, query: str, k: int = 3, city: str = DEFAULT_CITY) -> List[str]:
+        """Busca informações relevantes na base de conhecimento da cidade"""
+        knowledge_base = self.knowledge_base(city)
         query_lower = query.lower()
         results = []
         
@@ -81,12 +121,12 @@ class WatizatPDFProcessor:
         
         for keyword, category in keywords_map.items():
             if keyword in query_lower:
-                results.extend(self.knowledge_base[category])
+                results.extend(knowledge_base.get(category, []))
                 if len(results) >= k:
                     break
         
         if not results:
-            results = self.knowledge_base["geral"]
+            results = knowledge_base["geral"]
         
         return results[:k]
     
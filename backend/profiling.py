@@ -0,0 +1,113 @@
+"""
+Profiling sob demanda de uma requisição.
+
+Quando um admin envia o header X-Profile: 1 (ou ?profile=1), a requisição roda
+sob o profiler por amostragem do pyinstrument, que no modo async só conta o
+tempo da task desta requisição. A sessão é entregue ao callback `save` depois
+que a resposta foi enviada, e o id vem no header X-Profile-Id para baixar o
+resultado (HTML, speedscope ou texto) pelo painel de admin.
+
+Sem o header o custo é uma busca na lista de headers. Sem pyinstrument
+instalado o header é ignorado.
+"""
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer, SpeedscopeRenderer
+    from pyinstrument.session import Session
+except ImportError:  # pyinstrument é opcional
+    Profiler = None
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_QUERY_FLAG = b'profile=1'
+PROFILE_INTERVAL = 0.001  # segundos entre amostras
+
+PROFILE_FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'speedscope': 'application/json',
+    'text': 'text/plain; charset=utf-8'
+}
+
+
+def profiling_requested(scope) -> bool:
+    if Profiler is None:
+        return False
+    for name, value in scope['headers']:
+        if name == PROFILE_HEADER:
+            return value not in (b'', b'0', b'false')
+    return PROFILE_QUERY_FLAG in scope.get('query_string', b'').split(b'&')
+
+
+def bearer_token(scope) -> Optional[str]:
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            return token.strip() if scheme.lower() == 'bearer' else None
+    return None
+
+
+def render_profile(session_json: str, format: str) -> str:
+    session = Session.from_json(json.loads(session_json))
+    if format == 'html':
+        return HTMLRenderer().render(session)
+    if format == 'speedscope':
+        return SpeedscopeRenderer().render(session)
+    return ConsoleRenderer(unicode=True, color=False, show_all=False).render(session)
+
+
+class ProfilingMiddleware:
+    """
+    authorize(token) -> id do admin ou None; save(profile) grava o resultado.
+    Requisições de quem não é admin seguem normalmente, sem profiling.
+    """
+
+    def __init__(self, app, authorize: Callable[[Optional[str]], Awaitable[Optional[str]]],
+                 save: Callable[[dict], Awaitable[None]]):
+        self.app = app
+        self.authorize = authorize
+        self.save = save
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        admin_id = await self.authorize(bearer_token(scope))
+        if admin_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = str(uuid.uuid4())
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode='enabled')
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            duration_ms = (time.perf_counter() - start) * 1000
+            route = getattr(scope.get('route'), 'path', None) or scope['path']
+            await self.save({
+                'id': profile_id,
+                'user_id': admin_id,
+                'method': scope['method'],
+                'path': scope['path'],
+                'route': route,
+                'status': status_code,
+                'duration_ms': round(duration_ms, 2),
+                'sample_count': session.sample_count,
+                'session': json.dumps(session.to_json())
+            })
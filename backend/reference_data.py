@@ -0,0 +1,109 @@
+"""
+Cache de dados de referência: coleções pequenas que só mudam por seed ou pelo
+admin (services, advertisements).
+
+Cada coleção registrada tem um carimbo de versão na coleção meta:
+
+    {'_id': 'reference:services', 'version': 3, 'updated_at': '...'}
+
+Quem grava numa dessas coleções chama bump_version (ou ReferenceCache.bump,
+que também atualiza o worker atual). Cada worker guarda em memória a coleção
+inteira junto com a versão lida e, no máximo a cada `check_seconds`, confere os
+carimbos de todas as coleções numa única leitura de meta. Só recarrega a
+coleção cujo carimbo mudou; entre uma conferência e outra, get() não vai ao
+banco. Coleção sem carimbo tem versão 0 (carregada uma vez até o primeiro bump).
+
+Com track(name) só o carimbo é conferido: caches com outro formato (páginas
+da listagem de voluntários) põem version(name) na chave e, depois de um bump,
+param de usar as entradas antigas em todos os workers.
+
+O carimbo é lido antes da coleção: uma escrita que acontece durante a carga
+deixa a cópia com versão antiga e ela é recarregada na conferência seguinte.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+META_PREFIX = 'reference:'
+# Coleções registradas no cache do server.py; quem grava nelas fora da API
+# (seeds, bulk_import) chama bump_version
+REFERENCE_COLLECTIONS = ('services', 'advertisements')
+
+
+def version_id(name: str) -> str:
+    return f'{META_PREFIX}{name}'
+
+
+async def bump_version(db, name: str) -> int:
+    """Marca a coleção como alterada; devolve a nova versão"""
+    stamp = await db.meta.find_one_and_update(
+        {'_id': version_id(name)},
+        {'$inc': {'version': 1}, '$set': {'updated_at': datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return stamp['version']
+
+
+class ReferenceCache:
+    """Coleções de referência em memória; `database()` devolve o banco atual"""
+
+    def __init__(self, database: Callable[[], Any], check_seconds: float):
+        self.database = database
+        self.check_seconds = check_seconds
+        self._loaders: Dict[str, Optional[Callable[[Any], Awaitable[Any]]]] = {}
+        self._entries: Dict[str, Tuple[int, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._checked_at = float('-inf')
+        self._check_lock = asyncio.Lock()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+
+    def register(self, name: str, load: Callable[[Any], Awaitable[Any]]):
+        """`load(db)` lê a coleção inteira; o resultado é compartilhado e não deve ser alterado"""
+        self._loaders[name] = load
+        self._load_locks[name] = asyncio.Lock()
+
+    def track(self, name: str):
+        """Só o carimbo, sem carga: para caches de outro formato que usam version() na chave"""
+        self._loaders.setdefault(name, None)
+
+    async def version(self, name: str) -> int:
+        """Versão atual do carimbo, conferida no máximo a cada `check_seconds`"""
+        await self._check_versions()
+        return self._versions.get(name, 0)
+
+    async def get(self, name: str) -> Any:
+        await self._check_versions()
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == self._versions.get(name, 0):
+            return entry[1]
+        async with self._load_locks[name]:
+            version = self._versions.get(name, 0)
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != version:
+                entry = (version, await self._loaders[name](self.database()))
+                self._entries[name] = entry
+        return entry[1]
+
+    async def bump(self, name: str) -> int:
+        """bump_version + recarga no próximo get() deste worker, sem esperar a conferência"""
+        version = await bump_version(self.database(), name)
+        self._versions[name] = version
+        return version
+
+    async def _check_versions(self):
+        if self._checked_at + self.check_seconds > time.monotonic():
+            return
+        async with self._check_lock:
+            if self._checked_at + self.check_seconds > time.monotonic():
+                return
+            ids = [version_id(name) for name in self._loaders]
+            stamps = await self.database().meta.find({'_id': {'$in': ids}}, {'version': 1}).to_list(len(ids))
+            versions = {name: 0 for name in self._loaders}
+            for stamp in stamps:
+                versions[stamp['_id'][len(META_PREFIX):]] = stamp.get('version', 0)
+            self._versions = versions
+            self._checked_at = time.monotonic()
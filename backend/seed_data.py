@@ -3,6 +3,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from reference_data import bump_version
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -98,6 +99,7 @@ async def seed_services():
     existing_count = await db.services.count_documents({})
     if existing_count == 0:
         await db.services.insert_many(services)
+        await bump_version(db, 'services')
         print(f"✅ {len(services)} serviços inseridos!")
     else:
         print(f"ℹ️ Base já possui {existing_count} serviços")
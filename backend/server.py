@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, UploadFile, File, status
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -15,17 +16,55 @@ import jwt
 from openai import AsyncOpenAI
 from pdf_processor import WatizatPDFProcessor
 from auto_responses import get_auto_response, format_auto_response_post
-from help_locations import HELP_LOCATIONS, get_all_help_locations, get_help_locations_by_category
+from help_locations import HELP_LOCATIONS, HELP_LOCATIONS_BY_CITY, get_all_help_locations
+from categories import CATEGORIES, category_mask, mask_categories, post_category_mask, user_masks, first_match, USER_MASK_FIELDS
+from matching import MatchIndex, DEFAULT_RESPONSIVENESS, language_mask
+from cities import CITIES, DEFAULT_CITY, CityCache, normalize_city, resolve_city, city_for_location, city_bbox, distance_km
+from metrics import MetricsMiddleware, MongoCommandMetrics, render_metrics, CONTENT_TYPE_LATEST, HTTP_IN_FLIGHT
+from slow_queries import SlowQueryMonitor
+from profiling import ProfilingMiddleware, PROFILE_FORMATS, render_profile
+from compression import CompressionMiddleware, PayloadCache, PrecompressedPayload, GZIP_LEVEL, BROTLI_QUALITY
+from bulk_import import import_documents
+from reference_data import ReferenceCache
+from media_store import MediaStore, MediaError, MAX_MEDIA_BYTES, MEDIA_ID_PATTERN, IMAGE_VARIANTS, parse_range, iter_grid_out, media_url, media_id_from_url
 import math
 from urllib.parse import urlparse
 import aiohttp
 import re
+import base64
+import json
+import asyncio
+import socket
+from contextlib import asynccontextmanager
+import csv
+import io
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import DuplicateKeyError
+from pymongo.read_preferences import SecondaryPreferred
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Pool por processo: com N workers o total de conexões é N * MONGO_MAX_POOL_SIZE
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 25)),
+    'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    'maxIdleTimeMS': int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    'waitQueueTimeoutMS': int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'socketTimeoutMS': int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+}
+slow_query_monitor = SlowQueryMonitor()
+# connect=False: nenhuma conexão é aberta no import, então o app pode ser
+# pré-carregado no processo master do gunicorn e compartilhado com os workers
+client = AsyncIOMotorClient(
+    mongo_url,
+    connect=False,
+    event_listeners=[MongoCommandMetrics(), slow_query_monitor],
+    **MONGO_CLIENT_OPTIONS
+)
 
 # Extrai o nome do banco de dados da URL ou usa DB_NAME
 def get_database_name():
@@ -48,8 +87,88 @@ def get_database_name():
     return db_name if db_name else 'watizat_db'
 
 db = client[get_database_name()]
+media_store = MediaStore(db)
+
+# ==================== ROTEAMENTO DE LEITURAS ====================
+# Cada leitura é forte (STRONG) ou eventual (EVENTUAL). `db` lê sempre do
+# primário: é o caminho de quem precisa ver o que acabou de gravar (login,
+# perfil, chat, posts do próprio usuário). read_db(EVENTUAL) manda a leitura
+# para um secundário com atraso limitado a MONGO_MAX_STALENESS_SECONDS (volta
+# ao primário se nenhum secundário estiver dentro do limite). Só dados de
+# referência e agregados que toleram alguns segundos de atraso usam EVENTUAL.
+# Num servidor standalone a preferência é ignorada e tudo vai ao primário.
+STRONG = 'strong'
+EVENTUAL = 'eventual'
+MONGO_SECONDARY_READS = os.environ.get('MONGO_SECONDARY_READS', '1') == '1'
+# 90s é o mínimo aceito pelo driver para maxStalenessSeconds
+MONGO_MAX_STALENESS_SECONDS = max(90, int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90)))
+EVENTUAL_READ_PREFERENCE = SecondaryPreferred(max_staleness=MONGO_MAX_STALENESS_SECONDS)
+_eventual_db = (None, None)
+
+def read_db(consistency: str = STRONG):
+    """Banco para uma leitura com a consistência pedida"""
+    global _eventual_db
+    if consistency == STRONG or not MONGO_SECONDARY_READS:
+        return db
+    source, handle = _eventual_db
+    if source is not db:
+        handle = db.client.get_database(db.name, read_preference=EVENTUAL_READ_PREFERENCE)
+        _eventual_db = (db, handle)
+    return handle
+
+# ==================== DADOS DE REFERÊNCIA ====================
+# services e advertisements só mudam por seed ou pelo admin: cada worker guarda
+# as coleções inteiras em memória e confere o carimbo de versão em db.meta a
+# cada REFERENCE_CHECK_SECONDS (ver reference_data.py). Quem grava nelas chama
+# reference_data.bump. A carga lê do primário: ela só acontece depois de um
+# bump e um secundário atrasado deixaria a cópia antiga presa na versão nova.
+REFERENCE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CHECK_SECONDS', 10))
+reference_data = ReferenceCache(lambda: db, check_seconds=REFERENCE_CHECK_SECONDS)
+
+async def load_services(database) -> list:
+    return await database.services.find({}, {'_id': 0}).to_list(None)
+
+async def load_advertisements(database) -> list:
+    return await database.advertisements.find({}, {'_id': 0}).sort('priority', -1).to_list(None)
+
+reference_data.register('services', load_services)
+reference_data.register('advertisements', load_advertisements)
+
+# ==================== REQUEST PROFILING (MIDDLEWARE) ====================
+# Um admin envia X-Profile: 1 (ou ?profile=1) e a requisição roda sob o profiler
+# (profiling.py). O resultado fica em request_profiles por PROFILE_RETENTION.
+
+PROFILE_RETENTION = timedelta(days=7)
+
+async def profiling_admin_id(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    user = await db.users.find_one(
+        {'id': payload.get('user_id'), 'role': 'admin', **ACTIVE_USER}, {'_id': 0, 'id': 1}
+    )
+    return user['id'] if user else None
+
+async def save_request_profile(profile: dict):
+    now = datetime.now(timezone.utc)
+    profile['created_at'] = now.isoformat()
+    # Data BSON para o índice TTL
+    profile['expires_at'] = now + PROFILE_RETENTION
+    try:
+        await db.request_profiles.insert_one(profile)
+    except Exception as e:
+        logger.error(f"Profile save error: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS deve estar ANTES de tudo
 app.add_middleware(
@@ -60,6 +179,10 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+# O último registrado é o mais externo: o profile cobre métricas e compressão
+app.add_middleware(ProfilingMiddleware, authorize=profiling_admin_id, save=save_request_profile)
 
 api_router = APIRouter(prefix="/api")
 
@@ -85,6 +208,12 @@ class User(BaseModel):
     bio: Optional[str] = None
     languages: List[str] = Field(default_factory=list)
     categories: List[str] = Field(default_factory=list)
+    city: Optional[str] = None
+    # Máscaras de help_categories/need_categories (categories.py): só para uso
+    # interno, ficam fora das respostas (INTERNAL_USER_FIELDS)
+    help_mask: int = Field(default=0, exclude=True)
+    need_mask: int = Field(default=0, exclude=True)
+    effective_need_mask: Optional[int] = Field(default=None, exclude=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserRegister(BaseModel):
@@ -109,6 +238,7 @@ class UserRegister(BaseModel):
     linkedin: Optional[str] = None
     location: Optional[dict] = None  # {lat: float, lng: float, address: str}
     show_location: bool = False  # Se quer mostrar localização no feed
+    city: Optional[str] = None  # Slug de CITIES; se ausente, deduzida da localização
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -121,9 +251,12 @@ class Post(BaseModel):
     type: str
     category: str  # Categoria principal
     categories: List[str] = Field(default_factory=list)  # Múltiplas categorias
+    category_mask: int = 0  # Bits de `categories` (categories.py)
     title: str
     description: str
     location: Optional[dict] = None
+    city: Optional[str] = None
+    comment_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class PostCreate(BaseModel):
@@ -134,6 +267,8 @@ class PostCreate(BaseModel):
     description: str
     location: Optional[dict] = None
     images: Optional[List[str]] = Field(default_factory=list)
+    language: Optional[str] = None  # Idioma do texto (pt, fr, en) para a busca
+    city: Optional[str] = None  # Se ausente: cidade da localização do post ou do autor
 
 class PostComment(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -193,6 +328,246 @@ class Match(BaseModel):
     status: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+def encode_cursor(*values) -> str:
+    """Gera um cursor opaco para paginação por chave (keyset)"""
+    raw = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decodifica um cursor gerado por encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def keyset_filter(cursor: Optional[str], descending: bool = True) -> dict:
+    """Filtro para a página seguinte na ordenação (created_at, id)"""
+    if not cursor:
+        return {}
+    last_created_at, last_id = decode_cursor(cursor, 2)
+    op = '$lt' if descending else '$gt'
+    return {'$or': [
+        {'created_at': {op: last_created_at}},
+        {'created_at': last_created_at, 'id': {op: last_id}}
+    ]}
+
+def next_page_cursor(docs: List[dict], limit: int) -> Optional[str]:
+    """Cursor da próxima página quando a query buscou limit + 1 documentos"""
+    if len(docs) <= limit:
+        return None
+    last = docs[limit - 1]
+    return encode_cursor(last['created_at'], last['id'])
+
+def combine_filters(*filters: dict) -> dict:
+    """Junta filtros com $and, ignorando os vazios"""
+    clauses = [f for f in filters if f]
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+# Campos públicos de usuário nas listagens
+# Campos do documento do usuário que nunca saem na API
+INTERNAL_USER_FIELDS = ('help_mask', 'need_mask', 'effective_need_mask')
+USER_RESPONSE_PROJECTION = {'_id': 0, 'password': 0, **{field: 0 for field in INTERNAL_USER_FIELDS}}
+PUBLIC_USER_PROJECTION = {**USER_RESPONSE_PROJECTION, 'email': 0}
+
+def fast_json(content, response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    Resposta serializada direto com orjson, sem jsonable_encoder nem validação
+    de response_model. Os documentos do Mongo já têm created_at em ISO e saem
+    como estão. Headers definidos no `response` injetado (ex.: X-Next-Cursor)
+    são copiados, já que uma Response retornada diretamente os ignoraria.
+    """
+    result = ORJSONResponse(content)
+    if response is not None:
+        result.headers.update(response.headers)
+    return result
+
+async def fetch_users_by_ids(user_ids, projection: Optional[dict] = None) -> dict:
+    """Busca vários usuários em uma única query e retorna um dict id -> usuário"""
+    ids = list({uid for uid in user_ids if uid and uid != 'system'})
+    if not ids:
+        return {}
+    projection = projection or PUBLIC_USER_PROJECTION
+    users_dict = {}
+    async for user in db.users.find({'id': {'$in': ids}}, projection):
+        users_dict[user['id']] = user
+    return users_dict
+
+# Idiomas suportados pela busca textual (stemming do índice de texto do MongoDB)
+SEARCH_LANGUAGES = {'pt': 'portuguese', 'fr': 'french', 'en': 'english'}
+
+def resolve_post_language(language: Optional[str], user_languages: List[str]) -> str:
+    """Escolhe o idioma do post: o informado, senão o primeiro idioma suportado do usuário"""
+    if language in SEARCH_LANGUAGES:
+        return language
+    for lang in user_languages or []:
+        if lang in SEARCH_LANGUAGES:
+            return lang
+    return 'pt'
+
+def geo_point(location: Optional[dict]) -> Optional[dict]:
+    """Converte {lat, lng} no ponto GeoJSON usado pelo índice 2dsphere"""
+    if not location:
+        return None
+    try:
+        lat = float(location.get('lat'))
+        lng = float(location.get('lng'))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return {'type': 'Point', 'coordinates': [lng, lat]}
+
+def user_city(user) -> str:
+    """Cidade do usuário (contas antigas sem city ficam na cidade padrão)"""
+    city = user.city if isinstance(user, BaseModel) else (user or {}).get('city')
+    return city or DEFAULT_CITY
+
+def request_city(city: Optional[str], current_user=None, lat: Optional[float] = None, lng: Optional[float] = None) -> str:
+    """
+    Cidade que delimita uma consulta: a pedida explicitamente, senão a das
+    coordenadas, senão a do usuário logado
+    """
+    if city:
+        slug = normalize_city(city)
+        if not slug:
+            raise HTTPException(status_code=400, detail="Unsupported city")
+        return slug
+    if lat is not None and lng is not None:
+        slug = city_for_location({'lat': lat, 'lng': lng})
+        if slug:
+            return slug
+    return user_city(current_user) if current_user is not None else DEFAULT_CITY
+
+# Usuários marcados para exclusão (soft delete) somem de login e listagens
+# enquanto o job de exclusão remove os dados dependentes
+ACTIVE_USER = {'deleted_at': {'$exists': False}}
+
+# ==================== AUTHOR SNAPSHOTS ====================
+# Posts e comentários guardam uma cópia dos dados públicos do autor (campo
+# 'author') para que o feed não precise consultar a coleção users na leitura.
+
+AUTHOR_FIELDS = ('name', 'display_name', 'use_display_name', 'role')
+AUTHOR_PROJECTION = {'_id': 0, 'id': 1, **{field: 1 for field in AUTHOR_FIELDS}}
+SYSTEM_AUTHOR = {'name': 'Watizat Assistant', 'display_name': None, 'use_display_name': False, 'role': 'assistant'}
+
+background_tasks = set()
+
+def run_in_background(coro):
+    """Agenda uma corrotina fora do ciclo da requisição, mantendo referência até terminar"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def author_snapshot(user) -> dict:
+    """Extrai os campos públicos do autor a partir de um User ou dict do banco"""
+    data = user.model_dump() if isinstance(user, BaseModel) else user
+    return {
+        'name': data.get('name'),
+        'display_name': data.get('display_name'),
+        'use_display_name': bool(data.get('use_display_name', False)),
+        'role': data.get('role')
+    }
+
+def public_author(author: dict, prefer_display_name: bool = False) -> dict:
+    """Formata o snapshot do autor como o campo 'user' retornado pela API"""
+    name = author.get('name')
+    if prefer_display_name and author.get('use_display_name') and author.get('display_name'):
+        name = author['display_name']
+    return {'name': name, 'role': author.get('role')}
+
+async def attach_authors(docs: List[dict], prefer_display_name: bool = False):
+    """
+    Preenche doc['user'] a partir do snapshot embutido.
+    Documentos antigos sem snapshot são resolvidos em uma única query em lote.
+    """
+    missing = [doc['user_id'] for doc in docs if 'author' not in doc and doc.get('user_id') != 'system']
+    users_dict = await fetch_users_by_ids(missing, AUTHOR_PROJECTION) if missing else {}
+    
+    for doc in docs:
+        author = doc.pop('author', None)
+        if author is None:
+            if doc.get('user_id') == 'system':
+                author = SYSTEM_AUTHOR
+            elif doc.get('user_id') in users_dict:
+                author = author_snapshot(users_dict[doc['user_id']])
+        if author:
+            doc['user'] = public_author(author, prefer_display_name)
+
+async def fan_out_author_snapshot(user_id: str):
+    """Reescreve o snapshot do autor em todos os posts e comentários do usuário"""
+    try:
+        user = await db.users.find_one({'id': user_id}, AUTHOR_PROJECTION)
+        if not user:
+            return
+        snapshot = author_snapshot(user)
+        stale = {'user_id': user_id, 'author': {'$ne': snapshot}}
+        posts_result = await db.posts.update_many(stale, {'$set': {'author': snapshot}})
+        comments_result = await db.comments.update_many(stale, {'$set': {'author': snapshot}})
+        logger.info(
+            f"Author fan-out for {user_id}: {posts_result.modified_count} posts, "
+            f"{comments_result.modified_count} comments"
+        )
+    except Exception as e:
+        logger.error(f"Author fan-out error for {user_id}: {e}")
+
+def empty_audit_report(repair: bool) -> dict:
+    return {'users_checked': 0, 'drifted_users': 0, 'posts_drifted': 0, 'comments_drifted': 0, 'repaired': repair}
+
+async def audit_author_snapshots(
+    repair: bool = False,
+    batch_size: int = 500,
+    report: Optional[dict] = None,
+    last_id: str = '',
+    checkpoint=None
+) -> dict:
+    """
+    Compara os snapshots embutidos com a coleção users, por lotes de usuários.
+    Com repair=True, reescreve os documentos divergentes com bulk updates.
+    report/last_id retomam uma varredura interrompida; checkpoint(report, last_id)
+    é chamado ao fim de cada lote.
+    """
+    report = report or empty_audit_report(repair)
+    while True:
+        users = await db.users.find(
+            {'id': {'$gt': last_id}}, AUTHOR_PROJECTION
+        ).sort('id', 1).to_list(batch_size)
+        if not users:
+            break
+        last_id = users[-1]['id']
+        report['users_checked'] += len(users)
+        
+        snapshots = {user['id']: author_snapshot(user) for user in users}
+        drifted_users = set()
+        for collection, key in ((db.posts, 'posts_drifted'), (db.comments, 'comments_drifted')):
+            pipeline = [
+                {'$match': {'user_id': {'$in': list(snapshots)}}},
+                {'$group': {'_id': {'user_id': '$user_id', 'author': '$author'}, 'count': {'$sum': 1}}}
+            ]
+            stale_users = set()
+            async for row in collection.aggregate(pipeline):
+                uid = row['_id']['user_id']
+                if row['_id'].get('author') != snapshots[uid]:
+                    report[key] += row['count']
+                    stale_users.add(uid)
+            drifted_users |= stale_users
+            if repair and stale_users:
+                await collection.bulk_write([
+                    UpdateMany({'user_id': uid, 'author': {'$ne': snapshots[uid]}}, {'$set': {'author': snapshots[uid]}})
+                    for uid in stale_users
+                ], ordered=False)
+        report['drifted_users'] += len(drifted_users)
+        if checkpoint:
+            await checkpoint(report, last_id)
+    
+    return report
+
 def create_token(user_id: str, email: str) -> str:
     payload = {
         'user_id': user_id,
@@ -207,7 +582,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
         user_id = payload.get('user_id')
         
-        user = await db.users.find_one({'id': user_id}, {'_id': 0})
+        user = await db.users.find_one({'id': user_id, **ACTIVE_USER}, {'_id': 0})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return User(**user)
@@ -224,11 +599,15 @@ async def register(user_data: UserRegister):
     
     hashed_pw = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt())
     
+    if user_data.city and not normalize_city(user_data.city):
+        raise HTTPException(status_code=400, detail="Unsupported city")
+    
     user = User(
         email=user_data.email,
         name=user_data.name,
         role=user_data.role,
-        languages=user_data.languages
+        languages=user_data.languages,
+        city=resolve_city(user_data.city, user_data.location)
     )
     
     user_dict = user.model_dump()
@@ -262,14 +641,22 @@ async def register(user_data: UserRegister):
         user_dict['location'] = user_data.location
         user_dict['show_location'] = user_data.show_location
     
+    masks = user_masks(user_dict)
+    user_dict.update(masks)
+    if 'need_mask' in masks:
+        # Conta nova ainda não tem pedidos: só as categorias declaradas
+        user_dict['effective_need_mask'] = masks['need_mask']
+    user = user.model_copy(update=masks)
     await db.users.insert_one(user_dict)
+    if user.role in MATCH_ROLES:
+        helper_profile_changed(user.id)
     
     token = create_token(user.id, user.email)
     return {'token': token, 'user': user}
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
-    user_data = await db.users.find_one({'email': credentials.email}, {'_id': 0})
+    user_data = await db.users.find_one({'email': credentials.email, **ACTIVE_USER}, {'_id': 0})
     
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -292,12 +679,25 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 
 @api_router.put("/profile")
 async def update_profile(updates: dict, current_user: User = Depends(get_current_user)):
-    allowed_fields = ['name', 'bio', 'location', 'languages', 'categories', 'help_categories', 'need_categories', 'display_name', 'use_display_name']
+    allowed_fields = ['name', 'bio', 'location', 'languages', 'categories', 'help_categories', 'need_categories', 'display_name', 'use_display_name', 'city']
     update_data = {k: v for k, v in updates.items() if k in allowed_fields}
+    if 'city' in update_data:
+        update_data['city'] = normalize_city(update_data['city'])
+        if not update_data['city']:
+            raise HTTPException(status_code=400, detail="Unsupported city")
+    update_data.update(user_masks(update_data))
     
     await db.users.update_one({'id': current_user.id}, {'$set': update_data})
+    if 'need_categories' in update_data:
+        await refresh_effective_needs(current_user.id)
     
-    updated_user = await db.users.find_one({'id': current_user.id}, {'_id': 0, 'password': 0})
+    # Nome exibido mudou: atualizar snapshots em posts e comentários em segundo plano
+    if any(field in update_data for field in AUTHOR_FIELDS):
+        run_in_background(fan_out_author_snapshot(current_user.id))
+    if current_user.role in MATCH_ROLES:
+        helper_profile_changed(current_user.id)
+    
+    updated_user = await db.users.find_one({'id': current_user.id}, USER_RESPONSE_PROJECTION)
     if isinstance(updated_user['created_at'], str):
         updated_user['created_at'] = datetime.fromisoformat(updated_user['created_at'])
     
@@ -313,16 +713,29 @@ async def create_post(post_data: PostCreate, current_user: User = Depends(get_cu
         type=post_data.type,
         category=post_data.category,
         categories=categories_list,
+        category_mask=category_mask(categories_list),
         title=post_data.title,
         description=post_data.description,
-        location=post_data.location
+        location=post_data.location,
+        city=request_city(post_data.city) if post_data.city else resolve_city(None, post_data.location, user_city(current_user))
     )
     
     post_dict = post.model_dump()
     post_dict['created_at'] = post_dict['created_at'].isoformat()
-    post_dict['images'] = post_data.images or []
+    # Imagens vão para o media store; o post guarda só as referências
+    try:
+        post_dict['images'] = await media_store.ingest(post_data.images, current_user.id)
+    except MediaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    post_dict['author'] = author_snapshot(current_user)
+    post_dict['language'] = resolve_post_language(post_data.language, current_user.languages)
+    point = geo_point(post_data.location)
+    if point:
+        post_dict['geo'] = point
     
     await db.posts.insert_one(post_dict)
+    if post.type == 'need':
+        await refresh_effective_needs(current_user.id)
     
     # Enviar resposta automática para cada categoria selecionada
     if post_data.type == 'need':
@@ -339,10 +752,22 @@ async def create_post(post_data: PostCreate, current_user: User = Depends(get_cu
                 }
                 await db.messages.insert_one(message_data)
     
-    return post
+    # insert_one acrescenta o _id; geo é interno
+    post_dict.pop('_id', None)
+    post_dict.pop('geo', None)
+    return fast_json(post_dict)
 
 @api_router.post("/posts/{post_id}/comments")
 async def add_comment(post_id: str, comment_data: PostCommentCreate, current_user: User = Depends(get_current_user)):
+    # Incrementa o contador do post; se o post não existe, não cria comentário órfão.
+    # Só o backfill_comment_counts cria o contador: nos posts antigos ainda sem
+    # ele o $inc não casa e a recontagem do backfill inclui este comentário
+    result = await db.posts.update_one(
+        {'id': post_id, 'comment_count': {'$exists': True}}, {'$inc': {'comment_count': 1}}
+    )
+    if result.matched_count == 0 and not await db.posts.find_one({'id': post_id}, {'_id': 1}):
+        raise HTTPException(status_code=404, detail="Post not found")
+    
     comment = PostComment(
         post_id=post_id,
         user_id=current_user.id,
@@ -351,27 +776,232 @@ async def add_comment(post_id: str, comment_data: PostCommentCreate, current_use
     
     comment_dict = comment.model_dump()
     comment_dict['created_at'] = comment_dict['created_at'].isoformat()
+    comment_dict['author'] = author_snapshot(current_user)
     
-    await db.comments.insert_one(comment_dict)
+    try:
+        await db.comments.insert_one(comment_dict)
+    except Exception:
+        # Desfaz o incremento para o contador não ficar acima do real
+        if result.modified_count:
+            await db.posts.update_one({'id': post_id}, {'$inc': {'comment_count': -1}})
+        raise
     return comment
 
 @api_router.get("/posts/{post_id}/comments")
-async def get_comments(post_id: str):
-    comments = await db.comments.find({'post_id': post_id}, {'_id': 0}).sort('created_at', 1).to_list(1000)
+async def get_comments(post_id: str, response: Response, limit: int = 50, cursor: Optional[str] = None):
+    """
+    Lista os comentários de um post em ordem cronológica, paginados por chave.
+    O cursor da próxima página vem no header X-Next-Cursor (ausente na última página).
+    """
+    limit = max(1, min(limit, 200))
+    query = {'post_id': post_id, **keyset_filter(cursor, descending=False)}
     
-    for comment in comments:
-        if isinstance(comment['created_at'], str):
-            comment['created_at'] = datetime.fromisoformat(comment['created_at'])
-        
-        user = await db.users.find_one({'id': comment['user_id']}, {'_id': 0, 'password': 0, 'email': 0})
-        if user:
-            comment['user'] = {'name': user['name'], 'role': user['role']}
+    comments = await db.comments.find(query, {'_id': 0}).sort([('created_at', 1), ('id', 1)]).to_list(limit + 1)
+    
+    next_cursor = next_page_cursor(comments, limit)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    comments = comments[:limit]
+    
+    await attach_authors(comments)
+    
+    return fast_json(comments, response)
+
+@api_router.delete("/posts/{post_id}/comments/{comment_id}")
+async def delete_comment(post_id: str, comment_id: str, current_user: User = Depends(get_current_user)):
+    """Exclui um comentário (autor do comentário ou admin)"""
+    comment = await db.comments.find_one({'id': comment_id, 'post_id': post_id}, {'_id': 0, 'user_id': 1})
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    
+    if comment['user_id'] != current_user.id and current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Not allowed")
+    
+    result = await db.comments.delete_one({'id': comment_id, 'post_id': post_id})
+    if result.deleted_count:
+        await db.posts.update_one({'id': post_id, 'comment_count': {'$exists': True}}, {'$inc': {'comment_count': -1}})
+    
+    return {'message': 'Comment deleted successfully'}
+
+@api_router.get("/posts/search")
+async def search_posts(
+    q: str,
+    language: str = 'pt',
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    page: int = 1,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Busca textual em título e descrição dos posts da cidade, ordenada por relevância.
+    Retorna a página pedida e a contagem de resultados por categoria na mesma query.
+    """
+    q = q.strip()
+    if len(q) < 2:
+        raise HTTPException(status_code=400, detail="Query too short")
+    if language not in SEARCH_LANGUAGES:
+        raise HTTPException(status_code=400, detail="Unsupported language")
+    
+    page = max(1, page)
+    limit = max(1, min(limit, 50))
+    
+    match = {'$text': {'$search': q, '$language': language}, 'city': request_city(city, current_user)}
+    if type:
+        match['type'] = type
+    if category:
+        match['$or'] = [{'category': category}, {'categories': category}]
+    
+    # Mesma regra do feed: voluntários/helpers só veem pedidos das categorias em que ajudam
+    if current_user.role in ['volunteer', 'helper'] and current_user.help_mask:
+        match.setdefault('$and', []).append({'$or': [
+            {'type': {'$ne': 'need'}},
+            {'category_mask': {'$bitsAnySet': current_user.help_mask}}
+        ]})
+    
+    pipeline = [
+        {'$match': match},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+        {'$facet': {
+            'posts': [
+                {'$sort': {'score': -1, 'created_at': -1}},
+                {'$skip': (page - 1) * limit},
+                {'$limit': limit},
+                {'$project': {'_id': 0}}
+            ],
+            'categories': [{'$group': {'_id': '$category', 'count': {'$sum': 1}}}],
+            'total': [{'$count': 'count'}]
+        }}
+    ]
+    
+    result = await db.posts.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {'posts': [], 'categories': [], 'total': []}
+    
+    posts = facets['posts']
+    await attach_authors(posts, prefer_display_name=True)
+    for post in posts:
+        if not post.get('categories'):
+            post['categories'] = [post['category']] if post.get('category') else []
+        post.setdefault('comment_count', 0)
+        post['score'] = round(post['score'], 4)
+    
+    total = facets['total'][0]['count'] if facets['total'] else 0
+    return fast_json({
+        'posts': posts,
+        'total': total,
+        'page': page,
+        'limit': limit,
+        'has_more': page * limit < total,
+        'categories': {row['_id']: row['count'] for row in facets['categories'] if row['_id']}
+    })
+
+# Pesos do ranking "precisa perto de mim" (somam 1)
+NEARBY_WEIGHTS = {'distance': 0.5, 'recency': 0.3, 'category': 0.2}
+NEARBY_MAX_AGE_DAYS = 90
+NEARBY_RECENCY_HALF_LIFE_HOURS = 72
+NEARBY_MAX_RADIUS_KM = 50
+
+@api_router.get("/posts/nearby")
+async def get_nearby_needs(
+    lat: float,
+    lng: float,
+    radius: float = 10.0,  # km
+    city: Optional[str] = None,
+    page: int = 1,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Feed de pedidos de ajuda próximos, ranqueado no banco por distância,
+    recência e afinidade com as categorias de ajuda do usuário.
+    """
+    origin = geo_point({'lat': lat, 'lng': lng})
+    if not origin:
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    
+    radius = max(0.1, min(radius, NEARBY_MAX_RADIUS_KM))
+    page = max(1, page)
+    limit = max(1, min(limit, 50))
+    max_distance = radius * 1000
+    
+    help_categories = mask_categories(current_user.help_mask)
+    
+    now = datetime.now(timezone.utc)
+    geo_query = {
+        'city': request_city(city, current_user, lat, lng),
+        'type': 'need',
+        'created_at': {'$gte': (now - timedelta(days=NEARBY_MAX_AGE_DAYS)).isoformat()}
+    }
+    # Mesma regra do feed: voluntários/helpers só veem pedidos das categorias em que ajudam
+    if current_user.role in ['volunteer', 'helper'] and current_user.help_mask:
+        geo_query['category_mask'] = {'$bitsAnySet': current_user.help_mask}
+    
+    categories_expr = {'$cond': [
+        {'$gt': [{'$size': {'$ifNull': ['$categories', []]}}, 0]},
+        '$categories',
+        ['$category']
+    ]}
+    age_hours = {'$divide': [
+        {'$subtract': [now, {'$dateFromString': {'dateString': '$created_at', 'onError': now}}]},
+        3600 * 1000
+    ]}
+    
+    pipeline = [
+        {'$geoNear': {
+            'near': origin,
+            'key': 'geo',
+            'distanceField': 'distance',
+            'maxDistance': max_distance,
+            'spherical': True,
+            'query': geo_query
+        }},
+        {'$addFields': {
+            'distance_score': {'$subtract': [1, {'$divide': ['$distance', max_distance]}]},
+            'recency_score': {'$divide': [
+                NEARBY_RECENCY_HALF_LIFE_HOURS,
+                {'$add': [NEARBY_RECENCY_HALF_LIFE_HOURS, {'$max': [age_hours, 0]}]}
+            ]},
+            'category_score': {'$cond': [
+                {'$gt': [len(help_categories), 0]},
+                {'$divide': [
+                    {'$size': {'$setIntersection': [categories_expr, help_categories]}},
+                    {'$max': [{'$size': categories_expr}, 1]}
+                ]},
+                0
+            ]}
+        }},
+        {'$addFields': {'score': {'$add': [
+            {'$multiply': [NEARBY_WEIGHTS['distance'], '$distance_score']},
+            {'$multiply': [NEARBY_WEIGHTS['recency'], '$recency_score']},
+            {'$multiply': [NEARBY_WEIGHTS['category'], '$category_score']}
+        ]}}},
+        {'$sort': {'score': -1, 'created_at': -1}},
+        {'$skip': (page - 1) * limit},
+        {'$limit': limit + 1},
+        {'$project': {'_id': 0, 'geo': 0, 'distance_score': 0, 'recency_score': 0, 'category_score': 0}}
+    ]
     
-    return comments
+    posts = await db.posts.aggregate(pipeline).to_list(limit + 1)
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    
+    await attach_authors(posts, prefer_display_name=True)
+    for post in posts:
+        if not post.get('categories'):
+            post['categories'] = [post['category']] if post.get('category') else []
+        post.setdefault('comment_count', 0)
+        post['distance'] = round(post['distance'] / 1000, 2)
+        post['score'] = round(post['score'], 4)
+        post['can_help'] = True
+    
+    return fast_json({'posts': posts, 'page': page, 'limit': limit, 'has_more': has_more})
 
 @api_router.get("/posts")
-async def get_posts(type: Optional[str] = None, category: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    query = {}
+async def get_posts(type: Optional[str] = None, category: Optional[str] = None, city: Optional[str] = None,
+                    current_user: User = Depends(get_current_user)):
+    # Feed da cidade do usuário (ou da pedida); o índice (city, created_at) atende a query
+    query = {'city': request_city(city, current_user)}
     if type:
         query['type'] = type
     if category:
@@ -381,44 +1011,27 @@ async def get_posts(type: Optional[str] = None, category: Optional[str] = None,
             {'categories': category}
         ]
     
-    posts = await db.posts.find(query, {'_id': 0}).sort('created_at', -1).to_list(100)
+    posts = await db.posts.find(query, {'_id': 0, 'geo': 0}).sort('created_at', -1).to_list(100)
     
     # Se o usuário é voluntário, marcar posts que ele pode ajudar baseado nas categorias
-    user_data = await db.users.find_one({'id': current_user.id}, {'_id': 0})
-    user_help_categories = user_data.get('help_categories', []) if user_data else []
+    help_mask = current_user.help_mask
     
-    # Batch fetch all unique user_ids to avoid N+1 queries
-    user_ids = list(set(post['user_id'] for post in posts if post['user_id'] != 'system'))
-    users_dict = {}
-    if user_ids:
-        users_cursor = db.users.find({'id': {'$in': user_ids}}, {'_id': 0, 'password': 0, 'email': 0})
-        async for user in users_cursor:
-            users_dict[user['id']] = user
+    # Autor vem do snapshot embutido no post (posts antigos são resolvidos em lote)
+    await attach_authors(posts, prefer_display_name=True)
     
     filtered_posts = []
     for post in posts:
-        if isinstance(post['created_at'], str):
-            post['created_at'] = datetime.fromisoformat(post['created_at'])
-        
-        if post['user_id'] == 'system':
-            post['user'] = {'name': 'Watizat Assistant', 'role': 'assistant'}
-        else:
-            user = users_dict.get(post['user_id'])
-            if user:
-                display_name = user.get('display_name') if user.get('use_display_name') else user['name']
-                post['user'] = {'name': display_name, 'role': user['role']}
-        
         # Garantir que posts tenham campo categories
         if 'categories' not in post or not post['categories']:
             post['categories'] = [post['category']] if post.get('category') else []
+        post.setdefault('comment_count', 0)
         
         # Se é voluntário ou helper e o post é do tipo "need" (precisa de ajuda)
         # só mostrar se alguma categoria do post está nas categorias que ele pode ajudar
         if current_user.role in ['volunteer', 'helper']:
             if post['type'] == 'need':
-                post_categories = post.get('categories', [post.get('category')])
                 # Se não tem categorias definidas ou alguma categoria do post está nas dele
-                if not user_help_categories or any(cat in user_help_categories for cat in post_categories):
+                if not help_mask or post_category_mask(post) & help_mask:
                     post['can_help'] = True
                     filtered_posts.append(post)
             else:
@@ -430,16 +1043,14 @@ async def get_posts(type: Optional[str] = None, category: Optional[str] = None,
             post['can_help'] = True
             filtered_posts.append(post)
     
-    return filtered_posts
+    return fast_json(filtered_posts)
 
 @api_router.get("/services")
 async def get_services(category: Optional[str] = None):
-    query = {}
+    services = await reference_data.get('services')
     if category:
-        query['category'] = category
-    
-    services = await db.services.find(query, {'_id': 0}).to_list(100)
-    return services
+        services = [service for service in services if service.get('category') == category]
+    return services[:100]
 
 @api_router.post("/ai/chat")
 async def ai_chat(message_data: AIMessage, current_user: User = Depends(get_current_user)):
@@ -450,7 +1061,7 @@ async def ai_chat(message_data: AIMessage, current_user: User = Depends(get_curr
         if not openai_key:
             # Retornar resposta baseada no guia Watizat sem IA
             pdf_processor.load_index()
-            relevant_chunks = pdf_processor.search(message_data.message, k=3)
+            relevant_chunks = pdf_processor.search(message_data.message, k=3, city=user_city(current_user))
             
             if relevant_chunks:
                 context_response = f"""Encontrei as seguintes informações no Guia Watizat que podem ajudar:
@@ -483,11 +1094,11 @@ Estamos aqui para ajudar!"""
         
         # Com chave OpenAI - usar IA
         pdf_processor.load_index()
-        relevant_chunks = pdf_processor.search(message_data.message, k=3)
+        relevant_chunks = pdf_processor.search(message_data.message, k=3, city=user_city(current_user))
         
         context = "\n\n".join(relevant_chunks) if relevant_chunks else "Informação não encontrada no guia Watizat."
         
-        system_message = f"""Você é um assistente especializado em ajudar migrantes em Paris. 
+        system_message = f"""Você é um assistente especializado em ajudar migrantes em {CITIES.get(user_city(current_user), CITIES[DEFAULT_CITY])['name']}. 
         Use as informações do guia Watizat abaixo para responder perguntas.
         Seja empático, claro e objetivo. Responda em {message_data.language}.
         
@@ -534,6 +1145,10 @@ async def create_match(helper_id: str, current_user: User = Depends(get_current_
     if current_user.role != 'migrant':
         raise HTTPException(status_code=400, detail="Only migrants can create matches")
     
+    helper = await db.users.find_one({'id': helper_id, 'role': {'$in': MATCH_ROLES}, **ACTIVE_USER}, {'_id': 0, 'id': 1})
+    if not helper:
+        raise HTTPException(status_code=404, detail="Helper not found")
+    
     match = Match(
         helper_id=helper_id,
         migrant_id=current_user.id,
@@ -557,28 +1172,161 @@ async def get_matches(current_user: User = Depends(get_current_user)):
     matches = await db.matches.find(query, {'_id': 0}).to_list(100)
     return matches
 
+# ==================== MATCH SUGGESTIONS ====================
+# match_candidates tem um documento por helper/voluntário ativo e cidade, com
+# o necessário para o ranking (matching.py). Ele é reescrito quando o perfil
+# muda; a mudança de cidade ou a saída do papel vira um documento removed=True
+# para que o índice em memória dos outros workers também a veja. A
+# responsividade (quantos de quem escreveu ao helper nos últimos 30 dias
+# receberam resposta) é recalculada por um job periódico.
+
+MATCH_ROLES = ['helper', 'volunteer']
+MATCH_SUGGESTIONS_MAX = 50
+MATCH_INDEX_REFRESH_SECONDS = 5
+RESPONSIVENESS_WINDOW = timedelta(days=30)
+RESPONSIVENESS_INTERVAL = 900  # segundos entre execuções do job
+MATCH_USER_PROJECTION = {
+    '_id': 0, 'id': 1, 'role': 1, 'city': 1, 'help_mask': 1, 'help_categories': 1,
+    'languages': 1, 'location': 1, 'show_location': 1, 'availability': 1
+}
+
+def match_candidate_update(user: dict, now: str) -> UpdateOne:
+    city = user.get('city') or DEFAULT_CITY
+    help_mask = user.get('help_mask')
+    return UpdateOne({'id': user['id'], 'city': city}, {
+        '$set': {
+            'role': user['role'],
+            'help_mask': category_mask(user.get('help_categories')) if help_mask is None else help_mask,
+            'languages': user.get('languages') or [],
+            # Localização escondida não entra na distância
+            'location': user.get('location') if user.get('show_location') else None,
+            'available': bool(user.get('availability')),
+            'removed': False,
+            'updated_at': now
+        },
+        '$setOnInsert': {'responsiveness': DEFAULT_RESPONSIVENESS}
+    }, upsert=True)
+
+async def refresh_match_candidate(user_id: str):
+    """Reflete em match_candidates o perfil atual do usuário (ou o retira)"""
+    user = await db.users.find_one({'id': user_id, **ACTIVE_USER}, MATCH_USER_PROJECTION)
+    now = datetime.now(timezone.utc).isoformat()
+    stale = {'id': user_id, 'removed': False}
+    if user and user.get('role') in MATCH_ROLES:
+        stale['city'] = {'$ne': user.get('city') or DEFAULT_CITY}
+    await db.match_candidates.update_many(stale, {'$set': {'removed': True, 'updated_at': now}})
+    if user and user.get('role') in MATCH_ROLES:
+        await db.match_candidates.bulk_write([match_candidate_update(user, now)])
+    # Este worker enxerga a mudança na próxima consulta; os outros, no refresh
+    match_index.invalidate()
+
+def helper_profile_changed(user_id: str):
+    """Perfil, papel ou status de um helper/voluntário mudou: sugestões e listagem de voluntários"""
+    run_in_background(refresh_match_candidate(user_id))
+    run_in_background(reference_data.bump('volunteers'))
+    volunteer_pages.invalidate()
+
+async def load_match_candidate_changes(city: str, since: Optional[str]) -> List[dict]:
+    query = {'city': city}
+    if since:
+        query['updated_at'] = {'$gte': since}
+    else:
+        query['removed'] = False
+    return await db.match_candidates.find(query, {'_id': 0, 'city': 0, 'role': 0}).sort('updated_at', 1).to_list(None)
+
+match_index = MatchIndex(load_match_candidate_changes, MATCH_INDEX_REFRESH_SECONDS)
+
+async def refresh_responsiveness() -> int:
+    """Atualiza a responsividade dos candidatos que mudaram; devolve quantos"""
+    now = datetime.now(timezone.utc)
+    pairs = set()
+    async for row in db.messages.aggregate([
+        {'$match': {'created_at': {'$gte': (now - RESPONSIVENESS_WINDOW).isoformat()}, 'is_auto_response': {'$ne': True}}},
+        {'$group': {'_id': {'from': '$from_user_id', 'to': '$to_user_id'}}}
+    ]):
+        pairs.add((row['_id']['from'], row['_id']['to']))
+    
+    received, replied = {}, {}
+    for sender, recipient in pairs:
+        received[recipient] = received.get(recipient, 0) + 1
+        if (recipient, sender) in pairs:
+            replied[recipient] = replied.get(recipient, 0) + 1
+    
+    ops = []
+    async for candidate in db.match_candidates.find({'removed': False}, {'_id': 0, 'id': 1, 'city': 1, 'responsiveness': 1}):
+        # Suavizado: sem conversas fica em 0.5 e poucas conversas não levam aos extremos
+        value = round((replied.get(candidate['id'], 0) + 1) / (received.get(candidate['id'], 0) + 2), 3)
+        if abs(value - candidate.get('responsiveness', DEFAULT_RESPONSIVENESS)) >= 0.01:
+            ops.append(UpdateOne(
+                {'id': candidate['id'], 'city': candidate['city']},
+                {'$set': {'responsiveness': value, 'updated_at': now.isoformat()}}
+            ))
+    for start in range(0, len(ops), 1000):
+        await db.match_candidates.bulk_write(ops[start:start + 1000], ordered=False)
+    return len(ops)
+
+@api_router.get("/matches/suggestions")
+async def get_match_suggestions(limit: int = 10, city: Optional[str] = None,
+                                current_user: User = Depends(get_current_user)):
+    """
+    Helpers e voluntários sugeridos para o migrante, ranqueados por categorias
+    em comum, idioma, distância, disponibilidade e responsividade.
+    """
+    if current_user.role != 'migrant':
+        raise HTTPException(status_code=400, detail="Only migrants can get suggestions")
+    
+    limit = max(1, min(limit, MATCH_SUGGESTIONS_MAX))
+    candidates = await match_index.city(request_city(city, current_user))
+    need_mask = current_user.need_mask if current_user.effective_need_mask is None else current_user.effective_need_mask
+    languages = language_mask(current_user.languages)
+    
+    # Quem foi excluído depois do último refresh do índice ainda aparece no
+    # top-k: sai do ranking e a busca é refeita até completar o limite
+    excluded = {current_user.id}
+    suggestions = []
+    while len(suggestions) < limit:
+        ranked = candidates.top(need_mask, languages, current_user.location, limit - len(suggestions),
+                                exclude=excluded)
+        if not ranked:
+            break
+        ids = [candidate.id for _, candidate, _ in ranked]
+        excluded.update(ids)
+        users = await db.users.find({'id': {'$in': ids}, **ACTIVE_USER}, PUBLIC_USER_PROJECTION).to_list(None)
+        by_id = {user['id']: user for user in users}
+        suggestions.extend(
+            {
+                'user': by_id[candidate.id],
+                'score': round(score, 4),
+                'score_parts': parts,
+                'matching_categories': mask_categories(need_mask & candidate.help_mask)
+            }
+            for score, candidate, parts in ranked if candidate.id in by_id
+        )
+    return fast_json({'suggestions': suggestions})
+
 @api_router.get("/admin/stats")
 async def admin_stats(current_user: User = Depends(get_current_user)):
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin only")
     
-    total_users = await db.users.count_documents({})
-    total_posts = await db.posts.count_documents({})
-    total_matches = await db.matches.count_documents({})
-    total_volunteers = await db.users.count_documents({'role': 'volunteer'})
-    total_migrants = await db.users.count_documents({'role': 'migrant'})
-    total_messages = await db.messages.count_documents({})
+    # Contagens do painel toleram atraso: vão a um secundário
+    stats_db = read_db(EVENTUAL)
+    total_users = await stats_db.users.count_documents({})
+    total_posts = await stats_db.posts.count_documents({})
+    total_matches = await stats_db.matches.count_documents({})
+    total_volunteers = await stats_db.users.count_documents({'role': 'volunteer'})
+    total_migrants = await stats_db.users.count_documents({'role': 'migrant'})
+    total_messages = await stats_db.messages.count_documents({})
     
     # Posts por categoria
     posts_by_category = {}
-    categories = ['food', 'legal', 'health', 'housing', 'work', 'education', 'social', 'clothes', 'furniture', 'transport']
-    for cat in categories:
-        count = await db.posts.count_documents({'category': cat})
+    for cat in CATEGORIES:
+        count = await stats_db.posts.count_documents({'category': cat})
         posts_by_category[cat] = count
     
     # Posts por tipo
-    needs_count = await db.posts.count_documents({'type': 'need'})
-    offers_count = await db.posts.count_documents({'type': 'offer'})
+    needs_count = await stats_db.posts.count_documents({'type': 'need'})
+    offers_count = await stats_db.posts.count_documents({'type': 'offer'})
     
     return {
         'total_users': total_users,
@@ -592,43 +1340,196 @@ async def admin_stats(current_user: User = Depends(get_current_user)):
         'offers_count': offers_count
     }
 
+def as_utc_iso(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+def date_range_filter(created_from: Optional[str], created_to: Optional[str]) -> dict:
+    """Filtro por created_at; aceita datas (AAAA-MM-DD) ou timestamps ISO"""
+    bounds = {}
+    try:
+        if created_from:
+            bounds['$gte'] = as_utc_iso(datetime.fromisoformat(created_from))
+        if created_to:
+            end = datetime.fromisoformat(created_to)
+            if len(created_to) == 10:
+                # Data sem hora inclui o dia inteiro
+                bounds['$lt'] = as_utc_iso(end + timedelta(days=1))
+            else:
+                bounds['$lte'] = as_utc_iso(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    return {'created_at': bounds} if bounds else {}
+
+def build_admin_user_query(role: Optional[str], q: Optional[str], created_from: Optional[str], created_to: Optional[str]) -> dict:
+    text_filter = {}
+    if q and q.strip():
+        # Prefixo ancorado: usa os índices de email/name em vez de varrer a coleção
+        prefix = re.escape(q.strip())
+        text_filter = {'$or': [
+            {'email': {'$regex': f'^{prefix}'}},
+            {'name': {'$regex': f'^{prefix}'}}
+        ]}
+    return combine_filters(
+        ACTIVE_USER,
+        {'role': role} if role else {},
+        date_range_filter(created_from, created_to),
+        text_filter
+    )
+
+def build_admin_post_query(type: Optional[str], category: Optional[str], user_id: Optional[str], q: Optional[str],
+                           created_from: Optional[str], created_to: Optional[str]) -> dict:
+    return combine_filters(
+        {'type': type} if type else {},
+        {'$or': [{'category': category}, {'categories': category}]} if category else {},
+        {'user_id': user_id} if user_id else {},
+        {'title': {'$regex': f'^{re.escape(q.strip())}'}} if q and q.strip() else {},
+        date_range_filter(created_from, created_to)
+    )
+
+ADMIN_USER_PROJECTION = {'_id': 0, 'password': 0}
+ADMIN_POST_PROJECTION = {'_id': 0, 'geo': 0}
+ADMIN_PAGE_LIMIT = 500
+
 @api_router.get("/admin/users")
-async def admin_get_users(current_user: User = Depends(get_current_user)):
+async def admin_get_users(
+    response: Response,
+    role: Optional[str] = None,
+    q: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Lista usuários do mais novo para o mais antigo, paginado por chave.
+    O cursor da próxima página vem no header X-Next-Cursor.
+    """
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin only")
     
-    users = await db.users.find({}, {'_id': 0, 'password': 0}).sort('created_at', -1).to_list(1000)
+    limit = max(1, min(limit, ADMIN_PAGE_LIMIT))
+    query = combine_filters(build_admin_user_query(role, q, created_from, created_to), keyset_filter(cursor))
     
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
+    users = await db.users.find(query, ADMIN_USER_PROJECTION).sort([('created_at', -1), ('id', -1)]).to_list(limit + 1)
     
-    return users
+    next_cursor = next_page_cursor(users, limit)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    users = users[:limit]
+    
+    return fast_json(users, response)
 
 @api_router.get("/admin/posts")
-async def admin_get_posts(current_user: User = Depends(get_current_user)):
+async def admin_get_posts(
+    response: Response,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    user_id: Optional[str] = None,
+    q: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Lista posts do mais novo para o mais antigo, paginado por chave.
+    O cursor da próxima página vem no header X-Next-Cursor.
+    """
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin only")
     
-    posts = await db.posts.find({}, {'_id': 0}).sort('created_at', -1).to_list(1000)
+    limit = max(1, min(limit, ADMIN_PAGE_LIMIT))
+    query = combine_filters(
+        build_admin_post_query(type, category, user_id, q, created_from, created_to),
+        keyset_filter(cursor)
+    )
     
-    # Batch fetch all unique user_ids to avoid N+1 queries
-    user_ids = list(set(post['user_id'] for post in posts if post.get('user_id')))
-    users_dict = {}
-    if user_ids:
-        users_cursor = db.users.find({'id': {'$in': user_ids}}, {'_id': 0, 'password': 0, 'email': 0})
-        async for user in users_cursor:
-            users_dict[user['id']] = user
+    posts = await db.posts.find(query, ADMIN_POST_PROJECTION).sort([('created_at', -1), ('id', -1)]).to_list(limit + 1)
     
-    for post in posts:
-        if isinstance(post.get('created_at'), str):
-            post['created_at'] = datetime.fromisoformat(post['created_at'])
-        # Get user info from batch
-        user = users_dict.get(post.get('user_id'))
-        if user:
-            post['user'] = {'name': user['name'], 'role': user['role']}
+    next_cursor = next_page_cursor(posts, limit)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    posts = posts[:limit]
+    
+    await attach_authors(posts)
     
-    return posts
+    return fast_json(posts, response)
+
+# Colunas do export CSV; no NDJSON vai o documento inteiro (com a projeção da listagem)
+EXPORT_COLUMNS = {
+    'users': ['id', 'email', 'name', 'display_name', 'role', 'languages', 'professional_area',
+              'help_categories', 'need_categories', 'created_at'],
+    'posts': ['id', 'user_id', 'type', 'category', 'categories', 'title', 'description',
+              'comment_count', 'created_at']
+}
+EXPORT_BATCH_SIZE = 1000
+
+def export_csv_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return str(value)
+
+async def stream_export(cursor, columns: List[str], format: str):
+    """Gera o export linha a linha a partir do cursor, com memória constante"""
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        async for doc in cursor:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow([export_csv_value(doc.get(column)) for column in columns])
+            yield buffer.getvalue()
+    else:
+        async for doc in cursor:
+            yield json.dumps(doc, default=str, ensure_ascii=False) + '\n'
+
+@api_router.get("/admin/export/{collection}")
+async def admin_export(
+    collection: str,
+    format: str = 'csv',
+    role: Optional[str] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    user_id: Optional[str] = None,
+    q: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Exporta usuários ou posts (CSV ou NDJSON) com os mesmos filtros das listagens"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    if collection not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    if format not in ('csv', 'ndjson'):
+        raise HTTPException(status_code=400, detail="Invalid format")
+    
+    if collection == 'users':
+        query = build_admin_user_query(role, q, created_from, created_to)
+        projection = ADMIN_USER_PROJECTION
+    else:
+        query = build_admin_post_query(type, category, user_id, q, created_from, created_to)
+        # Mídia e snapshot do autor ficam fora do export
+        projection = {**ADMIN_POST_PROJECTION, 'images': 0, 'author': 0}
+    
+    cursor = db[collection].find(query, projection, batch_size=EXPORT_BATCH_SIZE).sort([('created_at', -1), ('id', -1)])
+    
+    filename = f"{collection}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(cursor, EXPORT_COLUMNS[collection], format),
+        media_type='text/csv; charset=utf-8' if format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @api_router.delete("/admin/users/{user_id}")
 async def admin_delete_user(user_id: str, current_user: User = Depends(get_current_user)):
@@ -639,27 +1540,65 @@ async def admin_delete_user(user_id: str, current_user: User = Depends(get_curre
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    result = await db.users.delete_one({'id': user_id})
-    if result.deleted_count == 0:
+    job = await start_user_deletion(user_id, current_user.id)
+    if job is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Also delete user's posts and messages
-    await db.posts.delete_many({'user_id': user_id})
-    await db.messages.delete_many({'$or': [{'from_user_id': user_id}, {'to_user_id': user_id}]})
+    return {'message': 'User deletion started', 'job_id': job['id'], 'status': job['status']}
+
+@api_router.post("/admin/users/bulk-delete")
+async def admin_bulk_delete_users(payload: dict, current_user: User = Depends(get_current_user)):
+    """Marca vários usuários para exclusão e agenda um job para cada um"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    user_ids = payload.get('user_ids') or []
+    if not isinstance(user_ids, list) or len(user_ids) > DELETION_BULK_LIMIT:
+        raise HTTPException(status_code=400, detail=f"user_ids must be a list of at most {DELETION_BULK_LIMIT} ids")
+    
+    jobs, not_found = [], []
+    for user_id in dict.fromkeys(user_ids):
+        if user_id == current_user.id:
+            continue
+        job = await start_user_deletion(user_id, current_user.id)
+        if job:
+            jobs.append({'user_id': user_id, 'job_id': job['id'], 'status': job['status']})
+        else:
+            not_found.append(user_id)
     
-    return {'message': 'User deleted successfully'}
+    return {'jobs': jobs, 'not_found': not_found}
+
+@api_router.get("/admin/deletion-jobs")
+async def admin_get_deletion_jobs(status: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    query = {'status': status} if status else {}
+    return await db.deletion_jobs.find(query, {'_id': 0}).sort('created_at', -1).to_list(100)
+
+@api_router.get("/admin/deletion-jobs/{job_id}")
+async def admin_get_deletion_job(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    job = await db.deletion_jobs.find_one({'id': job_id}, {'_id': 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @api_router.delete("/admin/posts/{post_id}")
 async def admin_delete_post(post_id: str, current_user: User = Depends(get_current_user)):
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin only")
     
-    result = await db.posts.delete_one({'id': post_id})
-    if result.deleted_count == 0:
+    post = await db.posts.find_one_and_delete({'id': post_id}, projection={'_id': 0, 'user_id': 1, 'type': 1})
+    if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     # Also delete comments
     await db.comments.delete_many({'post_id': post_id})
+    if post.get('type') == 'need':
+        await refresh_effective_needs(post['user_id'])
     
     return {'message': 'Post deleted successfully'}
 
@@ -676,8 +1615,31 @@ async def admin_update_user_role(user_id: str, role_data: dict, current_user: Us
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    if result.modified_count:
+        run_in_background(fan_out_author_snapshot(user_id))
+        helper_profile_changed(user_id)
+    
     return {'message': 'Role updated successfully'}
 
+@api_router.post("/admin/author-snapshots/audit")
+async def admin_audit_author_snapshots(repair: bool = False, current_user: User = Depends(get_current_user)):
+    """Agenda a auditoria (e opcionalmente a correção) dos snapshots de autor; o status sai do GET abaixo"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    job = await start_snapshot_audit(repair, current_user.id)
+    return {'message': 'Author snapshot audit started', 'job_id': job['id'], 'status': job['status']}
+
+@api_router.get("/admin/author-snapshots/audit/{job_id}")
+async def admin_get_snapshot_audit(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    job = await db.snapshot_audit_jobs.find_one({'id': job_id}, {'_id': 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 class DirectMessage(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -704,7 +1666,10 @@ async def send_message(msg_data: DirectMessageCreate, current_user: User = Depen
     msg_dict = message.model_dump()
     msg_dict['created_at'] = msg_dict['created_at'].isoformat()
     msg_dict['location'] = msg_data.location
-    msg_dict['media'] = msg_data.media or []
+    try:
+        msg_dict['media'] = await media_store.ingest(msg_data.media, current_user.id)
+    except MediaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     msg_dict['media_type'] = msg_data.media_type
     
     await db.messages.insert_one(msg_dict)
@@ -719,11 +1684,7 @@ async def get_messages(other_user_id: str, current_user: User = Depends(get_curr
         ]
     }, {'_id': 0}).sort('created_at', 1).to_list(1000)
     
-    for msg in messages:
-        if isinstance(msg['created_at'], str):
-            msg['created_at'] = datetime.fromisoformat(msg['created_at'])
-    
-    return messages
+    return fast_json(messages)
 
 @api_router.get("/conversations")
 async def get_conversations(current_user: User = Depends(get_current_user)):
@@ -745,7 +1706,7 @@ async def get_conversations(current_user: User = Depends(get_current_user)):
     user_ids_list = list(user_ids)
     users_dict = {}
     if user_ids_list:
-        users_cursor = db.users.find({'id': {'$in': user_ids_list}}, {'_id': 0, 'password': 0})
+        users_cursor = db.users.find({'id': {'$in': user_ids_list}}, USER_RESPONSE_PROJECTION)
         async for user in users_cursor:
             users_dict[user['id']] = user
     
@@ -764,9 +1725,6 @@ async def get_conversations(current_user: User = Depends(get_current_user)):
     for uid in user_ids:
         user = users_dict.get(uid)
         if user:
-            if isinstance(user.get('created_at'), str):
-                user['created_at'] = datetime.fromisoformat(user['created_at'])
-            
             last_msg = last_messages.get(uid)
             conversations.append({
                 'user': user,
@@ -774,82 +1732,233 @@ async def get_conversations(current_user: User = Depends(get_current_user)):
                 'last_message_time': last_msg['created_at'] if last_msg else None
             })
     
-    return conversations
+    return fast_json(conversations)
 
 @api_router.get("/users/{user_id}")
 async def get_user_by_id(user_id: str, current_user: User = Depends(get_current_user)):
-    user = await db.users.find_one({'id': user_id}, {'_id': 0, 'password': 0})
+    user = await db.users.find_one({'id': user_id, **ACTIVE_USER}, USER_RESPONSE_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
-    
-    return user
+    return fast_json(user)
 
-@api_router.get("/can-chat/{other_user_id}")
-async def can_chat_with_user(other_user_id: str, current_user: User = Depends(get_current_user)):
+# ==================== CAN CHAT ====================
+# Cada usuário guarda effective_need_mask: as categorias declaradas em
+# need_categories mais as dos seus posts do tipo 'need'. É recalculada quando
+# o usuário cria ou perde um pedido e quando edita need_categories, então
+# decidir se um voluntário pode falar com um migrante não lê os posts.
+
+CAN_CHAT_BATCH_LIMIT = 500
+CAN_CHAT_PROJECTION = {
+    '_id': 0, 'id': 1, 'role': 1, 'need_categories': 1, 'need_mask': 1, 'effective_need_mask': 1
+}
+NEED_POST_PROJECTION = {'_id': 0, 'user_id': 1, 'category': 1, 'categories': 1, 'category_mask': 1}
+
+class CanChatBatch(BaseModel):
+    user_ids: List[str] = Field(..., max_length=CAN_CHAT_BATCH_LIMIT)
+
+def declared_need_mask(user: dict) -> int:
+    mask = user.get('need_mask')
+    return category_mask(user.get('need_categories')) if mask is None else mask
+
+async def refresh_effective_needs(user_id: str):
+    """Recalcula effective_need_mask a partir de need_categories e dos pedidos do usuário"""
+    user = await db.users.find_one({'id': user_id}, {'_id': 0, 'need_categories': 1, 'need_mask': 1})
+    if user is None:
+        return
+    mask = declared_need_mask(user)
+    async for post in db.posts.find({'user_id': user_id, 'type': 'need'}, NEED_POST_PROJECTION):
+        mask |= post_category_mask(post)
+    await db.users.update_one({'id': user_id}, {'$set': {'effective_need_mask': mask}})
+
+async def attach_effective_needs(users: List[dict]):
     """
-    Verifica se o usuário atual pode iniciar chat com outro usuário.
-    Para voluntários e helpers, só podem conversar com migrantes se tiverem categorias de ajuda compatíveis.
+    Garante effective_need_mask nos documentos; migrantes anteriores ao campo
+    são calculados com uma única consulta aos posts de todos eles
     """
-    other_user = await db.users.find_one({'id': other_user_id}, {'_id': 0})
-    if not other_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    current_user_data = await db.users.find_one({'id': current_user.id}, {'_id': 0})
-    
+    pending = {}
+    for user in users:
+        if user.get('effective_need_mask') is None:
+            user['effective_need_mask'] = declared_need_mask(user)
+            if user.get('role') == 'migrant':
+                pending[user['id']] = user
+    if pending:
+        async for post in db.posts.find({'user_id': {'$in': list(pending)}, 'type': 'need'}, NEED_POST_PROJECTION):
+            pending[post['user_id']]['effective_need_mask'] |= post_category_mask(post)
+
+def chat_permission(current_user: User, other_user: dict) -> dict:
+    """Regra do can-chat para um usuário já carregado (com effective_need_mask)"""
     # Migrantes podem conversar com qualquer voluntário ou helper
     if current_user.role == 'migrant':
         return {'can_chat': True, 'reason': 'allowed'}
     
     # Voluntários e helpers só podem conversar com migrantes se tiverem categorias compatíveis
     if current_user.role in ['volunteer', 'helper'] and other_user.get('role') == 'migrant':
-        helper_categories = current_user_data.get('help_categories', []) if current_user_data else []
-        
-        if not helper_categories:
+        help_mask = current_user.help_mask
+        if not help_mask:
             # Se não definiu categorias, permitir chat (legacy)
             return {'can_chat': True, 'reason': 'no_categories_defined'}
         
-        # Primeiro verificar need_categories do migrante
-        migrant_need_categories = other_user.get('need_categories', [])
-        
-        if migrant_need_categories:
-            # Verificar match entre need_categories do migrante e help_categories
-            for cat in migrant_need_categories:
-                if cat in helper_categories:
-                    return {'can_chat': True, 'reason': 'category_match', 'matching_category': cat}
-        
-        # Se migrante não tem need_categories, verificar pelos posts
-        migrant_posts = await db.posts.find({'user_id': other_user_id, 'type': 'need'}, {'_id': 0}).to_list(100)
-        
-        if not migrant_posts and not migrant_need_categories:
-            # Se o migrante não tem posts nem need_categories, permitir chat
+        needs = other_user['effective_need_mask']
+        if not needs:
+            # Migrante sem need_categories nem pedidos: permitir chat
             return {'can_chat': True, 'reason': 'no_needs_defined'}
         
-        # Verificar se há algum post do migrante em categoria que pode ajudar
-        for post in migrant_posts:
-            if post.get('category') in helper_categories:
-                return {'can_chat': True, 'reason': 'category_match', 'matching_category': post.get('category')}
+        common = needs & help_mask
+        if common:
+            # Categorias declaradas têm preferência sobre as vindas dos posts
+            matching = first_match(other_user.get('need_categories') or [], common) or mask_categories(common)[0]
+            return {'can_chat': True, 'reason': 'category_match', 'matching_category': matching}
         
         return {'can_chat': False, 'reason': 'no_matching_categories'}
     
     # Outros casos: permitir
     return {'can_chat': True, 'reason': 'allowed'}
 
-@api_router.get("/volunteers")
-async def get_volunteers(area: Optional[str] = None):
-    query = {'role': 'volunteer'}
-    if area:
-        query['professional_area'] = area
-    
-    volunteers = await db.users.find(query, {'_id': 0, 'password': 0, 'email': 0}).to_list(1000)
-    
-    for vol in volunteers:
-        if isinstance(vol.get('created_at'), str):
-            vol['created_at'] = datetime.fromisoformat(vol['created_at'])
+@api_router.get("/can-chat/{other_user_id}")
+async def can_chat_with_user(other_user_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Verifica se o usuário atual pode iniciar chat com outro usuário.
+    Para voluntários e helpers, só podem conversar com migrantes se tiverem categorias de ajuda compatíveis.
+    """
+    other_user = await db.users.find_one({'id': other_user_id, **ACTIVE_USER}, CAN_CHAT_PROJECTION)
+    if not other_user:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    return volunteers
+    await attach_effective_needs([other_user])
+    return chat_permission(current_user, other_user)
+
+@api_router.post("/can-chat/batch")
+async def can_chat_batch(payload: CanChatBatch, current_user: User = Depends(get_current_user)):
+    """
+    can-chat para vários usuários de uma vez (listas de voluntários e helpers
+    próximos): uma consulta aos usuários e, só para migrantes antigos, uma aos posts.
+    Ids inexistentes voltam com reason 'not_found'.
+    """
+    user_ids = list(dict.fromkeys(payload.user_ids))
+    users = await db.users.find({'id': {'$in': user_ids}, **ACTIVE_USER}, CAN_CHAT_PROJECTION).to_list(None)
+    await attach_effective_needs(users)
+    
+    answers = {user['id']: chat_permission(current_user, user) for user in users}
+    return fast_json({
+        'results': {
+            user_id: answers.get(user_id, {'can_chat': False, 'reason': 'not_found'})
+            for user_id in user_ids
+        }
+    })
+
+# ==================== VOLUNTEERS ====================
+# Listagem pública de voluntários, paginada por chave (created_at, id) com o
+# cursor da próxima página no header X-Next-Cursor. Cada página é guardada já
+# serializada por combinação de filtros; o cache é limpo quando um voluntário
+# muda o perfil e, nos outros workers, vence em VOLUNTEERS_CACHE_SECONDS.
+
+VOLUNTEERS_PAGE_LIMIT = 100
+VOLUNTEERS_CACHE_SECONDS = 30
+VOLUNTEERS_MAX_RADIUS_KM = 50
+# Campos dos cartões da listagem; view=full devolve o perfil público inteiro
+VOLUNTEER_LIST_PROJECTION = {
+    '_id': 0, 'id': 1, 'name': 1, 'display_name': 1, 'use_display_name': 1, 'professional_area': 1,
+    'languages': 1, 'help_categories': 1, 'availability': 1, 'organization': 1, 'city': 1,
+    'location': 1, 'show_location': 1, 'created_at': 1
+}
+# Cada worker tem as suas páginas; a versão do carimbo 'volunteers' (bump em
+# helper_profile_changed) entra na chave, então perfis alterados ou excluídos
+# saem da listagem de todos os workers em até REFERENCE_CHECK_SECONDS
+volunteer_pages = PayloadCache(max_entries=2000)
+reference_data.track('volunteers')
+
+def list_param(value: Optional[str]) -> List[str]:
+    """Parâmetro separado por vírgulas, sem repetições e em ordem (chave de cache estável)"""
+    return sorted({item.strip() for item in (value or '').split(',') if item.strip()})
+
+@api_router.get("/volunteers")
+async def get_volunteers(
+    request: Request,
+    area: Optional[str] = None,
+    languages: Optional[str] = None,
+    help_categories: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius: float = 10.0,  # km
+    city: Optional[str] = None,
+    view: str = 'list',
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """
+    Voluntários do mais novo para o mais antigo. Filtros: área profissional,
+    idiomas e categorias de ajuda (qualquer um da lista, separados por vírgula)
+    e distância (lat, lng, radius) para quem mostra a localização. No filtro
+    por distância uma página pode vir com menos de `limit` itens; a lista só
+    acaba quando não há X-Next-Cursor.
+    """
+    if view not in ('list', 'full'):
+        raise HTTPException(status_code=400, detail="Invalid view")
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng go together")
+    
+    filters = {
+        'city': request_city(city) if city else None,
+        'area': area or None,
+        'languages': list_param(languages),
+        'help_categories': list_param(help_categories),
+        # ~100 m: pontos vizinhos dividem a mesma entrada do cache
+        'near': (round(lat, 3), round(lng, 3), max(0.5, min(radius, VOLUNTEERS_MAX_RADIUS_KM))) if lat is not None else None,
+        'view': view,
+        'limit': max(1, min(limit, VOLUNTEERS_PAGE_LIMIT)),
+        'cursor': cursor
+    }
+    version = await reference_data.version('volunteers')
+    key = f'volunteers:{version}:' + json.dumps(filters, sort_keys=True, separators=(',', ':'))
+    payload = await volunteer_pages.get(key, lambda: build_volunteers_page(filters), ttl=VOLUNTEERS_CACHE_SECONDS)
+    return payload.response(request)
+
+async def build_volunteers_page(filters: dict) -> PrecompressedPayload:
+    query = {'role': 'volunteer', **ACTIVE_USER}
+    if filters['city']:
+        query['city'] = filters['city']
+    if filters['area']:
+        query['professional_area'] = filters['area']
+    if filters['languages']:
+        query['languages'] = {'$in': filters['languages']}
+    if filters['help_categories']:
+        # Máscara indexada em (city, role, help_mask), como em get_posts e posts/nearby
+        query['help_mask'] = {'$bitsAnySet': category_mask(filters['help_categories'])}
+    if filters['near']:
+        lat, lng, radius = filters['near']
+        # Retângulo no banco, círculo exato aqui
+        dlat = radius / 111.0
+        dlng = radius / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        query['show_location'] = True
+        query['location.lat'] = {'$gte': lat - dlat, '$lte': lat + dlat}
+        query['location.lng'] = {'$gte': lng - dlng, '$lte': lng + dlng}
+    
+    limit = filters['limit']
+    projection = VOLUNTEER_LIST_PROJECTION if filters['view'] == 'list' else PUBLIC_USER_PROJECTION
+    volunteers = await read_db(EVENTUAL).users.find(
+        combine_filters(query, keyset_filter(filters['cursor'])), projection
+    ).sort([('created_at', -1), ('id', -1)]).to_list(limit + 1)
+    
+    next_cursor = next_page_cursor(volunteers, limit)
+    page = []
+    for volunteer in volunteers[:limit]:
+        if not volunteer.get('show_location'):
+            volunteer.pop('location', None)
+        if filters['near']:
+            location = volunteer.get('location') or {}
+            distance = distance_km(lat, lng, location['lat'], location['lng'])
+            if distance > radius:
+                continue
+            volunteer['distance'] = round(distance, 2)
+        page.append(volunteer)
+    
+    return PrecompressedPayload(
+        page,
+        headers={'X-Next-Cursor': next_cursor} if next_cursor else None,
+        gzip_level=GZIP_LEVEL,
+        brotli_quality=BROTLI_QUALITY
+    )
 
 @api_router.get("/helpers-nearby")
 async def get_helpers_nearby(
@@ -857,6 +1966,7 @@ async def get_helpers_nearby(
     lng: float, 
     category: Optional[str] = None,
     radius: float = 10.0,  # km
+    city: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -879,15 +1989,17 @@ async def get_helpers_nearby(
     
     # Buscar helpers e voluntários com localização visível
     query = {
+        'city': request_city(city, current_user, lat, lng),
         'role': {'$in': ['helper', 'volunteer']},
         'show_location': True,
-        'location': {'$ne': None}
+        'location': {'$ne': None},
+        **ACTIVE_USER
     }
     
     if category:
         query['help_categories'] = category
     
-    users = await db.users.find(query, {'_id': 0, 'password': 0, 'email': 0}).to_list(1000)
+    users = await db.users.find(query, PUBLIC_USER_PROJECTION).to_list(1000)
     
     nearby_users = []
     for user in users:
@@ -899,14 +2011,12 @@ async def get_helpers_nearby(
             )
             if distance <= radius:
                 user['distance'] = round(distance, 2)
-                if isinstance(user.get('created_at'), str):
-                    user['created_at'] = datetime.fromisoformat(user['created_at'])
                 nearby_users.append(user)
     
     # Ordenar por distância
     nearby_users.sort(key=lambda x: x['distance'])
     
-    return nearby_users
+    return fast_json(nearby_users)
 
 @api_router.put("/profile/location")
 async def update_location(location_data: dict, current_user: User = Depends(get_current_user)):
@@ -915,10 +2025,720 @@ async def update_location(location_data: dict, current_user: User = Depends(get_
         'location': location_data.get('location'),
         'show_location': location_data.get('show_location', False)
     }
+    # Mudou para outra cidade atendida: passa a ver o feed e o mapa de lá
+    city = city_for_location(update['location'])
+    if city:
+        update['city'] = city
     
     await db.users.update_one({'id': current_user.id}, {'$set': update})
+    if current_user.role in MATCH_ROLES:
+        helper_profile_changed(current_user.id)
     return {'message': 'Location updated successfully'}
 
+# ==================== USER DELETION JOBS ====================
+# admin_delete_user só marca o usuário (soft delete) e cria um job em
+# deletion_jobs. O job remove os dados dependentes em lotes limitados,
+# registrando o progresso por etapa; cada etapa é idempotente, então um job
+# interrompido (crash, deploy) é retomado do início da etapa corrente.
+
+DELETION_BATCH_SIZE = 500
+DELETION_BATCH_PAUSE = 0.05  # segundos entre lotes, para não disputar com as requisições
+DELETION_LEASE = timedelta(minutes=2)
+DELETION_BULK_LIMIT = 200
+DELETION_STEPS = ['posts', 'comments', 'messages', 'matches', 'ai_chats', 'user']
+
+async def start_user_deletion(user_id: str, requested_by: str) -> Optional[dict]:
+    """Aplica o soft delete e cria (ou reaproveita) o job de exclusão do usuário"""
+    now = datetime.now(timezone.utc)
+    user = await db.users.find_one_and_update(
+        {'id': user_id},
+        {'$set': {'deleted_at': now.isoformat()}},
+        projection={'_id': 0, 'id': 1}
+    )
+    if not user:
+        return None
+    helper_profile_changed(user_id)
+    
+    job = await db.deletion_jobs.find_one({'user_id': user_id, 'status': {'$ne': 'done'}}, {'_id': 0})
+    if not job:
+        job = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'requested_by': requested_by,
+            'status': 'pending',
+            'current_step': DELETION_STEPS[0],
+            'progress': {step: 0 for step in DELETION_STEPS},
+            'locked_until': None,
+            'error': None,
+            'created_at': now.isoformat(),
+            'updated_at': now.isoformat()
+        }
+        await db.deletion_jobs.insert_one({**job})
+    
+    run_in_background(run_deletion_job(job['id']))
+    return job
+
+async def claim_deletion_job(job_id: str) -> Optional[dict]:
+    """Pega (ou renova) o lease do job; evita que dois workers processem o mesmo job"""
+    now = datetime.now(timezone.utc)
+    return await db.deletion_jobs.find_one_and_update(
+        {
+            'id': job_id,
+            'status': {'$in': ['pending', 'running']},
+            '$or': [{'locked_until': None}, {'locked_until': {'$lt': now.isoformat()}}]
+        },
+        {'$set': {
+            'status': 'running',
+            'locked_until': (now + DELETION_LEASE).isoformat(),
+            'updated_at': now.isoformat()
+        }},
+        projection={'_id': 0, 'user_id': 1, 'current_step': 1}
+    )
+
+async def record_deletion_progress(job_id: str, step: str, deleted: int):
+    now = datetime.now(timezone.utc)
+    await db.deletion_jobs.update_one({'id': job_id}, {
+        '$inc': {f'progress.{step}': deleted},
+        '$set': {
+            'current_step': step,
+            'locked_until': (now + DELETION_LEASE).isoformat(),
+            'updated_at': now.isoformat()
+        }
+    })
+
+async def purge_user_posts(user_id: str) -> int:
+    """Um lote: posts do usuário e os comentários feitos neles"""
+    posts = await db.posts.find({'user_id': user_id}, {'_id': 0, 'id': 1}).to_list(DELETION_BATCH_SIZE)
+    if not posts:
+        return 0
+    post_ids = [post['id'] for post in posts]
+    await db.comments.delete_many({'post_id': {'$in': post_ids}})
+    result = await db.posts.delete_many({'id': {'$in': post_ids}})
+    return result.deleted_count
+
+async def purge_user_comments(user_id: str) -> int:
+    """Um lote: comentários do usuário em posts de outros, corrigindo comment_count"""
+    comments = await db.comments.find(
+        {'user_id': user_id}, {'_id': 0, 'id': 1, 'post_id': 1}
+    ).to_list(DELETION_BATCH_SIZE)
+    if not comments:
+        return 0
+    result = await db.comments.delete_many({'id': {'$in': [comment['id'] for comment in comments]}})
+    per_post = {}
+    for comment in comments:
+        per_post[comment['post_id']] = per_post.get(comment['post_id'], 0) + 1
+    await db.posts.bulk_write(
+        [UpdateOne({'id': post_id, 'comment_count': {'$exists': True}}, {'$inc': {'comment_count': -count}})
+         for post_id, count in per_post.items()],
+        ordered=False
+    )
+    return result.deleted_count
+
+def batched_purge(collection_name: str, query):
+    """Cria a função de lote para coleções que só precisam de delete por _id"""
+    async def purge(user_id: str) -> int:
+        collection = db[collection_name]
+        docs = await collection.find(query(user_id), {'_id': 1}).to_list(DELETION_BATCH_SIZE)
+        if not docs:
+            return 0
+        result = await collection.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+        return result.deleted_count
+    return purge
+
+async def purge_user_document(user_id: str) -> int:
+    result = await db.users.delete_one({'id': user_id, 'deleted_at': {'$exists': True}})
+    return result.deleted_count
+
+DELETION_PURGERS = {
+    'posts': purge_user_posts,
+    'comments': purge_user_comments,
+    'messages': batched_purge('messages', lambda uid: {'$or': [{'from_user_id': uid}, {'to_user_id': uid}]}),
+    'matches': batched_purge('matches', lambda uid: {'$or': [{'helper_id': uid}, {'migrant_id': uid}]}),
+    'ai_chats': batched_purge('ai_chats', lambda uid: {'user_id': uid}),
+}
+
+async def run_deletion_job(job_id: str, delay: float = 0):
+    if delay:
+        await asyncio.sleep(delay)
+    job = await claim_deletion_job(job_id)
+    if not job:
+        return  # concluído ou em andamento em outro worker
+    
+    user_id = job['user_id']
+    try:
+        start = DELETION_STEPS.index(job.get('current_step') or DELETION_STEPS[0])
+        for step in DELETION_STEPS[start:]:
+            if step == 'user':
+                await record_deletion_progress(job_id, step, await purge_user_document(user_id))
+                continue
+            while True:
+                deleted = await DELETION_PURGERS[step](user_id)
+                await record_deletion_progress(job_id, step, deleted)
+                if deleted < DELETION_BATCH_SIZE:
+                    break
+                await asyncio.sleep(DELETION_BATCH_PAUSE)
+        
+        await db.deletion_jobs.update_one({'id': job_id}, {'$set': {
+            'status': 'done',
+            'locked_until': None,
+            'error': None,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }})
+        logger.info(f"User {user_id} deleted by job {job_id}")
+    except Exception as e:
+        # Libera o lease; o job volta a ser retomado no próximo startup ou pedido
+        logger.error(f"Deletion job {job_id} failed: {e}")
+        await db.deletion_jobs.update_one({'id': job_id}, {'$set': {
+            'status': 'pending',
+            'locked_until': None,
+            'error': str(e)[:500],
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }})
+
+async def resume_deletion_jobs():
+    """Retoma jobs de exclusão interrompidos (chamado no startup)"""
+    jobs = await db.deletion_jobs.find(
+        {'status': {'$in': ['pending', 'running']}}, {'_id': 0, 'id': 1}
+    ).to_list(1000)
+    for job in jobs:
+        run_in_background(run_deletion_job(job['id']))
+        # Se o lease de um worker que caiu ainda vale, tenta de novo quando expirar
+        run_in_background(run_deletion_job(job['id'], delay=DELETION_LEASE.total_seconds()))
+
+# ==================== AUTHOR SNAPSHOT AUDIT JOBS ====================
+# A auditoria percorre a coleção users inteira, então roda fora da requisição:
+# o endpoint cria um job em snapshot_audit_jobs e o admin consulta o status.
+# O job grava o relatório parcial e o último user id a cada lote; um job
+# interrompido é retomado a partir desse ponto, com o mesmo lease dos jobs de
+# exclusão.
+
+AUDIT_BATCH_SIZE = 500
+
+async def start_snapshot_audit(repair: bool, requested_by: str) -> dict:
+    """Cria (ou reaproveita o que está em andamento) o job de auditoria"""
+    job = await db.snapshot_audit_jobs.find_one(
+        {'repair': repair, 'status': {'$in': ['pending', 'running']}}, {'_id': 0}
+    )
+    if not job:
+        now = datetime.now(timezone.utc).isoformat()
+        job = {
+            'id': str(uuid.uuid4()),
+            'repair': repair,
+            'requested_by': requested_by,
+            'status': 'pending',
+            'last_user_id': '',
+            'report': empty_audit_report(repair),
+            'locked_until': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        await db.snapshot_audit_jobs.insert_one({**job})
+    
+    run_in_background(run_snapshot_audit_job(job['id']))
+    return job
+
+async def claim_snapshot_audit_job(job_id: str) -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.snapshot_audit_jobs.find_one_and_update(
+        {
+            'id': job_id,
+            'status': {'$in': ['pending', 'running']},
+            '$or': [{'locked_until': None}, {'locked_until': {'$lt': now.isoformat()}}]
+        },
+        {'$set': {
+            'status': 'running',
+            'locked_until': (now + DELETION_LEASE).isoformat(),
+            'updated_at': now.isoformat()
+        }},
+        projection={'_id': 0, 'repair': 1, 'report': 1, 'last_user_id': 1}
+    )
+
+async def run_snapshot_audit_job(job_id: str, delay: float = 0):
+    if delay:
+        await asyncio.sleep(delay)
+    job = await claim_snapshot_audit_job(job_id)
+    if not job:
+        return  # concluído ou em andamento em outro worker
+    
+    async def checkpoint(report: dict, last_id: str):
+        now = datetime.now(timezone.utc)
+        await db.snapshot_audit_jobs.update_one({'id': job_id}, {'$set': {
+            'report': report,
+            'last_user_id': last_id,
+            'locked_until': (now + DELETION_LEASE).isoformat(),
+            'updated_at': now.isoformat()
+        }})
+    
+    try:
+        report = await audit_author_snapshots(
+            repair=job['repair'],
+            batch_size=AUDIT_BATCH_SIZE,
+            report=job.get('report'),
+            last_id=job.get('last_user_id') or '',
+            checkpoint=checkpoint
+        )
+        await db.snapshot_audit_jobs.update_one({'id': job_id}, {'$set': {
+            'status': 'done',
+            'report': report,
+            'locked_until': None,
+            'error': None,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }})
+        logger.info(f"Author snapshot audit {job_id} done: {report}")
+    except Exception as e:
+        logger.error(f"Author snapshot audit {job_id} failed: {e}")
+        await db.snapshot_audit_jobs.update_one({'id': job_id}, {'$set': {
+            'status': 'pending',
+            'locked_until': None,
+            'error': str(e)[:500],
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }})
+
+async def resume_snapshot_audit_jobs():
+    """Retoma auditorias interrompidas (chamado no startup)"""
+    jobs = await db.snapshot_audit_jobs.find(
+        {'status': {'$in': ['pending', 'running']}}, {'_id': 0, 'id': 1}
+    ).to_list(100)
+    for job in jobs:
+        run_in_background(run_snapshot_audit_job(job['id']))
+        run_in_background(run_snapshot_audit_job(job['id'], delay=DELETION_LEASE.total_seconds()))
+
+# ==================== ANALYTICS ROLLUPS ====================
+# Contagens por hora e por dia, por dimensão (role, tipo, categoria...), ficam
+# em stats_rollups. O job lê só os documentos criados depois do watermark de
+# cada métrica e recalcula por inteiro as horas e dias tocados (com $set), então
+# rodar de novo ou em dois workers ao mesmo tempo não duplica contagens.
+
+ROLLUP_METRICS = {
+    'signups': {'collection': 'users', 'dims': ['role']},
+    'posts': {'collection': 'posts', 'dims': ['type', 'category']},
+    'messages': {'collection': 'messages', 'dims': [], 'match': {'is_auto_response': {'$ne': True}}},
+    'ai_chats': {'collection': 'ai_chats', 'dims': ['language']},
+}
+# Tamanho do prefixo de created_at (ISO, UTC) que identifica o bucket
+ROLLUP_GRANULARITIES = {'hour': 13, 'day': 10}
+ROLLUP_STEPS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+ROLLUP_DEFAULT_RANGE = {'hour': timedelta(hours=48), 'day': timedelta(days=30)}
+# Margem para documentos cujo created_at foi gerado antes do insert terminar
+ROLLUP_LAG = timedelta(minutes=2)
+ROLLUP_INTERVAL = 300  # segundos entre execuções do job
+TIMESERIES_MAX_POINTS = 1000
+
+async def recompute_hour_rollups(metric: str, from_hour: str, until: str):
+    spec = ROLLUP_METRICS[metric]
+    group_id = {'bucket': {'$substrBytes': ['$created_at', 0, ROLLUP_GRANULARITIES['hour']]}}
+    group_id.update({dim: f'${dim}' for dim in spec['dims']})
+    rows = await db[spec['collection']].aggregate([
+        {'$match': {'created_at': {'$gte': from_hour, '$lte': until}, **spec.get('match', {})}},
+        {'$group': {'_id': group_id, 'count': {'$sum': 1}}}
+    ]).to_list(None)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    ops = [
+        UpdateOne(
+            {'metric': metric, 'granularity': 'hour', 'bucket': row['_id']['bucket'],
+             'dims': {dim: row['_id'].get(dim) for dim in spec['dims']}},
+            {'$set': {'count': row['count'], 'updated_at': now}},
+            upsert=True
+        )
+        for row in rows
+    ]
+    if ops:
+        await db.stats_rollups.bulk_write(ops, ordered=False)
+
+async def recompute_day_rollups(metric: str, from_day: str):
+    """Soma os buckets de hora dos dias tocados (não relê a coleção de origem)"""
+    rows = await db.stats_rollups.aggregate([
+        {'$match': {'metric': metric, 'granularity': 'hour', 'bucket': {'$gte': from_day}}},
+        {'$group': {
+            '_id': {'bucket': {'$substrBytes': ['$bucket', 0, ROLLUP_GRANULARITIES['day']]}, 'dims': '$dims'},
+            'count': {'$sum': '$count'}
+        }}
+    ]).to_list(None)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    ops = [
+        UpdateOne(
+            {'metric': metric, 'granularity': 'day', 'bucket': row['_id']['bucket'], 'dims': row['_id']['dims']},
+            {'$set': {'count': row['count'], 'updated_at': now}},
+            upsert=True
+        )
+        for row in rows
+    ]
+    if ops:
+        await db.stats_rollups.bulk_write(ops, ordered=False)
+
+async def rollup_metric(metric: str) -> str:
+    """Atualiza os buckets da métrica tocados desde o watermark e avança o watermark"""
+    spec = ROLLUP_METRICS[metric]
+    state = await db.rollup_state.find_one({'metric': metric}, {'_id': 0, 'watermark': 1})
+    watermark = (state or {}).get('watermark')
+    until = (datetime.now(timezone.utc) - ROLLUP_LAG).isoformat()
+    
+    created_at = {'$lte': until}
+    if watermark:
+        created_at['$gt'] = watermark
+    first = await db[spec['collection']].find(
+        {'created_at': created_at, **spec.get('match', {})}, {'_id': 0, 'created_at': 1}
+    ).sort('created_at', 1).limit(1).to_list(1)
+    
+    if first:
+        # A hora do documento novo mais antigo é recalculada inteira, incluindo
+        # o que já tinha sido contado antes do watermark
+        from_hour = first[0]['created_at'][:ROLLUP_GRANULARITIES['hour']]
+        await recompute_hour_rollups(metric, from_hour, until)
+        await recompute_day_rollups(metric, from_hour[:ROLLUP_GRANULARITIES['day']])
+    
+    await db.rollup_state.update_one(
+        {'metric': metric},
+        {'$set': {'watermark': until, 'updated_at': datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    return until
+
+async def refresh_rollups() -> dict:
+    watermarks = {}
+    for metric in ROLLUP_METRICS:
+        try:
+            watermarks[metric] = await rollup_metric(metric)
+        except Exception as e:
+            logger.error(f"Rollup {metric} error: {e}")
+    return watermarks
+
+def parse_utc_datetime(value: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+@api_router.get("/admin/timeseries")
+async def admin_timeseries(
+    metric: str,
+    granularity: str = 'day',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    group_by: Optional[str] = None,
+    role: Optional[str] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    language: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Série temporal de uma métrica (signups, posts, messages, ai_chats) a partir
+    dos rollups. Buckets sem eventos vêm com zero; group_by separa a contagem
+    por uma dimensão da métrica.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    if metric not in ROLLUP_METRICS:
+        raise HTTPException(status_code=400, detail="Unknown metric")
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Invalid granularity")
+    
+    dims = ROLLUP_METRICS[metric]['dims']
+    filters = {dim: value for dim, value in
+               {'role': role, 'type': type, 'category': category, 'language': language}.items() if value}
+    if (group_by and group_by not in dims) or any(dim not in dims for dim in filters):
+        raise HTTPException(status_code=400, detail="Invalid dimension for metric")
+    
+    end_dt = parse_utc_datetime(end) if end else datetime.now(timezone.utc)
+    start_dt = parse_utc_datetime(start) if start else end_dt - ROLLUP_DEFAULT_RANGE[granularity]
+    
+    # Enumera os buckets do intervalo (para preencher zeros)
+    key_length = ROLLUP_GRANULARITIES[granularity]
+    if granularity == 'day':
+        current = start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        current = start_dt.replace(minute=0, second=0, microsecond=0)
+    buckets = []
+    while current <= end_dt:
+        buckets.append(current.isoformat()[:key_length])
+        if len(buckets) > TIMESERIES_MAX_POINTS:
+            raise HTTPException(status_code=400, detail="Range too large")
+        current += ROLLUP_STEPS[granularity]
+    if not buckets:
+        raise HTTPException(status_code=400, detail="Invalid range")
+    
+    query = {'metric': metric, 'granularity': granularity, 'bucket': {'$gte': buckets[0], '$lte': buckets[-1]}}
+    query.update({f'dims.{dim}': value for dim, value in filters.items()})
+    rows = await db.stats_rollups.find(query, {'_id': 0, 'bucket': 1, 'dims': 1, 'count': 1}).to_list(None)
+    
+    points = {bucket: {'bucket': bucket, 'total': 0} for bucket in buckets}
+    if group_by:
+        for point in points.values():
+            point['groups'] = {}
+    for row in rows:
+        point = points.get(row['bucket'])
+        if point is None:
+            continue
+        point['total'] += row['count']
+        if group_by:
+            group = str((row.get('dims') or {}).get(group_by) or 'unknown')
+            point['groups'][group] = point['groups'].get(group, 0) + row['count']
+    
+    state = await db.rollup_state.find_one({'metric': metric}, {'_id': 0, 'watermark': 1})
+    
+    return {
+        'metric': metric,
+        'granularity': granularity,
+        'group_by': group_by,
+        'filters': filters,
+        'updated_until': (state or {}).get('watermark'),
+        'points': list(points.values())
+    }
+
+@api_router.post("/admin/timeseries/refresh")
+async def admin_refresh_timeseries(current_user: User = Depends(get_current_user)):
+    """Roda o job de rollups agora, sem esperar o próximo ciclo"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {'watermarks': await refresh_rollups()}
+
+# ==================== SLOW QUERY LOG ====================
+# Ocorrências gravadas pelo SlowQueryMonitor (slow_queries.py) na coleção capped
+# slow_queries: uma por comando acima de SLOW_QUERY_MS, algumas com explain.
+
+@api_router.get("/admin/slow-queries")
+async def admin_slow_queries(
+    collection: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """Queries lentas agrupadas por formato, das que mais somaram tempo para as que menos"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    match = {}
+    if collection:
+        match['collection'] = collection
+    if since:
+        match['created_at'] = {'$gte': parse_utc_datetime(since).isoformat()}
+    
+    groups = await db.slow_queries.aggregate([
+        {'$match': match},
+        {'$sort': {'created_at': -1}},
+        {'$group': {
+            '_id': '$shape_hash',
+            'collection': {'$first': '$collection'},
+            'command': {'$first': '$command'},
+            'shape': {'$first': '$shape'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'last_seen': {'$first': '$created_at'}
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': max(1, min(limit, 200))}
+    ]).to_list(None)
+    
+    for group in groups:
+        group['shape_hash'] = group.pop('_id')
+        # Explain mais recente do formato (nem toda ocorrência tem)
+        latest = await db.slow_queries.find_one(
+            {'shape_hash': group['shape_hash'], 'explain': {'$exists': True}},
+            {'_id': 0, 'explain': 1, 'created_at': 1},
+            sort=[('created_at', -1)]
+        )
+        group['explain'] = latest['explain'] if latest else None
+        group['avg_ms'] = round(group['avg_ms'], 2)
+    
+    return {'threshold_ms': slow_query_monitor.threshold_ms, 'dropped': slow_query_monitor.dropped, 'shapes': groups}
+
+@api_router.get("/admin/slow-queries/{shape_hash}")
+async def admin_slow_query_samples(shape_hash: str, limit: int = 50, current_user: User = Depends(get_current_user)):
+    """Ocorrências mais recentes de um formato de query"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await db.slow_queries.find(
+        {'shape_hash': shape_hash}, {'_id': 0}
+    ).sort('created_at', -1).to_list(max(1, min(limit, 200)))
+
+# ==================== REQUEST PROFILING ====================
+# Profiles gravados pelo ProfilingMiddleware (registrado junto com os outros
+# middlewares, logo depois da criação do app)
+
+@api_router.get("/admin/profiles")
+async def admin_list_profiles(limit: int = 50, current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await db.request_profiles.find(
+        {}, {'_id': 0, 'session': 0, 'expires_at': 0}
+    ).sort('created_at', -1).to_list(max(1, min(limit, 200)))
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def admin_download_profile(profile_id: str, format: str = 'html', current_user: User = Depends(get_current_user)):
+    """Baixa o profile como HTML (árvore de chamadas), speedscope (flame graph) ou texto"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin only")
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    
+    profile = await db.request_profiles.find_one({'id': profile_id}, {'_id': 0, 'session': 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    extension = 'json' if format == 'speedscope' else format
+    return Response(
+        content=render_profile(profile['session'], format),
+        media_type=PROFILE_FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.{extension}"'}
+    )
+
+# ==================== MEDIA ENDPOINTS ====================
+
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Mídia de conversas: só o navegador de quem pode ver guarda a cópia
+PRIVATE_MEDIA_CACHE_CONTROL = 'private, max-age=86400'
+
+def media_refs(media_id: str) -> List[str]:
+    """Formas em que a mídia pode estar referenciada em posts e mensagens"""
+    return [media_url(media_id)] + [media_url(media_id, variant) for variant in IMAGE_VARIANTS]
+
+async def media_is_public(media_id: str) -> bool:
+    """Mídia de posts e anúncios é pública; o resto (mensagens, uploads ainda sem uso) não"""
+    refs = media_refs(media_id)
+    if await db.posts.find_one({'images': {'$in': refs}}, {'_id': 1}):
+        return True
+    ads = await reference_data.get('advertisements')
+    return any(media_id_from_url(ad.get('image_url') or '') == media_id for ad in ads)
+
+async def media_viewer(request: Request, token: Optional[str]) -> Optional[User]:
+    """
+    Usuário do header Authorization ou do parâmetro token (tags <img> e
+    <video> não mandam headers); None sem credenciais válidas
+    """
+    scheme, _, credentials = request.headers.get('authorization', '').partition(' ')
+    raw = credentials if scheme.lower() == 'bearer' and credentials else token
+    if not raw:
+        return None
+    try:
+        return await get_current_user(HTTPAuthorizationCredentials(scheme='Bearer', credentials=raw))
+    except HTTPException:
+        return None
+
+async def can_view_private_media(media_id: str, user: User) -> bool:
+    """Quem enviou o arquivo ou participa de uma conversa em que ele foi enviado"""
+    if await media_store.owner_id(media_id) == user.id:
+        return True
+    return await db.messages.find_one(
+        {'media': {'$in': media_refs(media_id)}, '$or': [{'from_user_id': user.id}, {'to_user_id': user.id}]},
+        {'_id': 1}
+    ) is not None
+
+@api_router.post("/media")
+async def upload_media(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Recebe uma foto ou vídeo e retorna a referência para usar em posts e mensagens"""
+    data = await file.read(MAX_MEDIA_BYTES + 1)
+    try:
+        return await media_store.put(data, file.content_type, current_user.id)
+    except MediaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/media/{media_id}")
+async def get_media(media_id: str, request: Request, variant: Optional[str] = None, token: Optional[str] = None):
+    """
+    Serve um arquivo do media store com suporte a Range e cache de longa duração.
+    Fotos são servidas na versão normalizada (sem EXIF) ou na variante pedida
+    (thumb, small, medium); enquanto o pipeline não termina, o original é
+    servido sem cache. O ETag é o nome do arquivo servido, que nunca muda de conteúdo.
+    Mídia de posts e anúncios é pública (cache compartilhado); a de mensagens só
+    é servida a quem a enviou ou participa da conversa, com cache privado.
+    """
+    if not MEDIA_ID_PATTERN.match(media_id):
+        raise HTTPException(status_code=404, detail="Media not found")
+    if variant is not None and variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail="Invalid variant")
+    
+    public = await media_is_public(media_id)
+    if not public:
+        viewer = await media_viewer(request, token)
+        if viewer is None:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        # 404 e não 403: quem não participa não descobre que o arquivo existe
+        if not await can_view_private_media(media_id, viewer):
+            raise HTTPException(status_code=404, detail="Media not found")
+    
+    resolved = await media_store.resolve(media_id, variant)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    name, final = resolved
+    
+    cache_control = MEDIA_CACHE_CONTROL if public else PRIVATE_MEDIA_CACHE_CONTROL
+    headers = {
+        'ETag': f'"{name}"',
+        'Cache-Control': cache_control if final else 'no-cache',
+        'Accept-Ranges': 'bytes'
+    }
+    if request.headers.get('if-none-match') == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+    
+    grid_out = await media_store.open(name)
+    if grid_out is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    
+    size = grid_out.length
+    try:
+        byte_range = parse_range(request.headers.get('range'), size)
+    except MediaError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+    
+    grid_out.seek(start)
+    return StreamingResponse(
+        iter_grid_out(grid_out, end - start + 1),
+        status_code=status_code,
+        media_type=(grid_out.metadata or {}).get('content_type', 'application/octet-stream'),
+        headers=headers
+    )
+
+async def migrate_inline_media(batch_size: int = 50):
+    """Move imagens base64 antigas de posts e mensagens para o media store"""
+    for collection, field in ((db.posts, 'images'), (db.messages, 'media')):
+        try:
+            migrated = await migrate_inline_media_field(collection, field, batch_size)
+        except Exception as e:
+            logger.error(f"Inline media migration error on {collection.name}: {e}")
+            continue
+        if migrated:
+            logger.info(f"Migrated inline media of {migrated} documents in {collection.name}")
+
+async def migrate_inline_media_field(collection, field: str, batch_size: int) -> int:
+    migrated = 0
+    while True:
+        docs = await collection.find(
+            {field: {'$regex': '^data:'}}, {'_id': 0, 'id': 1, 'user_id': 1, 'from_user_id': 1, field: 1}
+        ).to_list(batch_size)
+        if not docs:
+            break
+        for doc in docs:
+            owner_id = doc.get('user_id') or doc.get('from_user_id')
+            refs = []
+            for value in doc.get(field) or []:
+                try:
+                    refs.extend(await media_store.ingest([value], owner_id))
+                except MediaError as e:
+                    # Conteúdo inválido é descartado para a migração sempre avançar
+                    logger.error(f"Dropping invalid inline media on {doc['id']}: {e}")
+            await collection.update_one({'id': doc['id']}, {'$set': {field: refs}})
+            migrated += 1
+    return migrated
+
 # ==================== HELP LOCATIONS ENDPOINTS ====================
 
 def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
@@ -948,6 +2768,29 @@ class HelpLocationResponse(BaseModel):
     icon: Optional[str] = None
     color: Optional[str] = None
 
+# Respostas cacheáveis (locais de ajuda, categorias, sidebar), guardadas já
+# serializadas e comprimidas
+static_payloads = PayloadCache()
+SIDEBAR_CACHE_SECONDS = 60
+HELP_LOCATIONS_MAX_AGE = 3600
+# Locais de ajuda de cada cidade ficam em memória por este tempo (a coleção
+# pode ser atualizada por outro worker, pelo seed ou pela importação)
+HELP_LOCATIONS_CACHE_SECONDS = 300
+help_locations_cache = CityCache(ttl=HELP_LOCATIONS_CACHE_SECONDS)
+
+async def load_city_help_locations(city: str) -> List[dict]:
+    """Locais da cidade na coleção help_locations; sem seed, os embutidos em help_locations.py"""
+    locations = await read_db(EVENTUAL).help_locations.find(
+        {'city': city}, {'_id': 0, 'city': 0, 'content_hash': 0, 'created_at': 0}
+    ).to_list(None)
+    return locations or list(get_all_help_locations(city))
+
+async def city_help_locations(city: str, category: Optional[str] = None) -> List[dict]:
+    locations = await help_locations_cache.get(city, load_city_help_locations)
+    if category and category != 'all':
+        return [loc for loc in locations if loc['category'] == category]
+    return locations
+
 CATEGORY_ICONS = {
     'food': {'icon': '🍽️', 'color': 'bg-green-500'},
     'health': {'icon': '🏥', 'color': 'bg-red-500'},
@@ -961,19 +2804,30 @@ CATEGORY_ICONS = {
 
 @api_router.get("/help-locations")
 async def get_help_locations(
+    request: Request,
     category: Optional[str] = None,
     lat: Optional[float] = None,
-    lng: Optional[float] = None
+    lng: Optional[float] = None,
+    city: Optional[str] = None
 ):
     """
-    Retorna todos os locais de ajuda.
+    Retorna os locais de ajuda da cidade (a pedida, a das coordenadas ou a padrão).
     Pode filtrar por categoria e ordenar por distância se coordenadas forem fornecidas.
     """
-    # Buscar locais do arquivo de dados
-    if category and category != 'all':
-        locations = get_help_locations_by_category(category)
-    else:
-        locations = get_all_help_locations()
+    city = request_city(city, lat=lat, lng=lng)
+    # Sem coordenadas a resposta só depende da cidade e da categoria: sai do cache pré-comprimido
+    if lat is None or lng is None:
+        payload = await static_payloads.get(
+            f"help-locations:{city}:{category or 'all'}",
+            lambda: build_help_locations(city, category, None, None),
+            ttl=HELP_LOCATIONS_CACHE_SECONDS,
+            max_age=HELP_LOCATIONS_MAX_AGE
+        )
+        return payload.response(request)
+    return await build_help_locations(city, category, lat, lng)
+
+async def build_help_locations(city: str, category: Optional[str], lat: Optional[float], lng: Optional[float]) -> dict:
+    locations = await city_help_locations(city, category)
     
     # Adicionar ícones e cores
     result = []
@@ -993,22 +2847,20 @@ async def get_help_locations(
     if lat is not None and lng is not None:
         result.sort(key=lambda x: x.get('distance', float('inf')))
     
-    return {'locations': result, 'total': len(result)}
+    return {'locations': result, 'total': len(result), 'city': city}
 
 @api_router.get("/help-locations/nearest")
 async def get_nearest_help_location(
     lat: float,
     lng: float,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    city: Optional[str] = None
 ):
     """
     Retorna o local de ajuda mais próximo das coordenadas fornecidas.
     Pode filtrar por categoria.
     """
-    if category and category != 'all':
-        locations = get_help_locations_by_category(category)
-    else:
-        locations = get_all_help_locations()
+    locations = await city_help_locations(request_city(city, lat=lat, lng=lng), category)
     
     if not locations:
         raise HTTPException(status_code=404, detail="Nenhum local encontrado")
@@ -1031,9 +2883,17 @@ async def get_nearest_help_location(
     return {'nearest': nearest}
 
 @api_router.get("/help-locations/categories")
-async def get_help_location_categories():
-    """Retorna todas as categorias disponíveis com contagem de locais"""
-    locations = get_all_help_locations()
+async def get_help_location_categories(request: Request, city: Optional[str] = None):
+    """Retorna as categorias da cidade com contagem de locais"""
+    city = request_city(city)
+    payload = await static_payloads.get(
+        f'help-locations:{city}:categories', lambda: build_help_location_categories(city),
+        ttl=HELP_LOCATIONS_CACHE_SECONDS, max_age=HELP_LOCATIONS_MAX_AGE
+    )
+    return payload.response(request)
+
+async def build_help_location_categories(city: str) -> dict:
+    locations = await city_help_locations(city)
     
     # Contar locais por categoria
     category_counts = {}
@@ -1071,38 +2931,41 @@ async def get_help_location_categories():
 
 @api_router.post("/help-locations/seed")
 async def seed_help_locations():
-    """Popula o banco de dados com os locais de ajuda (operação única)"""
-    locations = get_all_help_locations()
-    
-    # Verificar se já existem locais no banco
-    existing_count = await db.help_locations.count_documents({})
-    
-    if existing_count > 0:
-        return {'message': f'{existing_count} locais já existem no banco', 'seeded': False}
-    
-    # Inserir todos os locais
-    for loc in locations:
-        loc_with_metadata = {
-            **loc,
-            'created_at': datetime.now(timezone.utc)
-        }
-        await db.help_locations.insert_one(loc_with_metadata)
+    """
+    Sincroniza o banco com os locais de ajuda de help_locations.py em lote,
+    pelo id: locais novos são inseridos, os alterados atualizados e os iguais
+    (mesmo content_hash) pulados, então pode ser rodado a cada deploy.
+    """
+    locations = [
+        {**loc, 'city': city}
+        for city, city_locations in HELP_LOCATIONS_BY_CITY.items()
+        for loc in city_locations
+    ]
+    stats = await import_documents(
+        db.help_locations, locations, key='id',
+        on_insert=lambda doc: {'created_at': datetime.now(timezone.utc)}
+    )
+    help_locations_cache.invalidate()
+    static_payloads.invalidate('help-locations')
     
-    return {'message': f'{len(locations)} locais adicionados com sucesso', 'seeded': True, 'count': len(locations)}
+    return {
+        'message': f'{stats.inserted} locais adicionados, {stats.updated} atualizados, {stats.unchanged} sem mudança',
+        'seeded': bool(stats.inserted or stats.updated),
+        'count': len(locations),
+        **stats.as_dict()
+    }
 
 # ==================== ADVERTISEMENTS ENDPOINTS ====================
 
 @api_router.get("/advertisements")
 async def get_advertisements(type: Optional[str] = None, active_only: bool = True):
     """Retorna anúncios/divulgações para exibir na sidebar"""
-    query = {}
+    ads = await reference_data.get('advertisements')
     if type:
-        query['type'] = type
+        ads = [ad for ad in ads if ad.get('type') == type]
     if active_only:
-        query['is_active'] = True
-    
-    ads = await db.advertisements.find(query, {'_id': 0}).sort('priority', -1).to_list(50)
-    return ads
+        ads = [ad for ad in ads if ad.get('is_active') is True]
+    return ads[:50]
 
 @api_router.post("/admin/advertisements")
 async def create_advertisement(ad_data: AdvertisementCreate, current_user: User = Depends(get_current_user)):
@@ -1114,6 +2977,8 @@ async def create_advertisement(ad_data: AdvertisementCreate, current_user: User
     ad_dict = ad.model_dump()
     
     await db.advertisements.insert_one(ad_dict)
+    await reference_data.bump('advertisements')
+    static_payloads.invalidate('sidebar')
     return {'message': 'Anúncio criado com sucesso', 'id': ad.id}
 
 @api_router.get("/admin/advertisements")
@@ -1139,6 +3004,8 @@ async def update_advertisement(ad_id: str, ad_data: dict, current_user: User = D
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Anúncio não encontrado")
     
+    await reference_data.bump('advertisements')
+    static_payloads.invalidate('sidebar')
     return {'message': 'Anúncio atualizado com sucesso'}
 
 @api_router.delete("/admin/advertisements/{ad_id}")
@@ -1151,50 +3018,43 @@ async def delete_advertisement(ad_id: str, current_user: User = Depends(get_curr
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Anúncio não encontrado")
     
+    await reference_data.bump('advertisements')
+    static_payloads.invalidate('sidebar')
     return {'message': 'Anúncio excluído com sucesso'}
 
 @api_router.post("/advertisements/seed")
 async def seed_advertisements():
-    """Popula com anúncios iniciais de motivação e doação"""
-    
-    # Verificar se já existem anúncios
-    existing = await db.advertisements.count_documents({})
-    if existing > 0:
-        return {'message': f'{existing} anúncios já existem', 'seeded': False}
-    
+    """
+    Sincroniza os anúncios iniciais de motivação e doação pelo título: novos são
+    inseridos, alterados atualizados e iguais pulados. id e created_at só são
+    gravados na inserção, então rodar de novo não troca o id de quem já existe.
+    """
     default_ads = [
         {
-            'id': str(uuid.uuid4()),
             'type': 'motivation',
             'title': '💪 Você é mais forte do que imagina!',
             'content': 'Cada dia é uma nova oportunidade. Não desista dos seus sonhos. A jornada pode ser difícil, mas você não está sozinho.',
             'image_url': 'https://images.unsplash.com/photo-1493612276216-ee3925520721?w=400',
             'is_active': True,
-            'priority': 10,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 10
         },
         {
-            'id': str(uuid.uuid4()),
             'type': 'motivation',
             'title': '🙏 Deus está contigo',
             'content': '"Porque eu, o Senhor teu Deus, te tomo pela tua mão direita; e te digo: Não temas, eu te ajudo." - Isaías 41:13',
             'image_url': 'https://images.unsplash.com/photo-1507692049790-de58290a4334?w=400',
             'is_active': True,
-            'priority': 9,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 9
         },
         {
-            'id': str(uuid.uuid4()),
             'type': 'motivation',
             'title': '✨ Acredite em você',
             'content': 'Sua história não terminou ainda. Os melhores capítulos ainda estão por vir. Continue caminhando com fé e esperança.',
             'image_url': 'https://images.unsplash.com/photo-1499209974431-9dddcece7f88?w=400',
             'is_active': True,
-            'priority': 8,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 8
         },
         {
-            'id': str(uuid.uuid4()),
             'type': 'donation',
             'title': '🌍 Ajude a África - Doe Agora',
             'content': 'Milhares de famílias na África precisam de ajuda urgente. Sua doação pode salvar vidas, fornecer alimentos, água limpa e medicamentos para quem mais precisa.',
@@ -1202,11 +3062,9 @@ async def seed_advertisements():
             'link_url': 'https://www.unicef.org/appeals/africa',
             'link_text': 'Doar Agora',
             'is_active': True,
-            'priority': 15,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 15
         },
         {
-            'id': str(uuid.uuid4()),
             'type': 'donation',
             'title': '❤️ Seja um anjo para alguém',
             'content': 'Com apenas €5 você pode fornecer uma refeição completa para uma criança. Cada contribuição faz a diferença.',
@@ -1214,25 +3072,34 @@ async def seed_advertisements():
             'link_url': 'https://donate.worldvision.org',
             'link_text': 'Contribuir',
             'is_active': True,
-            'priority': 14,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 14
         },
         {
-            'id': str(uuid.uuid4()),
             'type': 'motivation',
             'title': '🌟 Nunca perca a esperança',
             'content': '"Tudo posso naquele que me fortalece." - Filipenses 4:13. Você tem dentro de si a força para superar qualquer obstáculo.',
             'image_url': 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=400',
             'is_active': True,
-            'priority': 7,
-            'created_at': datetime.now(timezone.utc)
+            'priority': 7
         }
     ]
     
-    for ad in default_ads:
-        await db.advertisements.insert_one(ad)
+    # Um único bulk_write; o título é a chave natural dos anúncios iniciais
+    stats = await import_documents(
+        db.advertisements, default_ads, key='title',
+        on_insert=lambda ad: {'id': str(uuid.uuid4()), 'created_at': datetime.now(timezone.utc)}
+    )
+    seeded = bool(stats.inserted or stats.updated)
+    if seeded:
+        await reference_data.bump('advertisements')
+        static_payloads.invalidate('sidebar')
     
-    return {'message': f'{len(default_ads)} anúncios criados com sucesso', 'seeded': True}
+    return {
+        'message': f'{stats.inserted} anúncios adicionados, {stats.updated} atualizados, {stats.unchanged} sem mudança',
+        'seeded': seeded,
+        'count': len(default_ads),
+        **stats.as_dict()
+    }
 
 # ==================== JOB LISTINGS ENDPOINTS (RozgarLine Integration) ====================
 
@@ -1308,11 +3175,16 @@ async def get_external_jobs():
     return {'jobs': jobs, 'cached': False}
 
 @api_router.get("/sidebar-content")
-async def get_sidebar_content():
+async def get_sidebar_content(request: Request):
     """Retorna todo o conteúdo da sidebar: anúncios + vagas de emprego"""
-    
+    payload = await static_payloads.get(
+        'sidebar', build_sidebar_content, ttl=SIDEBAR_CACHE_SECONDS, max_age=SIDEBAR_CACHE_SECONDS
+    )
+    return payload.response(request)
+
+async def build_sidebar_content() -> dict:
     # Buscar anúncios ativos
-    ads = await db.advertisements.find({'is_active': True}, {'_id': 0}).sort('priority', -1).to_list(10)
+    ads = [ad for ad in await reference_data.get('advertisements') if ad.get('is_active') is True][:10]
     
     # Buscar vagas de emprego (do cache ou externo)
     jobs_data = await get_external_jobs()
@@ -1405,12 +3277,358 @@ async def health():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+# Métricas no formato do Prometheus; METRICS_TOKEN (opcional) protege o endpoint
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get('authorization') != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+async def backfill_comment_counts(batch_size: int = 500):
+    """
+    Preenche comment_count nos posts antigos que ainda não têm o contador. Os
+    endpoints de comentário só fazem $inc onde o contador já existe, então o
+    campo ausente sempre significa "ainda não contado" e a recontagem é um $set
+    """
+    while True:
+        posts = await db.posts.find(
+            {'comment_count': {'$exists': False}}, {'_id': 0, 'id': 1}
+        ).to_list(batch_size)
+        if not posts:
+            return
+        
+        post_ids = [post['id'] for post in posts]
+        counts = {pid: 0 for pid in post_ids}
+        pipeline = [
+            {'$match': {'post_id': {'$in': post_ids}}},
+            {'$group': {'_id': '$post_id', 'count': {'$sum': 1}}}
+        ]
+        async for row in db.comments.aggregate(pipeline):
+            counts[row['_id']] = row['count']
+        
+        await db.posts.bulk_write(
+            [UpdateOne({'id': pid}, {'$set': {'comment_count': count}})
+             for pid, count in counts.items()],
+            ordered=False
+        )
+
+async def backfill_post_geo():
+    """Posts antigos com location {lat, lng} ganham o ponto GeoJSON"""
+    await db.posts.update_many(
+        {
+            'geo': {'$exists': False},
+            'location.lat': {'$type': 'number', '$gte': -90, '$lte': 90},
+            'location.lng': {'$type': 'number', '$gte': -180, '$lte': 180}
+        },
+        [{'$set': {'geo': {'type': 'Point', 'coordinates': ['$location.lng', '$location.lat']}}}]
+    )
+
+async def backfill_city():
+    """
+    Documentos anteriores à divisão por cidade ganham o campo city: pela
+    localização quando ela cai no raio de uma cidade, senão a cidade padrão
+    """
+    for collection in (db.posts, db.users):
+        for city in CITIES:
+            min_lat, max_lat, min_lng, max_lng = city_bbox(city)
+            await collection.update_many(
+                {
+                    'city': {'$exists': False},
+                    'location.lat': {'$gte': min_lat, '$lte': max_lat},
+                    'location.lng': {'$gte': min_lng, '$lte': max_lng}
+                },
+                {'$set': {'city': city}}
+            )
+    for collection in (db.posts, db.users, db.help_locations):
+        await collection.update_many({'city': {'$exists': False}}, {'$set': {'city': DEFAULT_CITY}})
+
+async def backfill_category_masks(batch_size: int = 500):
+    """Posts e usuários anteriores ao registro de categorias ganham as máscaras"""
+    while True:
+        posts = await db.posts.find(
+            {'category_mask': {'$exists': False}}, {'_id': 0, 'id': 1, 'category': 1, 'categories': 1}
+        ).to_list(batch_size)
+        if not posts:
+            break
+        await db.posts.bulk_write(
+            [UpdateOne({'id': post['id']}, {'$set': {'category_mask': post_category_mask(post)}}) for post in posts],
+            ordered=False
+        )
+    
+    missing = {'$or': [
+        {field: {'$exists': True}, mask_field: {'$exists': False}}
+        for field, mask_field in USER_MASK_FIELDS.items()
+    ]}
+    while True:
+        users = await db.users.find(
+            missing, {'_id': 0, 'id': 1, **{field: 1 for field in USER_MASK_FIELDS}}
+        ).to_list(batch_size)
+        if not users:
+            return
+        await db.users.bulk_write(
+            [UpdateOne({'id': user['id']}, {'$set': user_masks(user)}) for user in users],
+            ordered=False
+        )
+
+async def backfill_effective_needs(batch_size: int = 500):
+    """Migrantes anteriores ao effective_need_mask ganham o campo (roda depois das máscaras)"""
+    while True:
+        users = await db.users.find(
+            {'role': 'migrant', 'effective_need_mask': {'$exists': False}}, CAN_CHAT_PROJECTION
+        ).to_list(batch_size)
+        if not users:
+            return
+        await attach_effective_needs(users)
+        await db.users.bulk_write(
+            [UpdateOne({'id': user['id']}, {'$set': {'effective_need_mask': user['effective_need_mask']}})
+             for user in users],
+            ordered=False
+        )
+
+async def backfill_match_candidates(batch_size: int = 500):
+    """Helpers e voluntários ativos ainda sem documento em match_candidates"""
+    indexed = set(await db.match_candidates.distinct('id', {'removed': False}))
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    async for user in db.users.find({'role': {'$in': MATCH_ROLES}, **ACTIVE_USER}, MATCH_USER_PROJECTION):
+        if user['id'] not in indexed:
+            ops.append(match_candidate_update(user, now))
+        if len(ops) >= batch_size:
+            await db.match_candidates.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db.match_candidates.bulk_write(ops, ordered=False)
+
+# (coleção, chaves, opções) de cada índice
+INDEXES = [
+    ('comments', [('post_id', 1), ('created_at', 1), ('id', 1)], {}),
+    ('comments', 'id', {}),
+    ('posts', 'id', {}),
+    ('posts', 'user_id', {}),
+    ('comments', 'user_id', {}),
+    ('messages', 'from_user_id', {}),
+    ('messages', 'to_user_id', {}),
+    ('matches', 'helper_id', {}),
+    ('matches', 'migrant_id', {}),
+    ('ai_chats', 'user_id', {}),
+    # Controle de acesso do GET /api/media: quem referencia cada arquivo
+    ('posts', 'images', {}),
+    ('messages', 'media', {}),
+    ('deletion_jobs', [('status', 1), ('created_at', -1)], {}),
+    ('deletion_jobs', 'user_id', {}),
+    ('snapshot_audit_jobs', [('status', 1), ('created_at', -1)], {}),
+    ('users', [('created_at', -1), ('id', -1)], {}),
+    ('users', [('role', 1), ('created_at', -1), ('id', -1)], {}),
+    ('users', 'email', {}),
+    ('users', 'name', {}),
+    ('posts', [('created_at', -1), ('id', -1)], {}),
+    ('posts', [('category', 1), ('created_at', -1), ('id', -1)], {}),
+    ('posts', [('type', 1), ('created_at', -1), ('id', -1)], {}),
+    ('posts', [('title', 'text'), ('description', 'text')], {
+        'weights': {'title': 3, 'description': 1},
+        'default_language': 'portuguese',
+        'language_override': 'language',
+        'name': 'posts_text'
+    }),
+    ('posts', [('geo', '2dsphere'), ('type', 1), ('created_at', -1)], {}),
+    # Consultas por cidade: city na frente de cada índice quente. {city, id}
+    # é o shard key previsto para posts e users quando as coleções forem divididas
+    ('posts', [('city', 1), ('created_at', -1), ('id', -1)], {}),
+    ('posts', [('city', 1), ('category', 1), ('created_at', -1)], {}),
+    ('posts', [('city', 1), ('geo', '2dsphere'), ('type', 1), ('created_at', -1)], {}),
+    ('posts', [('city', 1), ('id', 1)], {}),
+    ('users', [('city', 1), ('role', 1), ('show_location', 1)], {}),
+    ('users', [('city', 1), ('id', 1)], {}),
+    ('users', [('city', 1), ('role', 1), ('created_at', -1), ('id', -1)], {}),
+    ('help_locations', [('city', 1), ('category', 1)], {}),
+    # Máscaras de categorias: $bitsAnySet é avaliado nas chaves do índice,
+    # sem buscar os documentos que não combinam
+    ('posts', [('city', 1), ('type', 1), ('category_mask', 1), ('created_at', -1)], {}),
+    ('users', [('city', 1), ('role', 1), ('help_mask', 1)], {}),
+    ('messages', 'created_at', {}),
+    ('ai_chats', 'created_at', {}),
+    ('stats_rollups', [('metric', 1), ('granularity', 1), ('bucket', 1), ('dims', 1)], {'unique': True}),
+    ('rollup_state', 'metric', {'unique': True}),
+    ('request_profiles', 'id', {}),
+    ('request_profiles', 'created_at', {}),
+    ('request_profiles', 'expires_at', {'expireAfterSeconds': 0}),
+    ('match_candidates', [('id', 1), ('city', 1)], {'unique': True}),
+    ('match_candidates', [('city', 1), ('updated_at', 1)], {}),
+    # Chave natural usada pelo upsert do seed (bulk_import)
+    ('help_locations', 'id', {}),
+]
+
+async def ensure_indexes():
+    """Cria os índices um a um: um conflito de opções num deles não impede os outros"""
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Index setup error ({collection} {keys}): {e}")
+
+# Migrações de dados idempotentes, na ordem em que rodam (as máscaras antes das
+# necessidades efetivas, que dependem delas), com as coleções que cada uma completa
+BACKFILLS = (
+    (backfill_comment_counts, {'posts'}),
+    (backfill_post_geo, {'posts'}),
+    (backfill_city, {'posts', 'users', 'help_locations'}),
+    (backfill_category_masks, {'posts', 'users'}),
+    (backfill_effective_needs, {'posts', 'users'}),
+    (backfill_match_candidates, {'users'}),
+)
+
+async def run_backfills(collections: Optional[List[str]] = None):
+    """
+    Roda os backfills (só os que completam `collections`, se dada); cada um
+    falha de forma isolada. Também chamado depois de importações em lote
+    (bulk_import, popular_banco.py), que gravam os documentos crus: sem city e
+    máscaras eles não aparecem nos feeds até o próximo deploy.
+    """
+    for backfill, targets in BACKFILLS:
+        if collections is not None and not targets & set(collections):
+            continue
+        try:
+            await backfill()
+        except Exception as e:
+            logger.error(f"Backfill {backfill.__name__} error: {e}")
+
+async def run_migrations():
+    """
+    Índices, backfills, migração de mídia inline e remoção de metadados das
+    imagens antigas; cada passo falha de forma
+    isolada. Em produção roda uma vez por deploy (migrate.py, chamado pelo
+    master do gunicorn antes de subir os workers), não em cada worker.
+    """
+    # Sem banco não adianta esperar o timeout de cada índice e backfill
+    await db.command('ping')
+    await ensure_indexes()
+    await run_backfills()
+    await migrate_inline_media()
+    try:
+        sanitized = await media_store.sanitize_stored_originals()
+        if sanitized:
+            logger.info(f"Removed metadata from {sanitized} stored images")
+    except Exception as e:
+        logger.error(f"Media sanitize error: {e}")
+
+# Sem gunicorn (uvicorn em desenvolvimento, um processo só) o próprio startup
+# dispara as migrações em segundo plano; o gunicorn.conf.py desliga isto
+MIGRATIONS_ON_STARTUP = os.environ.get('MIGRATIONS_ON_STARTUP', '1') == '1'
+
+# ==================== TAREFAS PERIÓDICAS ====================
+# Todo worker tem os loops, mas a cada rodada só o dono do lease em job_leases
+# executa o job. O lease vale duas rodadas e o dono o renova a cada uma; se o
+# worker morre, outro assume quando ele expira (no shutdown o lease é solto).
+LEASE_ROUNDS = 2
+
+def lease_owner() -> str:
+    # Calculado na hora: com preload_app o módulo é importado antes do fork
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    """Renova o lease se já é nosso ou se expirou; False se outro processo o tem"""
+    now = datetime.now(timezone.utc)
+    owner = lease_owner()
+    try:
+        await db.job_leases.update_one(
+            {'_id': name, '$or': [{'owner': owner}, {'expires_at': {'$lte': now.isoformat()}}]},
+            {'$set': {
+                'owner': owner,
+                'expires_at': (now + timedelta(seconds=seconds)).isoformat(),
+                'updated_at': now.isoformat()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # O documento existe com outro dono e lease válido: o upsert tentou inserir o mesmo _id
+        return False
+    return True
+
+async def leased_loop(name: str, interval: float, job):
+    """Roda `job` a cada `interval` segundos em um único processo entre todos os workers"""
+    while True:
+        try:
+            if await acquire_lease(name, interval * LEASE_ROUNDS):
+                await job()
+        except Exception as e:
+            logger.error(f"Periodic job {name} error: {e}")
+        await asyncio.sleep(interval)
+
+async def release_leases():
+    await db.job_leases.delete_many({'owner': lease_owner()})
+
+# Loops que rodam enquanto o processo vive; são cancelados no shutdown
+periodic_tasks: List[asyncio.Task] = []
+# Prazo para terminar requisições e tarefas em segundo plano no shutdown
+SHUTDOWN_GRACE_SECONDS = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', 20))
+
+async def startup():
+    try:
+        await media_store.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Media index setup error: {e}")
+    
+    try:
+        await slow_query_monitor.ensure_collection(db)
+    except Exception as e:
+        logger.error(f"Slow query log setup error: {e}")
+    periodic_tasks.append(asyncio.create_task(slow_query_monitor.worker(client)))
+    
+    if MIGRATIONS_ON_STARTUP:
+        run_in_background(run_migrations())
+    periodic_tasks.append(asyncio.create_task(leased_loop('rollups', ROLLUP_INTERVAL, refresh_rollups)))
+    periodic_tasks.append(asyncio.create_task(
+        leased_loop('responsiveness', RESPONSIVENESS_INTERVAL, refresh_responsiveness)
+    ))
+    
+    try:
+        await resume_deletion_jobs()
+    except Exception as e:
+        logger.error(f"Resume deletion jobs error: {e}")
+    
+    try:
+        await resume_snapshot_audit_jobs()
+    except Exception as e:
+        logger.error(f"Resume snapshot audit jobs error: {e}")
+
+async def shutdown():
+    """
+    Chamado depois que o servidor parou de aceitar conexões: espera as requisições
+    em andamento, grava o que está pendente em memória e fecha o pool do Mongo.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SHUTDOWN_GRACE_SECONDS
+    
+    while HTTP_IN_FLIGHT.value() > 0 and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    
+    for task in periodic_tasks:
+        task.cancel()
+    await asyncio.gather(*periodic_tasks, return_exceptions=True)
+    periodic_tasks.clear()
+    try:
+        await release_leases()
+    except Exception as e:
+        logger.error(f"Release leases error: {e}")
+    await slow_query_monitor.flush(client)
+    
+    # Fan-out de autor, variantes de imagem, jobs de exclusão: o que não terminar
+    # no prazo é cancelado (jobs são retomados no próximo startup, migrações na próxima execução)
+    pending = background_tasks | media_store.pending()
+    if pending:
+        _, unfinished = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()))
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            logger.warning(f"Shutdown cancelled {len(unfinished)} background tasks")
+    
+    media_store.shutdown()
     client.close()
@@ -0,0 +1,222 @@
+"""
+Log de queries lentas do MongoDB.
+
+SlowQueryMonitor é um CommandListener do PyMongo: todo comando acima de
+SLOW_QUERY_MS é registrado com o formato normalizado da query (valores trocados
+pelo tipo), para agrupar execuções da mesma query. Para uma amostra das
+ocorrências de cada formato é executado um explain("executionStats").
+
+O listener roda nas threads do Motor e só enfileira; a gravação e o explain são
+feitos por worker() no event loop, fora do caminho da requisição. O resultado
+vai para a coleção capped slow_queries.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# Fração das ocorrências lentas que ganham explain, e intervalo mínimo por formato
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.2))
+SLOW_QUERY_EXPLAIN_INTERVAL = 600  # segundos
+SLOW_QUERY_LOG_BYTES = 16 * 1024 * 1024
+SLOW_QUERY_QUEUE_SIZE = 1000
+SLOW_QUERY_COLLECTION = 'slow_queries'
+
+# Comandos de leitura que aceitam explain sem efeitos colaterais
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+# Campos de sessão/roteamento que o driver adiciona e que o explain não aceita
+DRIVER_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern'}
+SHAPE_FIELDS = ('filter', 'query', 'pipeline', 'sort', 'projection', 'key', 'hint')
+
+
+def query_shape(value):
+    """Troca os valores da query pelo tipo, mantendo campos e operadores"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return ['?']
+        return [query_shape(item) for item in value]
+    if value is None:
+        return None
+    return f'<{type(value).__name__}>'
+
+
+def command_shape(command_name: str, command: dict) -> dict:
+    shape = {'command': command_name}
+    for field in SHAPE_FIELDS:
+        if field in command:
+            value = command[field]
+            # Ordenação e projeção já são o próprio formato
+            shape[field] = dict(value) if field in ('sort', 'projection') and isinstance(value, dict) else query_shape(value)
+    return shape
+
+
+def shape_hash(collection: str, shape: dict) -> str:
+    payload = json.dumps({'collection': collection, **shape}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def explain_command(command_name: str, command: dict) -> Optional[dict]:
+    """Cópia do comando pronta para o explain, ou None se não for seguro explicar"""
+    if command_name == 'aggregate':
+        if any(isinstance(stage, dict) and ({'$out', '$merge'} & stage.keys()) for stage in command.get('pipeline', [])):
+            return None
+    return {key: value for key, value in command.items() if not key.startswith('$') and key not in DRIVER_FIELDS}
+
+
+def find_key(document, key):
+    """Busca em profundidade a primeira ocorrência de uma chave no explain"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_stages(plan) -> list:
+    """Lista os estágios do plano vencedor (ex.: FETCH > IXSCAN posts_text)"""
+    stages = []
+    while isinstance(plan, dict):
+        stage = plan.get('stage')
+        if stage:
+            stages.append(f"{stage} {plan['indexName']}" if plan.get('indexName') else stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0] or plan.get('queryPlan')
+    return stages
+
+
+def summarize_explain(result: dict) -> dict:
+    stats = find_key(result, 'executionStats') or {}
+    return {
+        'winning_plan': plan_stages(find_key(result, 'winningPlan')),
+        'n_returned': stats.get('nReturned'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'execution_ms': stats.get('executionTimeMillis')
+    }
+
+
+class SlowQueryMonitor(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self._pending: Dict[tuple, tuple] = {}
+        self._last_explain: Dict[str, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self.dropped = 0
+
+    # ----- listener (threads do Motor) -----
+
+    def started(self, event):
+        if self._queue is None or event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str) or collection == SLOW_QUERY_COLLECTION:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.database_name, collection, event.command_name, event.command
+        )
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure)[:300])
+
+    def _finish(self, event, error: Optional[str]):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, pending + (event.duration_micros / 1000, error))
+        except RuntimeError:
+            pass  # loop já fechado (shutdown)
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    # ----- event loop -----
+
+    def should_explain(self, digest: str) -> bool:
+        now = time.monotonic()
+        last = self._last_explain.get(digest)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        if random.random() >= self.explain_rate:
+            return False
+        self._last_explain[digest] = now
+        return True
+
+    async def ensure_collection(self, db):
+        try:
+            await db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=SLOW_QUERY_LOG_BYTES)
+        except CollectionInvalid:
+            pass  # já existe
+        await db[SLOW_QUERY_COLLECTION].create_index([('shape_hash', 1), ('created_at', -1)])
+
+    async def worker(self, client):
+        """Grava as ocorrências enfileiradas (e o explain amostrado) até ser cancelado"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=SLOW_QUERY_QUEUE_SIZE)
+        while True:
+            await self.record(client, await self._queue.get())
+
+    async def flush(self, client):
+        """Grava o que ainda está na fila (shutdown), sem explain"""
+        queue, self._queue = self._queue, None
+        if queue is None:
+            return
+        self.explain_rate = 0
+        while not queue.empty():
+            await self.record(client, queue.get_nowait())
+
+    async def record(self, client, item):
+        database, collection, command_name, command, duration_ms, error = item
+        try:
+            shape = command_shape(command_name, command)
+            digest = shape_hash(collection, shape)
+            entry = {
+                'shape_hash': digest,
+                'database': database,
+                'collection': collection,
+                'command': command_name,
+                'shape': json.dumps(shape, sort_keys=True, default=str),
+                'duration_ms': round(duration_ms, 2),
+                'error': error,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }
+            to_explain = explain_command(command_name, command) if error is None and self.should_explain(digest) else None
+            if to_explain is not None:
+                try:
+                    result = await client[database].command(
+                        {'explain': to_explain, 'verbosity': 'executionStats'}
+                    )
+                    entry['explain'] = summarize_explain(result)
+                except Exception as e:
+                    entry['explain_error'] = str(e)[:300]
+            await client[database][SLOW_QUERY_COLLECTION].insert_one(entry)
+        except Exception as e:
+            logger.error(f"Slow query log error: {e}")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Verifica o roteamento de leituras do backend (server.read_db) num replica set.
+
+Suba um replica set local de três nós:
+
+    for port in 27017 27018 27019; do
+        mkdir -p /tmp/rs0-$port
+        mongod --replSet rs0 --port $port --dbpath /tmp/rs0-$port --bind_ip localhost \\
+               --fork --logpath /tmp/rs0-$port/mongod.log
+    done
+    mongosh --port 27017 --quiet --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"},
+        {_id: 1, host: "localhost:27018"},
+        {_id: 2, host: "localhost:27019"}]})'
+
+e rode:
+
+    MONGO_URL="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \\
+        python check_read_routing.py
+
+O script usa o banco descartável read_routing_check e confere que:
+  - leituras STRONG vão ao primário e enxergam na hora o que acabou de ser gravado;
+  - leituras EVENTUAL vão a um secundário;
+  - os endpoints tolerantes (/api/volunteers, /api/admin/stats) leem de
+    secundários e cadastro + login ficam no primário;
+  - dados de referência (/api/services, /api/advertisements) são carregados do
+    primário uma vez e as chamadas seguintes não vão ao banco.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+DB_NAME = 'read_routing_check'
+READ_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+
+
+def print_step(emoji, text):
+    print(f"{emoji} {text}")
+
+
+async def main():
+    if 'replicaSet=' not in os.environ.get('MONGO_URL', ''):
+        print_step("❌", "Defina MONGO_URL apontando para o replica set (…/?replicaSet=rs0)")
+        return 1
+    os.environ['DB_NAME'] = DB_NAME
+    sys.path.insert(0, str(Path(__file__).resolve().parent / 'backend'))
+
+    import httpx
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import monitoring
+    from pymongo.write_concern import WriteConcern
+    import server
+
+    class ReadRecorder(monitoring.CommandListener):
+        """Guarda o servidor que atendeu cada leitura, por coleção"""
+
+        def __init__(self):
+            self.reads = []
+
+        def started(self, event):
+            if event.command_name in READ_COMMANDS and event.database_name == DB_NAME:
+                host, port = event.connection_id
+                self.reads.append((event.command.get(event.command_name), f'{host}:{port}'))
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+        def servers_for(self, collection):
+            return {address for name, address in self.reads if name == collection}
+
+    recorder = ReadRecorder()
+    server.client = AsyncIOMotorClient(
+        os.environ['MONGO_URL'], event_listeners=[recorder], **server.MONGO_CLIENT_OPTIONS
+    )
+    server.db = server.client[DB_NAME]
+
+    hello = await server.db.command('hello')
+    primary = hello.get('primary')
+    secondaries = set(hello.get('hosts', [])) - {primary}
+    print_step("📋", f"Replica set {hello.get('setName')}: primário {primary}, secundários {sorted(secondaries)}")
+    if not secondaries:
+        print_step("❌", "Nenhum secundário disponível")
+        return 1
+    print_step("📋", f"Staleness máximo das leituras eventuais: {server.MONGO_MAX_STALENESS_SECONDS}s")
+
+    failures = []
+
+    def check(ok, text):
+        print_step("✅" if ok else "❌", text)
+        if not ok:
+            failures.append(text)
+
+    await server.client.drop_database(DB_NAME)
+    try:
+        # Leituras diretas: escreve no primário e lê com as duas consistências
+        marker = str(uuid.uuid4())
+        await server.db.routing_probe.insert_one({'id': marker})
+        found = await server.read_db(server.STRONG).routing_probe.find_one({'id': marker})
+        check(found is not None, "STRONG enxerga a escrita imediatamente")
+        check(recorder.servers_for('routing_probe') == {primary}, "STRONG lê do primário")
+
+        recorder.reads.clear()
+        for _ in range(5):
+            await server.read_db(server.EVENTUAL).routing_probe.find_one({'id': marker})
+        check(recorder.servers_for('routing_probe') <= secondaries, "EVENTUAL lê de secundários")
+
+        # Dados replicados em todos os nós antes de exercitar os endpoints
+        replicated = WriteConcern(w=len(secondaries) + 1, wtimeout=10000)
+        await server.db.get_collection('services', write_concern=replicated).insert_one(
+            {'id': str(uuid.uuid4()), 'name': 'Serviço de teste', 'category': 'food'})
+        await server.db.get_collection('advertisements', write_concern=replicated).insert_one(
+            {'id': str(uuid.uuid4()), 'title': 'Anúncio de teste', 'type': 'motivation',
+             'is_active': True, 'priority': 1})
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://check') as http:
+            recorder.reads.clear()
+            email = f'routing-{marker[:8]}@example.com'
+            response = await http.post('/api/auth/register', json={
+                'email': email, 'password': 'routing-check', 'name': 'Routing', 'role': 'admin'})
+            check(response.status_code == 200, "Cadastro")
+            response = await http.post('/api/auth/login', json={'email': email, 'password': 'routing-check'})
+            check(response.status_code == 200, "Login logo após o cadastro (read-your-writes)")
+            check(recorder.servers_for('users') == {primary}, "Cadastro e login leem do primário")
+            headers = {'Authorization': f"Bearer {response.json().get('token')}"}
+
+            for path, collection in (('/api/services', 'services'), ('/api/advertisements', 'advertisements')):
+                recorder.reads.clear()
+                response = await http.get(path, headers=headers)
+                check(response.status_code == 200 and recorder.servers_for(collection) == {primary},
+                      f"GET {path} carrega a coleção do primário")
+                recorder.reads.clear()
+                response = await http.get(path, headers=headers)
+                check(response.status_code == 200 and not recorder.servers_for(collection),
+                      f"GET {path} repetido é servido da memória")
+
+            for path, collection in (('/api/volunteers', 'users'), ('/api/admin/stats', 'posts')):
+                recorder.reads.clear()
+                response = await http.get(path, headers=headers)
+                servers = recorder.servers_for(collection)
+                check(response.status_code == 200 and servers and servers <= secondaries,
+                      f"GET {path} lê de secundário ({', '.join(sorted(servers)) or 'sem leituras'})")
+    finally:
+        await server.client.drop_database(DB_NAME)
+        server.client.close()
+
+    print()
+    if failures:
+        print_step("❌", f"{len(failures)} verificação(ões) falharam")
+        return 1
+    print_step("🎉", "Roteamento de leituras OK")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -30,6 +30,8 @@ export default function AdminDashboard() {
   const [stats, setStats] = useState(null);
   const [users, setUsers] = useState([]);
   const [posts, setPosts] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [postsCursor, setPostsCursor] = useState(null);
   const [advertisements, setAdvertisements] = useState([]);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState('overview');
@@ -86,28 +88,34 @@ export default function AdminDashboard() {
     }
   };
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor = null) => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/users`, {
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/users${params}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       if (response.ok) {
         const data = await response.json();
-        setUsers(data);
+        // Próxima página vem no header X-Next-Cursor
+        setUsersCursor(response.headers.get('X-Next-Cursor'));
+        setUsers(prev => cursor ? [...prev, ...data] : data);
       }
     } catch (error) {
       console.error('Error fetching users:', error);
     }
   };
 
-  const fetchPosts = async () => {
+  const fetchPosts = async (cursor = null) => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/posts`, {
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/posts${params}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       if (response.ok) {
         const data = await response.json();
-        setPosts(data);
+        // Próxima página vem no header X-Next-Cursor
+        setPostsCursor(response.headers.get('X-Next-Cursor'));
+        setPosts(prev => cursor ? [...prev, ...data] : data);
       }
     } catch (error) {
       console.error('Error fetching posts:', error);
@@ -684,6 +692,13 @@ export default function AdminDashboard() {
                   Nenhum usuário encontrado
                 </div>
               )}
+              {usersCursor && (
+                <div className="p-4 text-center border-t">
+                  <Button onClick={() => fetchUsers(usersCursor)} variant="outline" className="rounded-xl">
+                    Carregar mais
+                  </Button>
+                </div>
+              )}
             </div>
           </div>
         )}
@@ -763,6 +778,13 @@ export default function AdminDashboard() {
                 Nenhuma publicação encontrada
               </div>
             )}
+            {postsCursor && (
+              <div className="text-center">
+                <Button onClick={() => fetchPosts(postsCursor)} variant="outline" className="rounded-xl">
+                  Carregar mais
+                </Button>
+              </div>
+            )}
           </div>
         )}
 
@@ -6,6 +6,7 @@ import { Textarea } from '../components/ui/textarea';
 import { ArrowLeft, Send, User, MapPin, Image as ImageIcon, Video, Paperclip, Lock, Phone, MessageCircle, Clock, CheckCheck, Check, MoreVertical, Info, ExternalLink } from 'lucide-react';
 import { toast } from 'sonner';
 import MapPreview from '../components/MapPreview';
+import { uploadMedia, mediaUrl } from '../utils/media';
 
 const CATEGORY_INFO = {
   food: { icon: '🍽️', label: 'Alimentação', color: 'bg-green-100 text-green-700' },
@@ -169,7 +170,7 @@ export default function DirectChatPage() {
     }
   };
 
-  const handleFileUpload = (e, type) => {
+  const handleFileUpload = async (e, type) => {
     const file = e.target.files[0];
     if (file) {
       if (file.size > 10000000) {
@@ -177,15 +178,16 @@ export default function DirectChatPage() {
         return;
       }
 
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        sendMessage({
-          media: [reader.result],
+      try {
+        const uploaded = await uploadMedia(file, token);
+        await sendMessage({
+          media: [uploaded.url],
           media_type: type
         });
         toast.success(`${type === 'image' ? 'Foto' : 'Vídeo'} enviado!`);
-      };
-      reader.readAsDataURL(file);
+      } catch (error) {
+        toast.error(error.message);
+      }
     }
   };
 
@@ -463,13 +465,14 @@ export default function DirectChatPage() {
                               <div className="mb-2">
                                 {msg.media_type === 'image' ? (
                                   <img 
-                                    src={msg.media[0]} 
+                                    src={mediaUrl(msg.media[0], 'small', token)} 
                                     alt="" 
+                                    loading="lazy"
                                     className="rounded-xl max-w-full max-h-64 object-cover cursor-pointer hover:opacity-90 transition-opacity"
-                                    onClick={() => window.open(msg.media[0], '_blank')}
+                                    onClick={() => window.open(mediaUrl(msg.media[0], undefined, token), '_blank')}
                                   />
                                 ) : (
-                                  <video src={msg.media[0]} controls className="rounded-xl max-w-full max-h-64" />
+                                  <video src={mediaUrl(msg.media[0], undefined, token)} preload="metadata" controls className="rounded-xl max-w-full max-h-64" />
                                 )}
                               </div>
                             )}
@@ -9,6 +9,7 @@ import { Input } from '../components/ui/input';
 import BottomNav from '../components/BottomNav';
 import { Plus, MapPin, User, Clock, MessageCircle, Image as ImageIcon, MessageSquare, Send, X, Filter, Info, ExternalLink, Lock } from 'lucide-react';
 import { toast } from 'sonner';
+import { uploadMedia, mediaUrl } from '../utils/media';
 import { useTranslation } from 'react-i18next';
 import { useNavigate } from 'react-router-dom';
 
@@ -236,7 +237,7 @@ export default function HomePage() {
     }
   };
 
-  const handleFileUpload = (e) => {
+  const handleFileUpload = async (e) => {
     const file = e.target.files[0];
     if (file) {
       if (file.size > 5000000) {
@@ -244,12 +245,13 @@ export default function HomePage() {
         return;
       }
 
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        setNewPost({...newPost, images: [...(newPost.images || []), reader.result]});
+      try {
+        const uploaded = await uploadMedia(file, token);
+        setNewPost(prev => ({...prev, images: [...(prev.images || []), uploaded.url]}));
         toast.success('Foto adicionada!');
-      };
-      reader.readAsDataURL(file);
+      } catch (error) {
+        toast.error(error.message);
+      }
     }
   };
 
@@ -334,6 +336,7 @@ export default function HomePage() {
       if (response.ok) {
         setNewComment('');
         setCommentingOn(null);
+        setPosts(prev => prev.map(p => p.id === postId ? {...p, comment_count: (p.comment_count || 0) + 1} : p));
         fetchComments(postId);
         toast.success('Comentário adicionado!');
       }
@@ -706,7 +709,7 @@ export default function HomePage() {
                       <div className="flex gap-2 flex-wrap">
                         {newPost.images.map((img, idx) => (
                           <div key={idx} className="relative w-24 h-24 rounded-xl overflow-hidden border-2 border-gray-200 group">
-                            <img src={img} alt="" className="w-full h-full object-cover" />
+                            <img src={mediaUrl(img, 'thumb')} alt="" className="w-full h-full object-cover" />
                             <button
                               onClick={() => removeImage(idx)}
                               className="absolute top-1 right-1 bg-red-500 text-white rounded-full p-1 opacity-0 group-hover:opacity-100 transition-opacity shadow-lg"
@@ -836,10 +839,11 @@ export default function HomePage() {
                     {post.images.map((img, idx) => (
                       <div key={idx} className={`${post.images.length === 1 ? 'w-full' : ''} rounded-2xl overflow-hidden bg-gray-100`}>
                         <img 
-                          src={img} 
+                          src={mediaUrl(img, post.images.length === 1 ? 'medium' : 'small')} 
                           alt="" 
+                          loading="lazy"
                           className={`w-full ${post.images.length === 1 ? 'max-h-[500px] object-contain' : 'h-48 object-cover'} rounded-2xl`}
-                          onClick={() => window.open(img, '_blank')}
+                          onClick={() => window.open(mediaUrl(img), '_blank')}
                           style={{ cursor: 'pointer' }}
                         />
                       </div>
@@ -890,7 +894,7 @@ export default function HomePage() {
                       className="rounded-full text-xs sm:text-sm px-3 py-2 w-full sm:w-auto"
                     >
                       <MessageSquare size={14} className="sm:mr-1" />
-                      <span className="ml-1">{showComments[post.id] ? 'Ocultar' : 'Comentários'}</span>
+                      <span className="ml-1">{showComments[post.id] ? 'Ocultar' : 'Comentários'}{post.comment_count > 0 ? ` (${post.comment_count})` : ''}</span>
                     </Button>
                     {post.user_id !== user.id && post.can_help && (
                       <Button
@@ -0,0 +1,41 @@
+/**
+ * Envia um arquivo para o media store do backend
+ * @param {File} file - Foto ou vídeo selecionado
+ * @param {string} token - Token JWT do usuário
+ * @returns {Promise<{id: string, url: string, content_type: string}>}
+ */
+export const uploadMedia = async (file, token) => {
+  const formData = new FormData();
+  formData.append('file', file);
+
+  const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/media`, {
+    method: 'POST',
+    headers: { 'Authorization': `Bearer ${token}` },
+    body: formData
+  });
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.detail || 'Erro ao enviar arquivo');
+  }
+  return response.json();
+};
+
+/**
+ * Monta a URL absoluta de uma referência de mídia
+ * Referências do media store (/api/media/...) apontam para o backend;
+ * data URLs antigas e links externos são usados como estão.
+ * Mídia de mensagens é privada: passe o token, já que <img> e <video> não
+ * mandam o header Authorization.
+ * @param {string} ref - Referência salva no post ou mensagem
+ * @param {string} [variant] - Variante da imagem: 'thumb', 'small' ou 'medium'
+ * @param {string} [token] - Token JWT, para mídia de conversas
+ * @returns {string}
+ */
+export const mediaUrl = (ref, variant, token) => {
+  if (!ref || !ref.startsWith('/api/media/')) return ref;
+  const url = new URL(`${process.env.REACT_APP_BACKEND_URL}${ref}`, window.location.origin);
+  if (variant) url.searchParams.set('variant', variant);
+  if (token) url.searchParams.set('token', token);
+  return url.toString();
+};
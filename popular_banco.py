@@ -8,15 +8,28 @@ import os
 from pathlib import Path
 from datetime import datetime, timezone
 import sys
+import uuid
 
 # Adicionar o diretório backend ao path
 sys.path.insert(0, '/app/backend')
 
+SEED_NAMESPACE = uuid.UUID('6f1c2a52-93a4-4f0e-8d43-2b1c5e7a9d10')
+
+
+def seed_id(kind, name):
+    """id estável (UUID5) para documentos de exemplo"""
+    return str(uuid.uuid5(SEED_NAMESPACE, f'{kind}:{name}'))
+
+
+def print_stats(stats):
+    print(f"   ✅ {stats.inserted} criados, {stats.updated} atualizados, {stats.unchanged} sem mudança")
+
 async def popular_dados():
     from motor.motor_asyncio import AsyncIOMotorClient
     from dotenv import load_dotenv
     import bcrypt
-    import uuid
+    from bulk_import import import_documents
+    from reference_data import bump_version
     
     # Carregar .env
     load_dotenv('/app/backend/.env')
@@ -34,132 +47,124 @@ async def popular_dados():
     # 1. Criar usuários de exemplo
     print("📝 Criando usuários de exemplo...")
     
-    usuarios_existentes = await db.users.count_documents({})
+    senhas = {
+        'admin@watizat.com': 'admin123',
+        'voluntario@exemplo.com': 'senha123',
+        'migrante@exemplo.com': 'senha123'
+    }
+    usuarios = [
+        {
+            'email': 'admin@watizat.com',
+            'name': 'Administrador',
+            'role': 'admin',
+            'languages': ['pt', 'en', 'fr']
+        },
+        {
+            'email': 'voluntario@exemplo.com',
+            'name': 'Maria Silva',
+            'role': 'volunteer',
+            'languages': ['pt', 'fr'],
+            'professional_area': 'legal',
+            'help_categories': ['legal', 'housing']
+        },
+        {
+            'email': 'migrante@exemplo.com',
+            'name': 'João Santos',
+            'role': 'migrant',
+            'languages': ['pt'],
+            'need_categories': ['food', 'housing']
+        }
+    ]
+    
+    # Upsert em lote pelo email: id, senha e created_at só são gravados na
+    # criação, então rodar de novo não troca a senha de quem já existe
+    stats = await import_documents(db.users, usuarios, key='email', on_insert=lambda user: {
+        'id': str(uuid.uuid4()),
+        'password': bcrypt.hashpw(senhas[user['email']].encode(), bcrypt.gensalt()).decode(),
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
+    print_stats(stats)
     
-    if usuarios_existentes >= 3:
-        print(f"✅ Já existem {usuarios_existentes} usuários cadastrados")
-    else:
-        usuarios = [
+    # 2. Criar posts de exemplo
+    print("\n📋 Criando posts de exemplo...")
+    
+    # Autores pelas contas de exemplo (não por qualquer usuário com o papel)
+    migrante = await db.users.find_one({'email': 'migrante@exemplo.com'})
+    voluntario = await db.users.find_one({'email': 'voluntario@exemplo.com'})
+    
+    if migrante and voluntario:
+        posts = [
             {
-                'id': str(uuid.uuid4()),
-                'email': 'admin@watizat.com',
-                'password': bcrypt.hashpw('admin123'.encode(), bcrypt.gensalt()).decode(),
-                'name': 'Administrador',
-                'role': 'admin',
-                'languages': ['pt', 'en', 'fr'],
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'id': seed_id('post', 'food'),
+                'user_id': migrante['id'],
+                'type': 'need',
+                'category': 'food',
+                'title': 'Preciso de ajuda com alimentação',
+                'description': 'Olá, estou precisando de ajuda para conseguir alimentos. Cheguei recentemente em Paris e ainda não tenho trabalho.',
+                'images': []
             },
             {
-                'id': str(uuid.uuid4()),
-                'email': 'voluntario@exemplo.com',
-                'password': bcrypt.hashpw('senha123'.encode(), bcrypt.gensalt()).decode(),
-                'name': 'Maria Silva',
-                'role': 'volunteer',
-                'languages': ['pt', 'fr'],
-                'professional_area': 'legal',
-                'help_categories': ['legal', 'housing'],
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'id': seed_id('post', 'legal'),
+                'user_id': voluntario['id'],
+                'type': 'offer',
+                'category': 'legal',
+                'title': 'Ofereço ajuda jurídica gratuita',
+                'description': 'Sou advogada e posso ajudar com documentação, visto e questões legais. Atendo em português e francês.',
+                'images': []
             },
             {
-                'id': str(uuid.uuid4()),
-                'email': 'migrante@exemplo.com',
-                'password': bcrypt.hashpw('senha123'.encode(), bcrypt.gensalt()).decode(),
-                'name': 'João Santos',
-                'role': 'migrant',
-                'languages': ['pt'],
-                'need_categories': ['food', 'housing'],
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'id': seed_id('post', 'housing'),
+                'user_id': migrante['id'],
+                'type': 'need',
+                'category': 'housing',
+                'title': 'Procuro moradia temporária',
+                'description': 'Preciso de um lugar para ficar por algumas semanas enquanto procuro trabalho e moradia definitiva.',
+                'images': []
             }
         ]
         
-        for user in usuarios:
-            existing = await db.users.find_one({'email': user['email']})
-            if not existing:
-                await db.users.insert_one(user)
-                print(f"   ✅ {user['name']} ({user['role']})")
-    
-    # 2. Criar posts de exemplo
-    print("\n📋 Criando posts de exemplo...")
-    
-    posts_existentes = await db.posts.count_documents({})
-    
-    if posts_existentes >= 3:
-        print(f"✅ Já existem {posts_existentes} posts")
+        # ids determinísticos: rodar de novo casa com os mesmos posts
+        stats = await import_documents(db.posts, posts, key='id', on_insert=lambda post: {
+            'created_at': datetime.now(timezone.utc).isoformat()
+        })
+        print_stats(stats)
     else:
-        # Pegar ID do migrante
-        migrante = await db.users.find_one({'role': 'migrant'})
-        voluntario = await db.users.find_one({'role': 'volunteer'})
-        
-        if migrante and voluntario:
-            posts = [
-                {
-                    'id': str(uuid.uuid4()),
-                    'user_id': migrante['id'],
-                    'type': 'need',
-                    'category': 'food',
-                    'title': 'Preciso de ajuda com alimentação',
-                    'description': 'Olá, estou precisando de ajuda para conseguir alimentos. Cheguei recentemente em Paris e ainda não tenho trabalho.',
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'images': []
-                },
-                {
-                    'id': str(uuid.uuid4()),
-                    'user_id': voluntario['id'],
-                    'type': 'offer',
-                    'category': 'legal',
-                    'title': 'Ofereço ajuda jurídica gratuita',
-                    'description': 'Sou advogada e posso ajudar com documentação, visto e questões legais. Atendo em português e francês.',
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'images': []
-                },
-                {
-                    'id': str(uuid.uuid4()),
-                    'user_id': migrante['id'],
-                    'type': 'need',
-                    'category': 'housing',
-                    'title': 'Procuro moradia temporária',
-                    'description': 'Preciso de um lugar para ficar por algumas semanas enquanto procuro trabalho e moradia definitiva.',
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'images': []
-                }
-            ]
-            
-            for post in posts:
-                await db.posts.insert_one(post)
-                print(f"   ✅ {post['title']}")
+        print("   ⚠️  Contas de exemplo não encontradas; posts não criados")
+    
+    # Usuários e posts entram crus; os backfills do servidor gravam city,
+    # máscaras de categorias, comment_count e match_candidates, sem os quais
+    # eles não aparecem nos feeds nem nas sugestões
+    import server
+    await server.run_backfills(['users', 'posts'])
+    server.client.close()
     
     # 3. Criar anúncios motivacionais
     print("\n💪 Criando anúncios motivacionais...")
     
-    ads_existentes = await db.advertisements.count_documents({})
-    
-    if ads_existentes >= 2:
-        print(f"✅ Já existem {ads_existentes} anúncios")
-    else:
-        anuncios = [
-            {
-                'id': str(uuid.uuid4()),
-                'type': 'motivation',
-                'title': '💪 Você é mais forte do que imagina!',
-                'content': 'Cada dia é uma nova oportunidade. Não desista dos seus sonhos.',
-                'is_active': True,
-                'priority': 10,
-                'created_at': datetime.now(timezone.utc)
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'type': 'motivation',
-                'title': '🙏 Você não está sozinho',
-                'content': 'Há muitas pessoas dispostas a ajudar. Continue com fé!',
-                'is_active': True,
-                'priority': 9,
-                'created_at': datetime.now(timezone.utc)
-            }
-        ]
-        
-        for ad in anuncios:
-            await db.advertisements.insert_one(ad)
-            print(f"   ✅ {ad['title']}")
+    anuncios = [
+        {
+            'type': 'motivation',
+            'title': '💪 Você é mais forte do que imagina!',
+            'content': 'Cada dia é uma nova oportunidade. Não desista dos seus sonhos.',
+            'is_active': True,
+            'priority': 10
+        },
+        {
+            'type': 'motivation',
+            'title': '🙏 Você não está sozinho',
+            'content': 'Há muitas pessoas dispostas a ajudar. Continue com fé!',
+            'is_active': True,
+            'priority': 9
+        }
+    ]
+    
+    stats = await import_documents(db.advertisements, anuncios, key='title', on_insert=lambda ad: {
+        'id': str(uuid.uuid4()),
+        'created_at': datetime.now(timezone.utc)
+    })
+    print_stats(stats)
+    if stats.inserted or stats.updated:
+        await bump_version(db, 'advertisements')
     
     # Resumo final
     print("\n" + "="*60)
@@ -0,0 +1,20 @@
+"""
+Os testes importam os módulos do backend como os scripts fazem (cd backend).
+Nenhum teste conecta a um Mongo de verdade: quem precisa de banco usa o
+fixture `db` (mongomock em memória, de requirements-dev.txt).
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+# server.py exige a variável na importação; o client só conecta no primeiro uso
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+
+
+@pytest.fixture
+def db():
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()['watizat_test']
@@ -0,0 +1,64 @@
+import asyncio
+import io
+
+from bulk_import import content_hash, import_documents, read_csv, read_ndjson
+
+
+def run_import(collection, docs, **kwargs):
+    return asyncio.run(import_documents(collection, [dict(doc) for doc in docs], **kwargs))
+
+
+LOCATIONS = [
+    {'id': 'a', 'name': 'Restos du Coeur', 'category': 'food'},
+    {'id': 'b', 'name': 'Cimade', 'category': 'legal'},
+]
+
+
+def test_content_hash_ignores_key_order_and_control_fields():
+    assert content_hash({'a': 1, 'b': 2}) == content_hash({'b': 2, 'a': 1, '_id': 'x', 'content_hash': 'y'})
+    assert content_hash({'a': 1}) != content_hash({'a': 2})
+
+
+def test_second_run_writes_nothing(db):
+    first = run_import(db.help_locations, LOCATIONS, key='id')
+    assert (first.inserted, first.updated, first.unchanged) == (2, 0, 0)
+
+    second = run_import(db.help_locations, LOCATIONS, key='id')
+    assert (second.inserted, second.updated, second.unchanged) == (0, 0, 2)
+
+    changed = [LOCATIONS[0], {**LOCATIONS[1], 'name': 'La Cimade'}]
+    third = run_import(db.help_locations, changed, key='id')
+    assert (third.inserted, third.updated, third.unchanged) == (0, 1, 1)
+    assert asyncio.run(db.help_locations.find_one({'id': 'b'}))['name'] == 'La Cimade'
+
+
+def test_on_insert_fields_are_kept_on_update(db):
+    counter = iter(range(100))
+    stats = run_import(db.users, [{'email': 'a@x', 'name': 'A'}], key='email',
+                       on_insert=lambda doc: {'id': f'generated-{next(counter)}', 'name': 'ignored'})
+    assert stats.inserted == 1
+    run_import(db.users, [{'email': 'a@x', 'name': 'B'}], key='email',
+               on_insert=lambda doc: {'id': f'generated-{next(counter)}'})
+
+    user = asyncio.run(db.users.find_one({'email': 'a@x'}, {'_id': 0}))
+    # $setOnInsert: o id gerado na criação fica; campos do documento vencem on_insert
+    assert user['id'] == 'generated-0'
+    assert user['name'] == 'B'
+
+
+def test_dry_run_and_invalid_documents(db):
+    stats = run_import(db.posts, [{'id': 'p1'}, {'title': 'sem id'}, {'id': 'p1', 'title': 'dup'}],
+                       key='id', dry_run=True)
+    assert (stats.read, stats.invalid, stats.inserted) == (3, 1, 1)
+    assert asyncio.run(db.posts.count_documents({})) == 0
+
+
+def test_readers():
+    ndjson = io.StringIO('{"id": 1}\n\n{"id": 2}\n')
+    assert [doc['id'] for doc in read_ndjson(ndjson)] == [1, 2]
+
+    csv_data = io.StringIO('id,phone,location.lat,location.lng,languages,active\n'
+                           'x,0612345678,48.85,2.35,pt;fr,true\n')
+    doc = next(read_csv(csv_data, numeric=['location.lat', 'location.lng'], lists=['languages']))
+    assert doc == {'id': 'x', 'phone': '0612345678', 'location': {'lat': 48.85, 'lng': 2.35},
+                   'languages': ['pt', 'fr'], 'active': True}
@@ -0,0 +1,62 @@
+import asyncio
+
+from categories import category_mask
+from server import User, attach_effective_needs, chat_permission
+
+
+def user(role, **fields):
+    return User(email=f'{role}@example.com', name=role, role=role, **fields)
+
+
+def migrant(needs=(), effective=None):
+    return {'id': 'm1', 'role': 'migrant', 'need_categories': list(needs),
+            'effective_need_mask': category_mask(needs) if effective is None else effective}
+
+
+def test_migrants_can_always_start_a_chat():
+    assert chat_permission(user('migrant'), {'role': 'volunteer'}) == {'can_chat': True, 'reason': 'allowed'}
+
+
+def test_helper_needs_a_common_category():
+    helper = user('volunteer', help_mask=category_mask(['legal', 'housing']))
+    result = chat_permission(helper, migrant(['food', 'housing']))
+    assert result == {'can_chat': True, 'reason': 'category_match', 'matching_category': 'housing'}
+    assert chat_permission(helper, migrant(['food']))['reason'] == 'no_matching_categories'
+    assert chat_permission(helper, migrant(['food']))['can_chat'] is False
+
+
+def test_needs_from_posts_count_too():
+    helper = user('helper', help_mask=category_mask(['work']))
+    # Sem categoria declarada em comum: vale a vinda dos posts de pedido
+    result = chat_permission(helper, migrant(['food'], effective=category_mask(['food', 'work'])))
+    assert result['matching_category'] == 'work'
+
+
+def test_legacy_users_without_categories_can_chat():
+    assert chat_permission(user('volunteer'), migrant(['food']))['reason'] == 'no_categories_defined'
+    helper = user('volunteer', help_mask=category_mask(['food']))
+    assert chat_permission(helper, migrant())['reason'] == 'no_needs_defined'
+
+
+def test_attach_effective_needs_reads_need_posts_once(db, monkeypatch):
+    import server
+    monkeypatch.setattr(server, 'db', db)
+    users = [
+        {'id': 'm1', 'role': 'migrant', 'need_mask': category_mask(['food'])},
+        {'id': 'm2', 'role': 'migrant', 'effective_need_mask': 5},
+        {'id': 'v1', 'role': 'volunteer'},
+    ]
+
+    async def run():
+        await db.posts.insert_many([
+            {'id': 'p1', 'user_id': 'm1', 'type': 'need', 'category': 'legal'},
+            {'id': 'p2', 'user_id': 'm1', 'type': 'offer', 'category': 'work'},
+            {'id': 'p3', 'user_id': 'm2', 'type': 'need', 'category': 'work'},
+        ])
+        await attach_effective_needs(users)
+
+    asyncio.run(run())
+    assert users[0]['effective_need_mask'] == category_mask(['food', 'legal'])
+    # Valor já calculado não é refeito
+    assert users[1]['effective_need_mask'] == 5
+    assert users[2]['effective_need_mask'] == 0
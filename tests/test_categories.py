@@ -0,0 +1,36 @@
+from categories import (
+    CATEGORIES, CATEGORY_BITS, category_mask, first_match, mask_categories, post_category_mask, user_masks
+)
+
+
+def test_bits_follow_registry_order():
+    # Reordenar CATEGORIES muda o significado das máscaras gravadas
+    assert CATEGORIES[:4] == ('food', 'legal', 'health', 'housing')
+    assert [CATEGORY_BITS[name] for name in CATEGORIES] == [1 << n for n in range(len(CATEGORIES))]
+
+
+def test_mask_round_trip_ignores_unknown_categories():
+    mask = category_mask(['housing', 'food', 'astrology', 'food'])
+    assert mask == CATEGORY_BITS['food'] | CATEGORY_BITS['housing']
+    assert mask_categories(mask) == ['food', 'housing']
+    assert category_mask(None) == 0
+    assert mask_categories(0) == []
+
+
+def test_post_mask_prefers_stored_value():
+    assert post_category_mask({'category': 'legal'}) == CATEGORY_BITS['legal']
+    assert post_category_mask({'category': 'legal', 'categories': ['food', 'work']}) == category_mask(['food', 'work'])
+    # Máscara gravada vale, mesmo 0
+    assert post_category_mask({'category': 'legal', 'category_mask': 0}) == 0
+
+
+def test_user_masks_only_for_present_arrays():
+    assert user_masks({'help_categories': ['legal']}) == {'help_mask': CATEGORY_BITS['legal']}
+    assert user_masks({'need_categories': [], 'help_categories': ['food']}) == {'need_mask': 0, 'help_mask': 1}
+    assert user_masks({'name': 'x'}) == {}
+
+
+def test_first_match_keeps_list_order():
+    mask = category_mask(['housing', 'food'])
+    assert first_match(['work', 'housing', 'food'], mask) == 'housing'
+    assert first_match(['work'], mask) is None
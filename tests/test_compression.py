@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from compression import MINIMUM_SIZE, CompressionMiddleware, PayloadCache, PrecompressedPayload, negotiate_encoding
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0', None),
+    ('identity', None),
+    ('br;q=bogus, gzip;q=0.5', 'gzip'),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get('/small')
+    def small():
+        return PlainTextResponse('x' * (MINIMUM_SIZE - 1))
+
+    @app.get('/large')
+    def large():
+        return PlainTextResponse('x' * MINIMUM_SIZE * 4)
+
+    @app.get('/binary')
+    def binary():
+        return PlainTextResponse('x' * MINIMUM_SIZE * 4, media_type='image/png')
+
+    @app.get('/stream')
+    def stream():
+        return StreamingResponse((b'{"n": 1}\n' * 200 for _ in range(3)), media_type='application/x-ndjson')
+
+    return TestClient(app)
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'] == 'Accept-Encoding'
+
+
+def test_large_responses_use_the_negotiated_encoding(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'br'})
+    assert response.headers['content-encoding'] == 'br'
+    assert int(response.headers['content-length']) < MINIMUM_SIZE
+    assert response.text == 'x' * MINIMUM_SIZE * 4
+
+
+def test_binary_and_unnegotiated_responses_pass_through(client):
+    assert 'content-encoding' not in client.get('/binary', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'content-encoding' not in client.get('/large', headers={'Accept-Encoding': 'identity'}).headers
+
+
+def test_streaming_responses_are_compressed_in_chunks(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.content == b'{"n": 1}\n' * 600
+
+
+def request(headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': raw})
+
+
+def test_precompressed_payload_serves_each_encoding_and_304():
+    payload = PrecompressedPayload([{'n': n} for n in range(200)], max_age=60)
+
+    br = payload.response(request({'Accept-Encoding': 'br'}))
+    assert br.headers['content-encoding'] == 'br'
+    assert brotli.decompress(br.body) == payload.body
+    gz = payload.response(request({'Accept-Encoding': 'gzip'}))
+    assert gzip.decompress(gz.body) == payload.body
+    assert gz.headers['cache-control'] == 'public, max-age=60'
+
+    assert payload.response(request({'If-None-Match': payload.etag})).status_code == 304
+    assert payload.response(request()).body == payload.body
+
+
+def test_payload_cache_builds_an_expired_key_once():
+    calls = []
+
+    async def build():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'n': len(calls)}
+
+    async def scenario():
+        cache = PayloadCache()
+        results = await asyncio.gather(*[cache.get('k', build, ttl=60) for _ in range(10)])
+        again = await cache.get('k', build, ttl=60)
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results) and again is results[0]
+
+
+def test_payload_cache_invalidate_during_build_is_not_stored():
+    async def scenario():
+        cache = PayloadCache()
+        pending = asyncio.ensure_future(cache.get('k', lambda: asyncio.sleep(0.01, result='old')))
+        await asyncio.sleep(0)
+        cache.invalidate('k')
+        first = await pending
+        second = await cache.get('k', lambda: 'new')
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.body == b'"old"'
+    assert second.body == b'"new"'
+
+
+def test_payload_cache_evicts_oldest_entries():
+    async def scenario():
+        cache = PayloadCache(max_entries=2)
+        for key in 'abc':
+            await cache.get(key, lambda: key)
+        return list(cache._entries)
+
+    assert asyncio.run(scenario()) == ['b', 'c']
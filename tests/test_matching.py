@@ -0,0 +1,114 @@
+import asyncio
+
+import orjson
+
+from categories import category_mask
+from matching import MATCH_WEIGHTS, CityCandidates, MatchIndex, language_mask
+
+PARIS = {'lat': 48.8566, 'lng': 2.3522}
+
+
+def candidate(user_id, categories, languages=('fr',), location=None, available=False,
+              responsiveness=0.5, updated_at='2026-01-01T00:00:00+00:00', **extra):
+    return {'id': user_id, 'help_mask': category_mask(categories), 'languages': list(languages),
+            'location': location, 'available': available, 'responsiveness': responsiveness,
+            'updated_at': updated_at, **extra}
+
+
+def brute_force(candidates, need_mask, languages_mask, location, k):
+    """Com k = todos os candidatos a poda nunca corta: serve de referência"""
+    full = CityCandidates()
+    full.apply(candidates)
+    scored = full.top(need_mask, languages_mask, location, len(candidates))
+    return [item[1].id for item in scored[:k]]
+
+
+def test_top_orders_by_category_language_and_distance():
+    city = CityCandidates()
+    city.apply([
+        candidate('far', ['housing', 'food'], location={'lat': 48.95, 'lng': 2.5}),
+        candidate('near', ['housing', 'food'], location={'lat': 48.857, 'lng': 2.353}),
+        candidate('partial', ['housing'], location={'lat': 48.857, 'lng': 2.353}),
+        candidate('unrelated', ['legal'], location={'lat': 48.857, 'lng': 2.353}),
+    ])
+    ranked = city.top(category_mask(['housing', 'food']), language_mask(['fr']), PARIS, 10)
+
+    assert [item[1].id for item in ranked] == ['near', 'far', 'partial']
+    score, _, parts = ranked[0]
+    assert parts['category'] == 1.0 and parts['language'] == 1.0
+    assert parts['distance_km'] < 1
+    assert score <= sum(MATCH_WEIGHTS.values())
+
+
+def test_pruned_top_k_matches_brute_force():
+    docs = [
+        candidate(f'c{n:02d}', [['food'], ['housing'], ['food', 'housing'], ['legal', 'food']][n % 4],
+                  languages=[('fr',), ('ar',), ('pt', 'fr')][n % 3],
+                  location={'lat': 48.80 + n * 0.005, 'lng': 2.30 + n * 0.003} if n % 5 else None,
+                  available=n % 2 == 0, responsiveness=(n % 7) / 7)
+        for n in range(60)
+    ]
+    need, languages = category_mask(['food', 'housing']), language_mask(['ar'])
+    city = CityCandidates()
+    city.apply(docs)
+    for k in (1, 5, 12):
+        assert [item[1].id for item in city.top(need, languages, PARIS, k)] == brute_force(docs, need, languages, PARIS, k)
+
+
+def test_exclude_and_removal():
+    city = CityCandidates()
+    city.apply([candidate('a', ['food'], available=True), candidate('b', ['food'])])
+    need = category_mask(['food'])
+    assert [item[1].id for item in city.top(need, 0, None, 1)] == ['a']
+    assert [item[1].id for item in city.top(need, 0, None, 1, exclude=['a'])] == ['b']
+
+    city.apply([candidate('a', ['food'], removed=True, updated_at='2026-01-02T00:00:00+00:00')])
+    assert [item[1].id for item in city.top(need, 0, None, 5)] == ['b']
+    assert city.watermark == '2026-01-02T00:00:00+00:00'
+
+
+def test_match_index_reads_only_changes_after_the_watermark():
+    calls = []
+    changes = [[candidate('a', ['food'])], [candidate('b', ['food'], updated_at='2026-01-03T00:00:00+00:00')]]
+
+    async def load(city, since):
+        calls.append((city, since))
+        return changes[len(calls) - 1] if len(calls) <= len(changes) else []
+
+    async def scenario():
+        index = MatchIndex(load, refresh_seconds=3600)
+        await index.city('paris')
+        await index.city('paris')  # dentro do intervalo: sem leitura
+        index.invalidate('paris')
+        return sorted((await index.city('paris')).by_id)
+
+    assert asyncio.run(scenario()) == ['a', 'b']
+    assert calls[0] == ('paris', None)
+    # Releitura com a folga INDEX_OVERLAP antes do watermark
+    assert calls[1][1] < '2026-01-01T00:00:00+00:00'
+    assert len(calls) == 2
+
+
+def test_suggestions_refill_when_ranked_users_were_deleted(db, monkeypatch):
+    import server
+    docs = [candidate(f'h{n}', ['food'], responsiveness=1 - n / 10) for n in range(6)]
+
+    async def load(city, since):
+        return docs if since is None else []
+
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server, 'match_index', MatchIndex(load, refresh_seconds=3600))
+    migrant = server.User(id='m', email='m@example.com', name='m', role='migrant', city='paris',
+                          need_mask=category_mask(['food']))
+
+    async def scenario():
+        await db.users.insert_many([
+            {'id': doc['id'], 'name': doc['id'], 'role': 'helper',
+             # Os dois mais bem colocados foram excluídos depois do refresh do índice
+             **({'deleted_at': '2026-01-02'} if doc['id'] in ('h0', 'h1') else {})}
+            for doc in docs
+        ])
+        response = await server.get_match_suggestions(limit=3, city=None, current_user=migrant)
+        return [item['user']['id'] for item in orjson.loads(response.body)['suggestions']]
+
+    assert asyncio.run(scenario()) == ['h2', 'h3', 'h4']
@@ -0,0 +1,88 @@
+import io
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+from media_store import MediaError, parse_range, render_variants, strip_metadata
+
+GPS_IFD = 0x8825
+ORIENTATION = 0x0112
+
+
+def jpeg_with_exif(orientation=6):
+    image = Image.new('RGB', (40, 20), 'blue')
+    exif = image.getexif()
+    exif[ORIENTATION] = orientation
+    exif[0x010F] = 'CameraMaker'
+    exif.get_ifd(GPS_IFD)[2] = (48.0, 51.0, 24.0)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif, comment=b'secret comment')
+    return buffer.getvalue()
+
+
+def test_jpeg_loses_gps_and_camera_but_keeps_orientation():
+    original = jpeg_with_exif()
+    stripped = strip_metadata(original, 'image/jpeg')
+
+    assert b'CameraMaker' in original
+    assert b'CameraMaker' not in stripped and b'secret comment' not in stripped
+    with Image.open(io.BytesIO(stripped)) as image:
+        exif = image.getexif()
+        assert exif.get(ORIENTATION) == 6
+        assert not exif.get_ifd(GPS_IFD)
+        assert image.size == (40, 20)
+        image.load()
+
+
+def test_stripping_is_idempotent():
+    once = strip_metadata(jpeg_with_exif(), 'image/jpeg')
+    assert strip_metadata(once, 'image/jpeg') == once
+
+
+def test_png_text_chunks_removed_and_alpha_kept():
+    image = Image.new('RGBA', (8, 8), (255, 0, 0, 128))
+    buffer = io.BytesIO()
+    info = PngImagePlugin.PngInfo()
+    info.add_text('Location', 'Paris 48.85 2.35')
+    image.save(buffer, 'PNG', pnginfo=info)
+
+    stripped = strip_metadata(buffer.getvalue(), 'image/png')
+    assert b'Paris 48.85' not in stripped
+    with Image.open(io.BytesIO(stripped)) as result:
+        assert result.mode == 'RGBA'
+        assert result.getpixel((0, 0)) == (255, 0, 0, 128)
+
+
+def test_truncated_image_is_a_media_error():
+    with pytest.raises(MediaError):
+        strip_metadata(jpeg_with_exif()[:40], 'image/jpeg')
+
+
+def test_other_types_pass_through():
+    data = b'\x1a\x45\xdf\xa3' + b'video'
+    assert strip_metadata(data, 'video/webm') == data
+
+
+def test_variants_keep_palette_transparency():
+    image = Image.new('P', (64, 64), 0)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', transparency=0)
+    variants = render_variants(buffer.getvalue())
+    with Image.open(io.BytesIO(variants['thumb'])) as thumb:
+        assert thumb.mode == 'RGBA'
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=900-', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=500-5000', (500, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_unsatisfiable_range():
+    with pytest.raises(MediaError):
+        parse_range('bytes=2000-', 1000)
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from media_store import MediaError, MediaStore, media_url
+
+VIDEO = b'\x1a\x45\xdf\xa3' + b'frames' * 100
+
+
+class MemoryBucket:
+    """GridFS em memória: grava o documento em <bucket>.files como o GridFS faria"""
+
+    def __init__(self, files):
+        self.files = files
+
+    async def upload_from_stream(self, filename, data, metadata=None):
+        # Upload lento o bastante para os uploads concorrentes se cruzarem
+        await asyncio.sleep(0.01)
+        result = await self.files.insert_one({'filename': filename, 'length': len(data), 'metadata': metadata})
+        return result.inserted_id
+
+
+@pytest.fixture
+def store(db):
+    store = MediaStore(db)
+    store._bucket = MemoryBucket(store.files)
+    return store
+
+
+def test_identical_uploads_are_stored_once(store):
+    async def upload():
+        return await asyncio.gather(*[store.put(VIDEO, 'video/webm', 'u1') for _ in range(5)])
+
+    results = asyncio.run(upload())
+    media_id = hashlib.sha256(VIDEO).hexdigest()
+    assert {result['id'] for result in results} == {media_id}
+    assert sorted(result['deduplicated'] for result in results) == [False, True, True, True, True]
+    assert asyncio.run(store.files.count_documents({'filename': media_id})) == 1
+    assert asyncio.run(store.owner_id(media_id)) == 'u1'
+
+
+def test_files_from_before_the_claims_collection_are_deduplicated(store):
+    media_id = hashlib.sha256(VIDEO).hexdigest()
+    asyncio.run(store.files.insert_one({'filename': media_id, 'metadata': {'variant': 'original'}}))
+    assert asyncio.run(store.put(VIDEO, 'video/webm'))['deduplicated'] is True
+    assert asyncio.run(store.files.count_documents({'filename': media_id})) == 1
+
+
+def test_failed_upload_releases_the_claim(store):
+    class BrokenBucket(MemoryBucket):
+        async def upload_from_stream(self, *args, **kwargs):
+            raise RuntimeError('disk full')
+
+    store._bucket = BrokenBucket(store.files)
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.put(VIDEO, 'video/webm'))
+    store._bucket = MemoryBucket(store.files)
+    assert asyncio.run(store.put(VIDEO, 'video/webm'))['deduplicated'] is False
+
+
+def test_rejects_unknown_and_empty_files(store):
+    with pytest.raises(MediaError):
+        asyncio.run(store.put(b'', 'video/webm'))
+    with pytest.raises(MediaError):
+        asyncio.run(store.put(b'MZ\x90\x00', 'application/x-msdownload'))
+
+
+def test_ingest_keeps_references_and_external_links(store):
+    ref = media_url('a' * 64)
+    assert asyncio.run(store.ingest([ref, 'https://example.com/x.jpg'])) == [ref, 'https://example.com/x.jpg']
+    with pytest.raises(MediaError):
+        asyncio.run(store.ingest(['javascript:alert(1)']))
+
+
+def test_message_media_is_private_to_the_conversation(db, store, monkeypatch):
+    import server
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server, 'media_store', store)
+    sender = server.User(id='u1', email='a@example.com', name='a', role='migrant')
+    recipient = server.User(id='u2', email='b@example.com', name='b', role='helper')
+    outsider = server.User(id='u3', email='c@example.com', name='c', role='helper')
+
+    async def scenario():
+        media_id = (await store.put(VIDEO, 'video/webm', 'u1'))['id']
+        await db.messages.insert_one({'id': 'm1', 'from_user_id': 'u1', 'to_user_id': 'u2',
+                                      'media': [media_url(media_id, 'small')]})
+        private = (await server.can_view_private_media(media_id, sender),
+                   await server.can_view_private_media(media_id, recipient),
+                   await server.can_view_private_media(media_id, outsider))
+        public_before = await server.media_is_public(media_id)
+        await db.posts.insert_one({'id': 'p1', 'images': [media_url(media_id)]})
+        return private, public_before, await server.media_is_public(media_id)
+
+    private, public_before, public_after = asyncio.run(scenario())
+    assert private == (True, True, False)
+    assert public_before is False
+    assert public_after is True
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from server import combine_filters, decode_cursor, encode_cursor, keyset_filter, next_page_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('2026-01-02T03:04:05+00:00', 'abc')
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 2) == ['2026-01-02T03:04:05+00:00', 'abc']
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', encode_cursor('only-one'), encode_cursor('a', 'b', 'c')])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 2)
+    assert error.value.status_code == 400
+
+
+def test_keyset_filter_breaks_ties_by_id():
+    cursor = encode_cursor('2026-01-01', 'm')
+    assert keyset_filter(None) == {}
+    assert keyset_filter(cursor) == {'$or': [
+        {'created_at': {'$lt': '2026-01-01'}},
+        {'created_at': '2026-01-01', 'id': {'$lt': 'm'}}
+    ]}
+    assert keyset_filter(cursor, descending=False)['$or'][1]['id'] == {'$gt': 'm'}
+
+
+def test_next_page_cursor_only_when_there_is_more():
+    docs = [{'created_at': f'2026-01-0{day}', 'id': str(day)} for day in (3, 2, 1)]
+    assert next_page_cursor(docs, 3) is None
+    assert decode_cursor(next_page_cursor(docs, 2), 2) == ['2026-01-02', '2']
+
+
+def test_combine_filters_skips_empty():
+    assert combine_filters({}, {}) == {}
+    assert combine_filters({'a': 1}, {}) == {'a': 1}
+    assert combine_filters({'a': 1}, {'b': 2}) == {'$and': [{'a': 1}, {'b': 2}]}
+
+
+def test_keyset_pages_cover_every_document_once(db):
+    # Vários documentos com o mesmo created_at: o id desempata sem pular nem repetir
+    docs = [{'id': f'{n:03d}', 'created_at': f'2026-01-0{n % 3 + 1}', 'post_id': 'p'} for n in range(25)]
+
+    async def pages():
+        await db.comments.insert_many([dict(doc) for doc in docs])
+        seen, cursor = [], None
+        while True:
+            page = await db.comments.find(
+                combine_filters({'post_id': 'p'}, keyset_filter(cursor)), {'_id': 0}
+            ).sort([('created_at', -1), ('id', -1)]).to_list(8)
+            seen.extend(doc['id'] for doc in page[:7])
+            cursor = next_page_cursor(page, 7)
+            if cursor is None:
+                return seen
+
+    seen = asyncio.run(pages())
+    expected = [doc['id'] for doc in sorted(docs, key=lambda d: (d['created_at'], d['id']), reverse=True)]
+    assert seen == expected
@@ -0,0 +1,53 @@
+import asyncio
+
+from reference_data import ReferenceCache, bump_version
+
+
+def make_cache(db, loads):
+    async def load_services(database):
+        loads.append(1)
+        return await database.services.find({}, {'_id': 0}).to_list(None)
+
+    # check_seconds=0: confere o carimbo a cada get
+    cache = ReferenceCache(lambda: db, check_seconds=0)
+    cache.register('services', load_services)
+    cache.track('volunteers')
+    return cache
+
+
+def test_reloads_only_after_a_version_bump(db):
+    loads = []
+
+    async def scenario():
+        cache = make_cache(db, loads)
+        await db.services.insert_one({'id': 's1'})
+        first = await cache.get('services')
+        await cache.get('services')
+        # Escrita sem bump (outro processo no meio da gravação): cópia mantida
+        await db.services.insert_one({'id': 's2'})
+        unchanged = await cache.get('services')
+        await bump_version(db, 'services')
+        reloaded = await cache.get('services')
+        return first, unchanged, reloaded
+
+    first, unchanged, reloaded = asyncio.run(scenario())
+    assert [s['id'] for s in first] == ['s1']
+    assert unchanged is first
+    assert [s['id'] for s in reloaded] == ['s1', 's2']
+    assert len(loads) == 2
+
+
+def test_bump_from_another_worker_is_seen_after_the_check_interval(db):
+    async def scenario():
+        worker_a, worker_b = make_cache(db, []), make_cache(db, [])
+        worker_b.check_seconds = 3600
+        assert await worker_b.version('volunteers') == 0
+        version = await worker_a.bump('volunteers')
+        stale = await worker_b.version('volunteers')
+        worker_b._checked_at = float('-inf')
+        return version, stale, await worker_b.version('volunteers'), await worker_a.version('volunteers')
+
+    version, stale, fresh, own = asyncio.run(scenario())
+    assert version == 1
+    assert stale == 0
+    assert fresh == own == 1
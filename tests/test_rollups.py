@@ -0,0 +1,76 @@
+"""
+Leitura da série temporal a partir dos rollups. O cálculo dos rollups usa
+$substrBytes, que o mongomock não implementa; aqui os buckets são gravados
+como o job os grava.
+"""
+import asyncio
+from datetime import timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+ADMIN = server.User(id='admin', email='admin@example.com', name='admin', role='admin')
+
+
+@pytest.fixture
+def rollups(db, monkeypatch):
+    monkeypatch.setattr(server, 'db', db)
+    rows = [
+        ('hour', '2026-03-01T10', {'type': 'need', 'category': 'food'}, 3),
+        ('hour', '2026-03-01T10', {'type': 'offer', 'category': 'food'}, 1),
+        ('hour', '2026-03-01T12', {'type': 'need', 'category': 'legal'}, 2),
+        ('day', '2026-03-01', {'type': 'need', 'category': 'food'}, 3),
+        ('day', '2026-03-01', {'type': 'offer', 'category': 'food'}, 1),
+        ('day', '2026-03-01', {'type': 'need', 'category': 'legal'}, 2),
+        ('day', '2026-03-03', {'type': 'need', 'category': 'food'}, 5),
+    ]
+    asyncio.run(db.stats_rollups.insert_many([
+        {'metric': 'posts', 'granularity': granularity, 'bucket': bucket, 'dims': dims, 'count': count}
+        for granularity, bucket, dims, count in rows
+    ]))
+    asyncio.run(db.rollup_state.insert_one({'metric': 'posts', 'watermark': '2026-03-03T23:00:00+00:00'}))
+    return db
+
+
+def timeseries(**params):
+    defaults = {'granularity': 'day', 'start': None, 'end': None, 'group_by': None,
+                'role': None, 'type': None, 'category': None, 'language': None}
+    return asyncio.run(server.admin_timeseries(**{**defaults, **params}, current_user=ADMIN))
+
+
+def test_days_without_events_are_zero(rollups):
+    result = timeseries(metric='posts', start='2026-03-01', end='2026-03-03T12:00:00')
+    assert [(point['bucket'], point['total']) for point in result['points']] == [
+        ('2026-03-01', 6), ('2026-03-02', 0), ('2026-03-03', 5)
+    ]
+    assert result['updated_until'] == '2026-03-03T23:00:00+00:00'
+
+
+def test_group_by_and_filters(rollups):
+    result = timeseries(metric='posts', granularity='hour', start='2026-03-01T10:00:00',
+                        end='2026-03-01T12:30:00', group_by='type', category='food')
+    assert [point['total'] for point in result['points']] == [4, 0, 0]
+    assert result['points'][0]['groups'] == {'need': 3, 'offer': 1}
+
+
+@pytest.mark.parametrize('params', [
+    {'metric': 'unknown'},
+    {'metric': 'posts', 'granularity': 'minute'},
+    {'metric': 'posts', 'group_by': 'role'},
+    {'metric': 'signups', 'category': 'food'},
+    {'metric': 'posts', 'granularity': 'hour', 'start': '2020-01-01', 'end': '2026-01-01'},
+    {'metric': 'posts', 'start': '2026-03-05', 'end': '2026-03-01'},
+    {'metric': 'posts', 'start': 'yesterday'},
+])
+def test_invalid_requests_are_400(rollups, params):
+    with pytest.raises(HTTPException) as error:
+        timeseries(**params)
+    assert error.value.status_code == 400
+
+
+def test_naive_dates_are_utc():
+    parsed = server.parse_utc_datetime('2026-03-01T10:00:00')
+    assert parsed.tzinfo == timezone.utc and parsed.hour == 10
+    assert server.parse_utc_datetime('2026-03-01T10:00:00+02:00').hour == 8